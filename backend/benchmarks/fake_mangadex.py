@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the MangaDex API and at-home image nodes.
+
+Serves the endpoints the backend uses (/manga, /manga/{id}, /manga/{id}/feed,
+/chapter, /at-home/server/{id}, /data and /data-saver images) from the deterministic
+payloads in fixtures.py, with optional latency and error injection.
+
+Run it standalone and point the backend at it with MANGADEX_BASE_URL:
+
+    python backend/benchmarks/fake_mangadex.py --port 8100 --latency-ms 80 --error-rate 0.01
+    MANGADEX_BASE_URL=http://127.0.0.1:8100 uvicorn server:app
+
+load_test.py mounts the same app in-process.
+"""
+
+import argparse
+import asyncio
+import random
+import struct
+import sys
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fixtures  # noqa: E402
+
+FEED_MAX_LIMIT = 500
+CHAPTER_LIST_MAX_LIMIT = 100
+
+
+def tiny_png(width: int = 1000, height: int = 1500) -> bytes:
+    """A valid grayscale PNG with the given header size and a single-pixel-row body."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    rows = zlib.compress(b"".join(b"\x00" + b"\xff" * width for _ in range(height)))
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", rows) + chunk(b"IEND", b"")
+
+
+def create_app(
+    manga_count: int = 500,
+    latency_ms: float = 0,
+    jitter_ms: float = 0,
+    error_rate: float = 0,
+    seed: int = 0
+) -> Starlette:
+    rng = random.Random(seed)
+    catalog = [fixtures.manga_entity(i) for i in range(manga_count)]
+    by_id = {manga["id"]: (i, manga) for i, manga in enumerate(catalog)}
+    image = tiny_png()
+    stats: Dict[str, int] = defaultdict(int)
+
+    def chapter_total(index: int) -> int:
+        # Anything from a oneshot-sized series to a long runner that needs several feed pages
+        return 10 + (index * 37) % 1200
+
+    async def simulate(request: Request):
+        stats["requests"] += 1
+        if latency_ms or jitter_ms:
+            await asyncio.sleep(max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000)
+        if error_rate and rng.random() < error_rate:
+            stats["injected_errors"] += 1
+            return JSONResponse({"result": "error", "errors": [{"status": 503}]}, status_code=503)
+        return None
+
+    async def search(request: Request):
+        error = await simulate(request)
+        if error:
+            return error
+        ids = request.query_params.getlist("ids[]")
+        limit = int(request.query_params.get("limit", 10))
+        if ids:
+            data = [by_id[manga_id][1] for manga_id in ids if manga_id in by_id]
+        else:
+            words = request.query_params.get("title", "").lower().split()
+            data = [
+                manga for manga in catalog
+                if all(word in " ".join(manga["attributes"]["title"].values()).lower() for word in words)
+            ]
+        return JSONResponse({"result": "ok", "response": "collection", "data": data[:limit], "limit": limit, "offset": 0, "total": len(data)})
+
+    async def manga_details(request: Request):
+        error = await simulate(request)
+        if error:
+            return error
+        found = by_id.get(request.path_params["manga_id"])
+        if found is None:
+            return JSONResponse({"result": "error", "errors": [{"status": 404}]}, status_code=404)
+        return JSONResponse({"result": "ok", "response": "entity", "data": found[1]})
+
+    async def feed(request: Request):
+        error = await simulate(request)
+        if error:
+            return error
+        manga_id = request.path_params["manga_id"]
+        found = by_id.get(manga_id)
+        if found is None:
+            return JSONResponse({"result": "error", "errors": [{"status": 404}]}, status_code=404)
+        offset = int(request.query_params.get("offset", 0))
+        limit = min(int(request.query_params.get("limit", 100)), FEED_MAX_LIMIT)
+        return JSONResponse(fixtures.chapter_feed(manga_id, chapter_total(found[0]), offset, limit))
+
+    async def chapter_list(request: Request):
+        # Only what the new-chapter checker asks for: manga[] filtered by updatedAtSince
+        error = await simulate(request)
+        if error:
+            return error
+        since = request.query_params.get("updatedAtSince", "")
+        offset = int(request.query_params.get("offset", 0))
+        limit = min(int(request.query_params.get("limit", 10)), CHAPTER_LIST_MAX_LIMIT)
+        data = [
+            chapter
+            for manga_id in request.query_params.getlist("manga[]") if manga_id in by_id
+            for chapter in fixtures.chapter_feed(manga_id, chapter_total(by_id[manga_id][0]))["data"]
+            if chapter["attributes"]["updatedAt"][:19] > since
+        ]
+        data.sort(key=lambda chapter: chapter["attributes"]["updatedAt"])
+        return JSONResponse({
+            "result": "ok", "response": "collection",
+            "data": data[offset:offset + limit], "limit": limit, "offset": offset, "total": len(data)
+        })
+
+    async def at_home(request: Request):
+        error = await simulate(request)
+        if error:
+            return error
+        base_url = str(request.base_url).rstrip("/")
+        return JSONResponse(fixtures.at_home_server(request.path_params["chapter_id"], base_url))
+
+    async def page_image(request: Request):
+        error = await simulate(request)
+        if error:
+            return error
+        stats["images"] += 1
+        body = image
+        range_header = request.headers.get("range", "")
+        if range_header.startswith("bytes=0-"):
+            end = int(range_header[len("bytes=0-"):] or len(image) - 1)
+            body = image[:end + 1]
+            return Response(body, status_code=206, media_type="image/png", headers={
+                "Content-Range": f"bytes 0-{len(body) - 1}/{len(image)}"
+            })
+        return Response(body, media_type="image/png")
+
+    async def get_stats(request: Request):
+        return JSONResponse(dict(stats))
+
+    app = Starlette(routes=[
+        Route("/manga", search),
+        Route("/manga/{manga_id}", manga_details),
+        Route("/manga/{manga_id}/feed", feed),
+        Route("/chapter", chapter_list),
+        Route("/at-home/server/{chapter_id}", at_home),
+        Route("/data/{chapter_hash}/{filename}", page_image),
+        Route("/data-saver/{chapter_hash}/{filename}", page_image),
+        Route("/__stats", get_stats),
+    ])
+    app.state.stats = stats
+    app.state.catalog = catalog
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--manga", type=int, default=500, help="catalog size")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(
+        create_app(args.manga, args.latency_ms, args.jitter_ms, args.error_rate),
+        host=args.host, port=args.port, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Deterministic MangaDex-shaped payloads for benchmarks and the fake upstream.
+
+The shapes follow the responses of /manga, /manga/{id}, /manga/{id}/feed and
+/at-home/server/{id}. They include the awkward cases seen in real data:
+titles without an English entry, null chapter numbers (oneshots) and the
+same chapter uploaded by several scanlation groups.
+"""
+
+import random
+import uuid
+from typing import Any, Dict, List
+
+TAGS = ["Action", "Adventure", "Comedy", "Drama", "Fantasy", "Romance", "Slice of Life", "Sports", "Mystery", "Horror"]
+WORDS = ["one", "piece", "attack", "titan", "hunter", "dragon", "ball", "slayer", "jujutsu", "kaisen", "chainsaw", "man",
+         "spy", "family", "blue", "lock", "vinland", "saga", "berserk", "bleach", "naruto", "tower", "god", "solo"]
+
+
+def stable_id(*parts: Any) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, "/".join(str(part) for part in parts)))
+
+
+def manga_entity(index: int) -> Dict[str, Any]:
+    rng = random.Random(index)
+    manga_id = stable_id("manga", index)
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))).title()
+    # Roughly one in five titles has no English entry
+    titles = {"ja-ro": title} if index % 5 == 0 else {"en": title}
+    return {
+        "id": manga_id,
+        "type": "manga",
+        "attributes": {
+            "title": titles,
+            "altTitles": [{"ja": f"{title} (JP)"}, {"ko": f"{title} (KR)"}],
+            "description": {"en": f"The story of {title.lower()}."},
+            "status": rng.choice(["ongoing", "completed", "hiatus"]),
+            "tags": [
+                {"id": stable_id("tag", tag), "type": "tag", "attributes": {"name": {"en": tag}}}
+                for tag in rng.sample(TAGS, 3)
+            ],
+        },
+        "relationships": [
+            {"id": stable_id("author", index), "type": "author", "attributes": {"name": f"Author {index}"}},
+            {"id": stable_id("artist", index), "type": "artist", "attributes": {"name": f"Artist {index}"}},
+            {"id": stable_id("cover", index), "type": "cover_art", "attributes": {"fileName": f"{stable_id('file', index)}.jpg"}},
+        ],
+    }
+
+
+def manga_list(count: int, offset: int = 0) -> Dict[str, Any]:
+    return {
+        "result": "ok",
+        "response": "collection",
+        "data": [manga_entity(offset + i) for i in range(count)],
+        "limit": count,
+        "offset": offset,
+        "total": count,
+    }
+
+
+def chapter_entity(manga_id: str, index: int) -> Dict[str, Any]:
+    # Every tenth chapter also has an upload from a second group; index 0 is a oneshot
+    number = index // 2 if index % 10 in (0, 1) else index
+    group = "b" if index % 10 == 1 else "a"
+    return {
+        "id": stable_id("chapter", manga_id, index),
+        "type": "chapter",
+        "attributes": {
+            "title": None if index % 3 else f"Title {index}",
+            "chapter": None if index == 0 else str(number),
+            "volume": str(index // 10 + 1),
+            "pages": 20 + index % 7,
+            "translatedLanguage": "en",
+            "publishAt": f"2020-{index % 12 + 1:02d}-{index % 28 + 1:02d}T12:00:00+00:00",
+            "updatedAt": f"2020-{index % 12 + 1:02d}-{index % 28 + 1:02d}T12:00:00+00:00",
+        },
+        "relationships": [
+            {"id": stable_id("group", group), "type": "scanlation_group"},
+            {"id": manga_id, "type": "manga"},
+        ],
+    }
+
+
+def chapter_feed(manga_id: str, total: int, offset: int = 0, limit: int = 500) -> Dict[str, Any]:
+    return {
+        "result": "ok",
+        "response": "collection",
+        "data": [chapter_entity(manga_id, i) for i in range(offset, min(offset + limit, total))],
+        "limit": limit,
+        "offset": offset,
+        "total": total,
+    }
+
+
+def at_home_server(chapter_id: str, base_url: str, pages: int = 20) -> Dict[str, Any]:
+    chapter_hash = uuid.uuid5(uuid.NAMESPACE_URL, chapter_id).hex
+    return {
+        "result": "ok",
+        "baseUrl": base_url,
+        "chapter": {
+            "hash": chapter_hash,
+            "data": [f"{i + 1}-{stable_id('page', chapter_id, i).replace('-', '')}.png" for i in range(pages)],
+            "dataSaver": [f"{i + 1}-{stable_id('page', chapter_id, i).replace('-', '')}.jpg" for i in range(pages)],
+        },
+    }
+
+
+def manga_ids(count: int) -> List[str]:
+    return [stable_id("manga", i) for i in range(count)]
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Load test for the backend against a local MangaDex stand-in.
+
+By default everything runs in one process: requests go to the backend app
+through an httpx ASGI transport, the backend talks to fake_mangadex the
+same way, and MongoDB is mongomock_motor unless --mongo-url is given.
+Upstream rate limits are raised (--upstream-rate) so the numbers reflect
+our own code rather than MangaDex's quota. With --target the scenarios run
+against an already running backend instead (start it with
+MANGADEX_BASE_URL pointing at fake_mangadex.py).
+
+Scenarios:
+  search     bursts of title searches
+  chapters   chapter-open storms: chapter list, page list and first pages
+  progress   page-turn floods of progress updates
+  mixed      weighted mix of reading-session traffic
+
+Reports throughput and p50/p95/p99 per route. As a regression gate, save a
+run with --json and compare later runs with --baseline; the exit status is
+1 when a route's p95 or error rate got worse than --max-regression allows.
+
+Usage: python backend/benchmarks/load_test.py [--scenario mixed] [--concurrency 50] [--duration 20]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fixtures  # noqa: E402
+from fake_mangadex import create_app as create_fake_mangadex  # noqa: E402
+
+FAKE_MANGADEX_URL = "http://fake-mangadex"
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.record_from = float("inf")
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            failed = response.status_code >= 500
+        except httpx.HTTPError:
+            response, failed = None, True
+        if start >= self.record_from:
+            self.latencies[route].append(time.perf_counter() - start)
+            if failed:
+                self.errors[route] += 1
+        return response
+
+    def summary(self, duration: float) -> Dict[str, Dict[str, float]]:
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            routes[route] = {
+                "requests": len(samples),
+                "errors": self.errors[route],
+                "error_rate": self.errors[route] / len(samples),
+                "rps": len(samples) / duration,
+                "p50_ms": percentile(samples, 0.50) * 1000,
+                "p95_ms": percentile(samples, 0.95) * 1000,
+                "p99_ms": percentile(samples, 0.99) * 1000,
+                "max_ms": samples[-1] * 1000,
+            }
+        return routes
+
+
+class Workload:
+    """Virtual-user actions. Popular titles get most of the traffic, like on a real home page."""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, manga_count: int, users: int, seed: int):
+        self.client = client
+        self.recorder = recorder
+        self.manga_ids = fixtures.manga_ids(manga_count)
+        self.users = [f"loadtest-user-{i}" for i in range(users)]
+        self.rng = random.Random(seed)
+        self.chapters: Dict[str, List[Dict[str, Any]]] = {}
+
+    def pick_manga(self) -> str:
+        if self.rng.random() < 0.8:
+            return self.rng.choice(self.manga_ids[:20])
+        return self.rng.choice(self.manga_ids)
+
+    async def search(self):
+        query = " ".join(self.rng.sample(fixtures.WORDS, self.rng.randint(1, 2)))
+        await self.recorder.request(self.client, "GET /api/manga/search", "GET", "/api/manga/search", params={"query": query})
+
+    async def details(self):
+        manga_id = self.pick_manga()
+        await self.recorder.request(self.client, "GET /api/manga/{manga_id}", "GET", f"/api/manga/{manga_id}")
+
+    async def chapter_list(self, manga_id: str) -> List[Dict[str, Any]]:
+        response = await self.recorder.request(
+            self.client, "GET /api/manga/{manga_id}/chapters", "GET", f"/api/manga/{manga_id}/chapters"
+        )
+        if response is not None and response.status_code == 200:
+            self.chapters[manga_id] = response.json()["chapters"]
+        return self.chapters.get(manga_id, [])
+
+    async def open_chapter(self):
+        manga_id = self.pick_manga()
+        chapters = await self.chapter_list(manga_id)
+        if not chapters:
+            return
+        chapter = self.rng.choice(chapters[:10])
+        await self.recorder.request(
+            self.client, "GET /api/chapter/{chapter_id}/pages", "GET", f"/api/chapter/{chapter['id']}/pages",
+            params={"manga_id": manga_id}
+        )
+        for page_number in range(1, 4):
+            await self.recorder.request(
+                self.client, "GET /api/chapter/{chapter_id}/page/{page_number}", "GET",
+                f"/api/chapter/{chapter['id']}/page/{page_number}"
+            )
+
+    async def page_turn(self):
+        manga_id = self.pick_manga()
+        chapters = self.chapters.get(manga_id)
+        chapter_id = self.rng.choice(chapters)["id"] if chapters else fixtures.stable_id("chapter", manga_id, 1)
+        await self.recorder.request(
+            self.client, "POST /api/progress/update", "POST", "/api/progress/update",
+            params={
+                "user_id": self.rng.choice(self.users),
+                "manga_id": manga_id,
+                "chapter_id": chapter_id,
+                "page_number": self.rng.randint(1, 25)
+            }
+        )
+
+    async def library(self):
+        user_id = self.rng.choice(self.users)
+        await self.recorder.request(self.client, "GET /api/library/{user_id}", "GET", f"/api/library/{user_id}")
+
+    def scenario(self, name: str) -> Callable[[], Awaitable[None]]:
+        weights = {
+            "search": [(self.search, 1)],
+            "chapters": [(self.open_chapter, 1)],
+            "progress": [(self.page_turn, 1)],
+            "mixed": [
+                (self.search, 2), (self.details, 2), (self.open_chapter, 3), (self.page_turn, 10), (self.library, 1)
+            ],
+        }[name]
+        actions = [action for action, _ in weights]
+        action_weights = [weight for _, weight in weights]
+
+        async def step():
+            await self.rng.choices(actions, weights=action_weights)[0]()
+
+        return step
+
+
+async def drive(step: Callable[[], Awaitable[None]], recorder: Recorder, concurrency: int, warmup: float, duration: float, think_ms: float) -> float:
+    recorder.record_from = time.perf_counter() + warmup
+    stop_at = time.monotonic() + warmup + duration
+
+    async def user():
+        while time.monotonic() < stop_at:
+            await step()
+            # In-process requests that never wait on I/O would otherwise starve the other users
+            await asyncio.sleep(think_ms / 1000)
+
+    await asyncio.gather(*[user() for _ in range(concurrency)])
+    return duration
+
+
+def print_report(routes: Dict[str, Dict[str, float]]):
+    header = f"{'route':<50} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for route, row in routes.items():
+        print(
+            f"{route:<50} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8.1f} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}"
+        )
+
+
+def compare(routes: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], max_regression: float, min_ms: float) -> List[str]:
+    regressions = []
+    for route, row in routes.items():
+        before = baseline.get(route)
+        if before is None:
+            continue
+        # Ignore noise on routes that are fast either way
+        if row["p95_ms"] > max(before["p95_ms"] * (1 + max_regression), min_ms):
+            regressions.append(f"{route}: p95 {before['p95_ms']:.1f} ms -> {row['p95_ms']:.1f} ms")
+        if row["error_rate"] > before["error_rate"] + max_regression / 10:
+            regressions.append(f"{route}: error rate {before['error_rate']:.2%} -> {row['error_rate']:.2%}")
+    return regressions
+
+
+def configure_environment(args):
+    # server.py reads its settings at import time
+    os.environ.setdefault("MONGO_URL", args.mongo_url or "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "manga_loadtest")
+    os.environ["MANGADEX_BASE_URL"] = FAKE_MANGADEX_URL
+    os.environ.setdefault("IMAGE_CACHE_DIR", tempfile.mkdtemp(prefix="loadtest-images-"))
+    os.environ.setdefault("DOWNLOAD_DIR", tempfile.mkdtemp(prefix="loadtest-downloads-"))
+    for name in ("MANGADEX_RATE_GLOBAL", "MANGADEX_RATE_SEARCH", "MANGADEX_RATE_AT_HOME"):
+        os.environ.setdefault(name, str(args.upstream_rate))
+
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    recorder = Recorder()
+    lifespan = None
+
+    if args.target:
+        client = httpx.AsyncClient(base_url=args.target, timeout=60)
+    else:
+        configure_environment(args)
+        import server
+
+        if not args.mongo_url:
+            try:
+                from mongomock_motor import AsyncMongoMockClient
+            except ImportError:
+                sys.exit(
+                    "The in-process mode needs mongomock-motor (pip install -r backend/requirements.txt); "
+                    "or pass --mongo-url to use a real MongoDB"
+                )
+
+            mock_db = AsyncMongoMockClient()[os.environ["DB_NAME"]]
+            server.db = mock_db
+            server.progress_buffer.db = mock_db
+            server.chapter_sync.db = mock_db
+            server.downloads.collection = mock_db.download_jobs
+            server.metadata_cache.shared.collection = mock_db.api_cache
+
+        lifespan = server.app.router.lifespan_context(server.app)
+        await lifespan.__aenter__()
+        await server.MangaDexAPI.close()
+        fake = create_fake_mangadex(args.manga, args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+        server.MangaDexAPI.client = httpx.AsyncClient(
+            base_url=FAKE_MANGADEX_URL,
+            transport=server.TracingTransport(httpx.ASGITransport(app=fake), server.tracer, name=server.upstream_span_name),
+            timeout=60
+        )
+        client = httpx.AsyncClient(base_url="http://backend", transport=httpx.ASGITransport(app=server.app), timeout=60)
+
+    try:
+        workload = Workload(client, recorder, args.manga, args.users, args.seed)
+        duration = await drive(workload.scenario(args.scenario), recorder, args.concurrency, args.warmup, args.duration, args.think_ms)
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    return recorder.summary(duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=["search", "chapters", "progress", "mixed"], default="mixed")
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds before recording")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause between a user's actions")
+    parser.add_argument("--users", type=int, default=1000, help="distinct user ids for progress and library")
+    parser.add_argument("--manga", type=int, default=500, help="fake catalog size")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=50, help="fake MangaDex latency")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of fake MangaDex 503s")
+    parser.add_argument("--upstream-rate", type=float, default=10000, help="upstream rate limit for in-process runs")
+    parser.add_argument("--mongo-url", help="use a real MongoDB instead of mongomock_motor")
+    parser.add_argument("--target", help="base URL of a running backend, e.g. http://127.0.0.1:8001")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed relative p95 increase")
+    parser.add_argument("--min-ms", type=float, default=5, help="p95 below this never counts as a regression")
+    args = parser.parse_args()
+
+    routes = asyncio.run(run(args))
+    print(f"Scenario {args.scenario}: {args.concurrency} users for {args.duration:g}s")
+    print_report(routes)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"scenario": args.scenario, "routes": routes}, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["routes"]
+        regressions = compare(routes, baseline, args.max_regression, args.min_ms)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark for MangaDex payload parsing.
+
+Compares the previous per-item parsing (pydantic models, two relationship
+scans, datetime.fromisoformat per chapter) with the one-pass extractors in
+mangadex_parser, over fixture payloads.
+
+Usage: python backend/benchmarks/parser_bench.py [--chapters N] [--manga N] [--repeat N]
+"""
+
+import argparse
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fixtures  # noqa: E402
+import mangadex_parser  # noqa: E402
+from server import ChapterInfo, MangaInfo  # noqa: E402
+
+
+def legacy_parse_manga(manga_data):
+    cover_art_url = ""
+    for rel in manga_data.get("relationships", []):
+        if rel["type"] == "cover_art":
+            cover_filename = rel["attributes"]["fileName"]
+            cover_art_url = f"https://uploads.mangadex.org/covers/{manga_data['id']}/{cover_filename}.256.jpg"
+            break
+
+    author = "Unknown"
+    for rel in manga_data.get("relationships", []):
+        if rel["type"] == "author":
+            author = rel["attributes"].get("name", "Unknown")
+            break
+
+    return MangaInfo(
+        id=manga_data["id"],
+        title=manga_data["attributes"]["title"].get("en", list(manga_data["attributes"]["title"].values())[0]),
+        description=manga_data["attributes"]["description"].get("en", ""),
+        author=author,
+        status=manga_data["attributes"]["status"],
+        cover_art=cover_art_url,
+        tags=[tag["attributes"]["name"]["en"] for tag in manga_data["attributes"]["tags"]],
+        chapters=0,
+        source="mangadex"
+    )
+
+
+def legacy_parse_chapters(data, manga_id):
+    chapters = []
+    seen = set()
+    for chapter_data in data:
+        number = chapter_data["attributes"]["chapter"]
+        group = next((rel["id"] for rel in chapter_data.get("relationships", []) if rel["type"] == "scanlation_group"), None)
+        key = (number, group) if number is not None else chapter_data["id"]
+        if key in seen:
+            continue
+        seen.add(key)
+        chapters.append(ChapterInfo(
+            id=chapter_data["id"],
+            title=chapter_data["attributes"]["title"] or f"Chapter {chapter_data['attributes']['chapter']}",
+            chapter_number=float(chapter_data["attributes"]["chapter"] or 0),
+            pages=int(chapter_data["attributes"]["pages"] or 0),
+            manga_id=manga_id,
+            volume=chapter_data["attributes"]["volume"],
+            published_date=datetime.fromisoformat(chapter_data["attributes"]["publishAt"].replace("Z", "+00:00")) if chapter_data["attributes"]["publishAt"] else None
+        ))
+    return chapters
+
+
+def bench(label: str, fn, repeat: int):
+    best = min(timeit.repeat(fn, number=1, repeat=repeat))
+    print(f"  {label:<28} {best * 1000:8.2f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=500)
+    parser.add_argument("--manga", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    manga_id = fixtures.stable_id("manga", 1)
+    feed = fixtures.chapter_feed(manga_id, args.chapters, limit=args.chapters)["data"]
+    manga = fixtures.manga_list(args.manga)["data"]
+
+    # Same chapters survive deduplication and the models accept every parsed item
+    parsed = mangadex_parser.parse_chapters(feed, manga_id)
+    assert [chapter["id"] for chapter in parsed] == [chapter.id for chapter in legacy_parse_chapters(feed, manga_id)]
+    assert all(ChapterInfo(**chapter) for chapter in parsed)
+    assert all(MangaInfo(**item) for item in mangadex_parser.parse_manga_list(manga))
+
+    print(f"Chapter feed ({args.chapters} chapters)")
+    slow = bench("legacy per-item models", lambda: legacy_parse_chapters(feed, manga_id), args.repeat)
+    fast = bench("mangadex_parser", lambda: mangadex_parser.parse_chapters(feed, manga_id), args.repeat)
+    print(f"  speedup: {slow / fast:.1f}x")
+
+    print(f"Manga list ({args.manga} manga)")
+    slow = bench("legacy per-item models", lambda: [legacy_parse_manga(item) for item in manga], args.repeat)
+    fast = bench("mangadex_parser", lambda: mangadex_parser.parse_manga_list(manga), args.repeat)
+    print(f"  speedup: {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the response serialization fast path.
+
+Compares FastAPI's default path (build models, jsonable_encoder, json.dumps)
+with FastJSONResponse over pre-validated dicts, for a large chapter feed and
+a large library listing.
+
+Usage: python backend/benchmarks/serialization_bench.py [--chapters N] [--library N] [--repeat N]
+"""
+
+import argparse
+import json
+import sys
+import timeit
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from server import ChapterInfo, FastJSONResponse, UserLibrary, model_dict  # noqa: E402
+
+
+def chapter_items(count: int):
+    return [
+        jsonable_encoder(ChapterInfo(
+            id=str(uuid.uuid4()),
+            title=f"Chapter {i}",
+            chapter_number=float(i),
+            pages=20,
+            manga_id="a1c7c817-4e59-43b7-9365-09675a149a6f",
+            volume=str(i // 10),
+            published_date=datetime(2020, 1, 1, tzinfo=timezone.utc)
+        ))
+        for i in range(count)
+    ]
+
+
+def library_docs(count: int):
+    return [
+        UserLibrary(user_id="user123", manga_id=str(uuid.uuid4()), title=f"Manga {i}", cover_art="").model_dump()
+        for i in range(count)
+    ]
+
+
+def bench(label: str, fn, repeat: int):
+    best = min(timeit.repeat(fn, number=1, repeat=repeat))
+    print(f"  {label:<32} {best * 1000:8.2f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=2000)
+    parser.add_argument("--library", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    chapters = chapter_items(args.chapters)
+    library = library_docs(args.library)
+    render = FastJSONResponse(None).render
+
+    # The fast path must produce the same document as the default path
+    default_chapters = json.loads(json.dumps(jsonable_encoder({"chapters": [ChapterInfo(**item) for item in chapters]})))
+    assert json.loads(render({"chapters": chapters})) == default_chapters
+    default_library = json.loads(json.dumps(jsonable_encoder({"library": [UserLibrary(**doc) for doc in library]})))
+    assert json.loads(render({"library": [model_dict(UserLibrary, doc) for doc in library]})) == default_library
+
+    print(f"Chapter feed ({args.chapters} chapters)")
+    slow = bench("models + jsonable_encoder", lambda: json.dumps(jsonable_encoder({"chapters": [ChapterInfo(**item) for item in chapters]})), args.repeat)
+    fast = bench("FastJSONResponse(dicts)", lambda: render({"chapters": chapters}), args.repeat)
+    print(f"  speedup: {slow / fast:.1f}x")
+
+    print(f"Library ({args.library} items)")
+    slow = bench("models + jsonable_encoder", lambda: json.dumps(jsonable_encoder({"library": [UserLibrary(**doc) for doc in library]})), args.repeat)
+    fast = bench("model_dict + FastJSONResponse", lambda: render({"library": [model_dict(UserLibrary, doc) for doc in library]}), args.repeat)
+    print(f"  speedup: {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+from pymongo import ReplaceOne
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Age in seconds of the oldest stale value served for the current request
+stale_age: ContextVar[Optional[float]] = ContextVar("stale_age", default=None)
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    ttl: float
+    stale_ttl: float = 0
+    negative_ttl: float = 0
+    # How long past stale_ttl a value is kept as a fallback for when upstream fails
+    fallback_ttl: float = 0
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fresh_until: float
+    stale_until: float
+    negative: bool = False
+    fetched_at: float = 0
+    fallback_until: float = 0
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.fresh_until
+
+    def is_usable(self, now: float) -> bool:
+        return now < self.stale_until
+
+    def is_retained(self, now: float) -> bool:
+        return now < max(self.stale_until, self.fallback_until)
+
+
+class LRUCache:
+    """Bounded in-process tier; least recently used entries are evicted first."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.is_retained(time.time()):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CacheEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MongoCache:
+    """Shared tier stored in a MongoDB collection, expired by a TTL index."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        doc = await self.collection.find_one({"_id": key})
+        return self._entry(doc) if doc is not None else None
+
+    async def get_many(self, keys: List[str]) -> Dict[str, CacheEntry]:
+        entries = {}
+        async for doc in self.collection.find({"_id": {"$in": keys}}):
+            entry = self._entry(doc)
+            if entry is not None:
+                entries[doc["_id"]] = entry
+        return entries
+
+    async def set(self, key: str, entry: CacheEntry):
+        await self.collection.replace_one({"_id": key}, self._document(entry), upsert=True)
+
+    async def set_many(self, entries: Dict[str, CacheEntry]):
+        await self.collection.bulk_write(
+            [ReplaceOne({"_id": key}, self._document(entry), upsert=True) for key, entry in entries.items()],
+            ordered=False
+        )
+
+    async def delete(self, key: str):
+        await self.collection.delete_one({"_id": key})
+
+    @staticmethod
+    def _entry(doc: Dict[str, Any]) -> Optional[CacheEntry]:
+        entry = CacheEntry(
+            value=doc["value"],
+            fresh_until=doc["fresh_until"],
+            stale_until=doc["stale_until"],
+            negative=doc.get("negative", False),
+            fetched_at=doc.get("fetched_at", 0),
+            fallback_until=doc.get("fallback_until", 0)
+        )
+        return entry if entry.is_retained(time.time()) else None
+
+    @staticmethod
+    def _document(entry: CacheEntry) -> Dict[str, Any]:
+        return {
+            "value": entry.value,
+            "fresh_until": entry.fresh_until,
+            "stale_until": entry.stale_until,
+            "negative": entry.negative,
+            "fetched_at": entry.fetched_at,
+            "fallback_until": entry.fallback_until,
+            "expires_at": datetime.utcfromtimestamp(max(entry.stale_until, entry.fallback_until)) + timedelta(seconds=60)
+        }
+
+
+class TieredCache:
+    """
+    Read-through cache with an in-process LRU tier in front of a MongoDB tier.
+
+    Values must be BSON/JSON friendly. Entries past their TTL but within the
+    stale window are served immediately while a background refresh runs.
+    Past the stale window, values are kept for ``fallback_ttl`` more and
+    served only when fetching a fresh one fails. A 404 ``HTTPException``
+    raised by the fetch function is cached for the namespace's
+    ``negative_ttl`` and re-raised on later hits. Serving any stale value
+    records its age in the ``stale_age`` context variable.
+
+    Concurrent misses for the same key share one shared-tier read and one
+    fetch, and that fetch fills both tiers once, however many callers were
+    waiting on it.
+    """
+
+    def __init__(
+        self,
+        collection=None,
+        max_entries: int = 1024,
+        policies: Optional[Dict[str, CachePolicy]] = None,
+        flight: Optional[SingleFlight] = None
+    ):
+        self.memory = LRUCache(max_entries)
+        self.shared = MongoCache(collection) if collection is not None else None
+        self.policies = policies or {}
+        self.flight = flight or SingleFlight()
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def ensure_indexes(self):
+        if self.shared is not None:
+            await self.shared.ensure_indexes()
+
+    async def get_or_fetch(self, namespace: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        policy = self.policies.get(namespace, CachePolicy(ttl=60))
+        cache_key = f"{namespace}:{key}"
+        stats = self.stats[namespace]
+        now = time.time()
+
+        entry = self.memory.get(cache_key)
+        if entry is not None:
+            stats["l1_hits"] += 1
+        else:
+            entry = await self.flight.do(f"read:{cache_key}", lambda: self._shared_get(cache_key, stats))
+            if entry is not None:
+                stats["l2_hits"] += 1
+                self.memory.set(cache_key, entry)
+
+        if entry is not None and entry.is_usable(now):
+            if not entry.is_fresh(now):
+                stats["stale_hits"] += 1
+                self._mark_stale(entry, now)
+                self._schedule_refresh(namespace, cache_key, policy, fetch)
+            return self._unwrap(entry, stats)
+
+        stats["misses"] += 1
+        try:
+            fresh = await self.flight.do(cache_key, lambda: self._fetch(cache_key, policy, fetch))
+        except Exception as e:
+            # Upstream trouble: fall back to the last good value if we still have one
+            if entry is None or entry.negative or (isinstance(e, HTTPException) and e.status_code < 500):
+                raise
+            stats["fallback_hits"] += 1
+            logger.warning(f"Serving stale {cache_key} after fetch failure: {e}")
+            self._mark_stale(entry, now)
+            return entry.value
+        return self._unwrap(fresh)
+
+    async def peek(self, namespace: str, key: str, local_only: bool = False) -> Any:
+        """Return a cached value without fetching, or None on a miss or negative entry."""
+        cache_key = f"{namespace}:{key}"
+        entry = self.memory.get(cache_key)
+        if entry is None and not local_only:
+            entry = await self._shared_get(cache_key, self.stats[namespace])
+            if entry is not None:
+                self.memory.set(cache_key, entry)
+        if entry is None or entry.negative or not entry.is_usable(time.time()):
+            return None
+        return entry.value
+
+    async def peek_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """``peek`` for many keys: the in-process tier first, then one shared-tier query for the rest."""
+        now = time.time()
+        entries: Dict[str, CacheEntry] = {}
+        remote = []
+        for key in keys:
+            entry = self.memory.get(f"{namespace}:{key}")
+            if entry is not None:
+                entries[key] = entry
+            else:
+                remote.append(key)
+
+        if remote and self.shared is not None:
+            try:
+                shared = await self.shared.get_many([f"{namespace}:{key}" for key in remote])
+            except Exception as e:
+                self.stats[namespace]["errors"] += 1
+                logger.warning(f"Shared cache read of {len(remote)} {namespace} keys failed: {e}")
+                shared = {}
+            prefix = len(namespace) + 1
+            for cache_key, entry in shared.items():
+                self.memory.set(cache_key, entry)
+                entries[cache_key[prefix:]] = entry
+
+        return {key: entry.value for key, entry in entries.items() if not entry.negative and entry.is_usable(now)}
+
+    async def put_many(self, namespace: str, values: Dict[str, Any]):
+        """``put`` for many keys, written to the shared tier in one bulk write."""
+        if not values:
+            return
+        policy = self.policies.get(namespace, CachePolicy(ttl=60))
+        entries = {f"{namespace}:{key}": self._entry(value, policy) for key, value in values.items()}
+        for cache_key, entry in entries.items():
+            self.memory.set(cache_key, entry)
+        if self.shared is not None:
+            try:
+                await self.shared.set_many(entries)
+            except Exception as e:
+                logger.warning(f"Shared cache write of {len(entries)} {namespace} keys failed: {e}")
+
+    async def put(self, namespace: str, key: str, value: Any):
+        policy = self.policies.get(namespace, CachePolicy(ttl=60))
+
+        async def fetch():
+            return value
+
+        await self._fetch(f"{namespace}:{key}", policy, fetch)
+
+    async def invalidate(self, namespace: str, key: str):
+        cache_key = f"{namespace}:{key}"
+        self.memory.delete(cache_key)
+        if self.shared is not None:
+            try:
+                await self.shared.delete(cache_key)
+            except Exception as e:
+                logger.warning(f"Shared cache delete failed for {cache_key}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.memory),
+            "max_entries": self.memory.max_entries,
+            "namespaces": {namespace: dict(counters) for namespace, counters in self.stats.items()}
+        }
+
+    async def close(self):
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _fetch(self, cache_key: str, policy: CachePolicy, fetch: Callable[[], Awaitable[Any]]) -> CacheEntry:
+        now = time.time()
+        try:
+            entry = self._entry(await fetch(), policy, now)
+        except HTTPException as e:
+            if e.status_code != 404 or policy.negative_ttl <= 0:
+                raise
+            entry = CacheEntry(
+                value={"status_code": e.status_code, "detail": e.detail},
+                fresh_until=now + policy.negative_ttl,
+                stale_until=now + policy.negative_ttl,
+                negative=True,
+                fetched_at=now
+            )
+
+        self.memory.set(cache_key, entry)
+        if self.shared is not None:
+            try:
+                await self.shared.set(cache_key, entry)
+            except Exception as e:
+                logger.warning(f"Shared cache write failed for {cache_key}: {e}")
+        return entry
+
+    @staticmethod
+    def _entry(value: Any, policy: CachePolicy, now: Optional[float] = None) -> CacheEntry:
+        now = now if now is not None else time.time()
+        return CacheEntry(
+            value=value,
+            fresh_until=now + policy.ttl,
+            stale_until=now + policy.ttl + policy.stale_ttl,
+            fetched_at=now,
+            fallback_until=now + policy.ttl + policy.stale_ttl + policy.fallback_ttl
+        )
+
+    async def _shared_get(self, cache_key: str, stats: Dict[str, int]) -> Optional[CacheEntry]:
+        if self.shared is None:
+            return None
+        try:
+            return await self.shared.get(cache_key)
+        except Exception as e:
+            stats["errors"] += 1
+            logger.warning(f"Shared cache read failed for {cache_key}: {e}")
+            return None
+
+    def _schedule_refresh(self, namespace: str, cache_key: str, policy: CachePolicy, fetch: Callable[[], Awaitable[Any]]):
+        if cache_key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self.flight.do(cache_key, lambda: self._fetch(cache_key, policy, fetch))
+                self.stats[namespace]["refreshes"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats[namespace]["errors"] += 1
+                logger.warning(f"Background refresh failed for {cache_key}: {e}")
+            finally:
+                self._refreshing.pop(cache_key, None)
+
+        self._refreshing[cache_key] = asyncio.create_task(refresh())
+
+    @staticmethod
+    def _mark_stale(entry: CacheEntry, now: float):
+        age = now - entry.fetched_at if entry.fetched_at else 0
+        current = stale_age.get()
+        stale_age.set(age if current is None else max(current, age))
+
+    @staticmethod
+    def _unwrap(entry: CacheEntry, stats: Optional[Dict[str, int]] = None) -> Any:
+        if entry.negative:
+            if stats is not None:
+                stats["negative_hits"] += 1
+            raise HTTPException(status_code=entry.value["status_code"], detail=entry.value["detail"])
+        return entry.value
+
+
+class StaleResponseMiddleware:
+    """ASGI middleware that flags responses built from stale cache entries with ``Age`` and ``X-Cache-Status``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            age = stale_age.get()
+            if message["type"] == "http.response.start" and age is not None:
+                headers = list(message.get("headers", []))
+                headers.append((b"age", str(int(age)).encode()))
+                headers.append((b"x-cache-status", b"stale"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = stale_age.set(None)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stale_age.reset(token)
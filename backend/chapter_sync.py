@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from pymongo import ReplaceOne, UpdateOne
+
+import mangadex_parser
+from coordination import Coordinator
+
+logger = logging.getLogger(__name__)
+
+# MangaDex rejects offset + limit past this on list endpoints
+MAX_OFFSET = 10000
+# The global /chapter list caps limit and manga[] at 100
+CHAPTER_LIST_LIMIT = 100
+# updatedAtSince takes a naive UTC timestamp
+SINCE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+# Marks set from our own clock start this far back to cover skew with MangaDex
+CLOCK_SKEW = timedelta(minutes=5)
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def chapter_record(chapter_data: Dict[str, Any], manga_id: str) -> Dict[str, Any]:
+    """A stored chapter: the ChapterInfo dict plus its duplicate-upload key and upstream update time."""
+    return {
+        "_id": chapter_data["id"],
+        **mangadex_parser.parse_chapter(chapter_data, manga_id),
+        "upload_key": list(mangadex_parser.chapter_key(chapter_data)),
+        "updated_at": _parse_time((chapter_data.get("attributes") or {}).get("updatedAt")),
+    }
+
+
+class ChapterSync:
+    """
+    Keeps a local ``chapters`` collection in sync with MangaDex for every
+    manga in any user's library.
+
+    Each manga is fetched in full once (and again every ``full_interval``
+    seconds to drop chapters removed upstream). After that, a periodic check
+    asks the global ``/chapter`` list for chapters updated since each
+    manga's high-water mark, batching up to 100 manga per request, so a
+    title shared by many users is polled once. ``on_change`` is called with
+    the id of every manga whose chapters changed.
+
+    With a ``coordinator``, rounds run under a cluster-wide lease so only
+    one worker checks per ``interval``.
+    """
+
+    def __init__(
+        self,
+        db,
+        get: Callable[..., Awaitable[httpx.Response]],
+        interval: float = 1800,
+        full_interval: float = 7 * 86400,
+        feed_page_size: int = 500,
+        concurrency: int = 2,
+        on_change: Optional[Callable[[str], Awaitable[None]]] = None,
+        coordinator: Optional[Coordinator] = None
+    ):
+        self.db = db
+        self.get = get
+        self.interval = interval
+        self.full_interval = full_interval
+        self.feed_page_size = feed_page_size
+        self.concurrency = concurrency
+        self.on_change = on_change
+        self.coordinator = coordinator
+        self.stats: Dict[str, int] = defaultdict(int)
+        self.last_run: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._run_lock = asyncio.Lock()
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def local_chapters(self, manga_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Chapters in feed order, or None when this manga has not been fully synced."""
+        mark = await self.db.chapter_sync.find_one({"_id": manga_id}, {"full_synced_at": 1})
+        if mark is None or mark.get("full_synced_at") is None:
+            return None
+
+        chapters = []
+        seen = set()
+        cursor = self.db.chapters.find({"manga_id": manga_id}, {"updated_at": 0}).sort(
+            [("chapter_number", 1), ("published_date", 1)]
+        )
+        async for doc in cursor:
+            key = tuple(doc.pop("upload_key", None) or ("id", doc["_id"]))
+            del doc["_id"]
+            if key in seen:
+                continue
+            seen.add(key)
+            chapters.append(doc)
+        self.stats["local_reads"] += 1
+        return chapters
+
+    async def check(self) -> Dict[str, int]:
+        """Run one sync round over every manga in any library."""
+        async with self._run_lock:
+            manga_ids = [manga_id for manga_id in await self.db.user_library.distinct("manga_id") if manga_id]
+            marks = {doc["_id"]: doc async for doc in self.db.chapter_sync.find({"_id": {"$in": manga_ids}})}
+            full_before = datetime.utcnow() - timedelta(seconds=self.full_interval)
+
+            needs_full = [
+                manga_id for manga_id in manga_ids
+                if marks.get(manga_id, {}).get("full_synced_at") is None or marks[manga_id]["full_synced_at"] < full_before
+            ]
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def full(manga_id: str) -> bool:
+                async with semaphore:
+                    try:
+                        await self.full_sync(manga_id)
+                        return True
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        logger.warning(f"Full chapter sync for {manga_id} failed: {e}")
+                        return False
+
+            await asyncio.gather(*[full(manga_id) for manga_id in needs_full])
+
+            # Batch manga with similar marks so one updatedAtSince suits the whole batch
+            full_set = set(needs_full)
+            tracked = sorted(
+                (marks[manga_id]["high_water_mark"], manga_id) for manga_id in manga_ids
+                if manga_id not in full_set and marks.get(manga_id, {}).get("high_water_mark") is not None
+            )
+            for i in range(0, len(tracked), CHAPTER_LIST_LIMIT):
+                batch = tracked[i:i + CHAPTER_LIST_LIMIT]
+                try:
+                    await self.delta_sync([manga_id for _, manga_id in batch], batch[0][0])
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.warning(f"Chapter update check for {len(batch)} manga failed: {e}")
+
+            self.stats["rounds"] += 1
+            self.last_run = time.time()
+            return {"manga": len(manga_ids), "full_syncs": len(needs_full), "delta_batches": -(-len(tracked) // CHAPTER_LIST_LIMIT)}
+
+    async def full_sync(self, manga_id: str):
+        # Anything updated after this point is picked up by the next delta check
+        started = datetime.utcnow() - CLOCK_SKEW
+        records: Dict[str, Dict[str, Any]] = {}
+        offset = 0
+        while True:
+            response = await self.get(
+                f"/manga/{manga_id}/feed",
+                params={
+                    "limit": self.feed_page_size,
+                    "offset": offset,
+                    "order[chapter]": "asc",
+                    "translatedLanguage[]": "en"
+                }
+            )
+            response.raise_for_status()
+            page = response.json()
+            data = page.get("data", [])
+            for chapter_data in data:
+                records[chapter_data["id"]] = chapter_record(chapter_data, manga_id)
+            offset += len(data)
+            if not data or offset >= min(page.get("total", 0), MAX_OFFSET):
+                break
+
+        if records:
+            await self.db.chapters.bulk_write(
+                [ReplaceOne({"_id": chapter_id}, record, upsert=True) for chapter_id, record in records.items()],
+                ordered=False
+            )
+        # Chapters removed upstream (or no longer in English) disappear on the next full sync
+        removed = await self.db.chapters.delete_many({"manga_id": manga_id, "_id": {"$nin": list(records)}})
+        await self.db.chapter_sync.update_one(
+            {"_id": manga_id},
+            {"$set": {
+                "full_synced_at": datetime.utcnow(),
+                "high_water_mark": started,
+                "chapters": len(records)
+            }},
+            upsert=True
+        )
+        self.stats["full_syncs"] += 1
+        self.stats["chapters_written"] += len(records)
+        self.stats["chapters_removed"] += removed.deleted_count
+        await self._changed(manga_id)
+
+    async def delta_sync(self, manga_ids: List[str], since: datetime):
+        wanted = set(manga_ids)
+        changed: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        newest = since
+        cursor_since, offset = since, 0
+        while True:
+            response = await self.get(
+                "/chapter",
+                params={
+                    "manga[]": manga_ids,
+                    "updatedAtSince": cursor_since.strftime(SINCE_FORMAT),
+                    "order[updatedAt]": "asc",
+                    "translatedLanguage[]": "en",
+                    "limit": CHAPTER_LIST_LIMIT,
+                    "offset": offset
+                }
+            )
+            response.raise_for_status()
+            page = response.json()
+            data = page.get("data", [])
+            for chapter_data in data:
+                manga_id = mangadex_parser.chapter_manga_id(chapter_data)
+                if manga_id not in wanted:
+                    continue
+                record = chapter_record(chapter_data, manga_id)
+                changed[manga_id].append(record)
+                if record["updated_at"] and record["updated_at"] > newest:
+                    newest = record["updated_at"]
+            self.stats["delta_requests"] += 1
+
+            offset += len(data)
+            if not data or offset >= page.get("total", 0):
+                break
+            if offset + CHAPTER_LIST_LIMIT > MAX_OFFSET:
+                # Past the offset cap: restart the scan from the newest update seen so far
+                if newest <= cursor_since:
+                    logger.warning(f"More than {MAX_OFFSET} chapter updates share one timestamp, skipping the rest")
+                    break
+                cursor_since, offset = newest, 0
+
+        records = [record for manga_records in changed.values() for record in manga_records]
+        if records:
+            await self.db.chapters.bulk_write(
+                [ReplaceOne({"_id": record["_id"]}, record, upsert=True) for record in records],
+                ordered=False
+            )
+        # Every manga in the batch has been checked up to the newest update seen
+        if newest > since:
+            await self.db.chapter_sync.bulk_write(
+                [
+                    UpdateOne({"_id": manga_id, "high_water_mark": {"$lt": newest}}, {"$set": {"high_water_mark": newest}})
+                    for manga_id in manga_ids
+                ],
+                ordered=False
+            )
+        self.stats["chapters_written"] += len(records)
+        self.stats["manga_updated"] += len(changed)
+        for manga_id in changed:
+            await self._changed(manga_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "interval": self.interval, "last_run": self.last_run}
+
+    async def _changed(self, manga_id: str):
+        if self.on_change is None:
+            return
+        try:
+            await self.on_change(manga_id)
+        except Exception as e:
+            logger.warning(f"Chapter change callback for {manga_id} failed: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                if self.coordinator is None:
+                    await self.check()
+                else:
+                    # Kept after the round so other workers skip until the next interval
+                    async with self.coordinator.hold("chapter-sync", self.interval, release=False) as held:
+                        if held:
+                            await self.check()
+                            self.stats["cluster_rounds"] = await self.coordinator.incr("chapter-sync:rounds")
+                        else:
+                            self.stats["skipped_rounds"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Chapter sync round failed: {e}")
+            await asyncio.sleep(self.interval)
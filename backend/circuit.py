@@ -0,0 +1,131 @@
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Iterable, Tuple
+
+from fastapi import HTTPException
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(HTTPException):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"MangaDex {name} is unavailable, try again later",
+            headers={"Retry-After": str(max(1, round(retry_after)))}
+        )
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker over a sliding window of recent calls.
+
+    The circuit opens when at least ``min_calls`` of the last ``window``
+    calls were seen and either the failure rate or the slow-call rate
+    (calls over ``slow_call_seconds``) reaches its threshold. After
+    ``open_seconds`` up to ``half_open_calls`` trial calls are let through;
+    they close the circuit if all succeed, and any failure reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_rate: float = 0.8,
+        slow_call_seconds: float = 5.0,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.changed_at = 0.0
+        self.stats: Dict[str, int] = defaultdict(int)
+        # (failed, slow) per call
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._trials = 0
+        self._trial_successes = 0
+
+    def before_call(self):
+        """Raise ``CircuitOpenError`` unless a call may go upstream now."""
+        if self.state == OPEN:
+            remaining = self.changed_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, remaining)
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            # A trial call that never reported back (e.g. cancelled) must not block forever
+            if self._trials >= self.half_open_calls and time.monotonic() - self.changed_at >= self.open_seconds:
+                self._trials = 0
+                self.changed_at = time.monotonic()
+            if self._trials >= self.half_open_calls:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, self.open_seconds)
+            self._trials += 1
+
+    def record(self, failed: bool, duration: float):
+        slow = duration >= self.slow_call_seconds
+        self.stats["failures" if failed else "successes"] += 1
+
+        if self.state == HALF_OPEN:
+            if failed or slow:
+                self._transition(OPEN)
+                return
+            self._trial_successes += 1
+            if self._trial_successes >= self.half_open_calls:
+                self._transition(CLOSED)
+            return
+
+        self._calls.append((failed, slow))
+        if self.state == CLOSED and len(self._calls) >= self.min_calls:
+            failures = sum(1 for failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, slow in self._calls if slow)
+            if failures / len(self._calls) >= self.failure_rate or slow_calls / len(self._calls) >= self.slow_call_rate:
+                self._transition(OPEN)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "state": self.state, "state_code": STATE_CODES[self.state]}
+
+    def _transition(self, state: str):
+        self.state = state
+        self.stats[f"to_{state}"] += 1
+        self.changed_at = time.monotonic()
+        self._trials = 0
+        self._trial_successes = 0
+        if state == CLOSED:
+            self._calls.clear()
+
+
+class CircuitBreakers:
+    """
+    One ``CircuitBreaker`` per upstream endpoint, for a fixed set of ``names``.
+
+    Any other name shares the ``fallback`` breaker, so request input can
+    never allocate new breakers.
+    """
+
+    def __init__(self, names: Iterable[str], fallback: str = "other", **settings: Any):
+        self.fallback = fallback
+        self._breakers: Dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(name, **settings) for name in (*names, fallback)
+        }
+
+    def get(self, name: str) -> CircuitBreaker:
+        return self._breakers.get(name) or self._breakers[self.fallback]
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: breaker.get_stats() for name, breaker in self._breakers.items()}
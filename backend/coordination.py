@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class Coordinator(ABC):
+    """
+    Leases, counters and rate limits shared by every worker using the same backend.
+
+    A lease is owned by one worker until it is released or its ``ttl``
+    runs out; the owner may re-acquire it to extend it. Background jobs
+    hold a lease for as long as only one copy should run.
+
+    ``reserve`` books slots of a rate limit with the generic cell rate
+    algorithm: the backend stores one timestamp per limit, the time the
+    next request is due, and each request pushes it on by ``interval``.
+    ``tolerance`` is how far ahead of that time a burst may run.
+    """
+
+    def __init__(self, owner: Optional[str] = None):
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stats: Dict[str, int] = defaultdict(int)
+
+    @abstractmethod
+    async def acquire(self, name: str, ttl: float) -> bool:
+        ...
+
+    @abstractmethod
+    async def release(self, name: str):
+        ...
+
+    @abstractmethod
+    async def incr(self, name: str, amount: int = 1) -> int:
+        ...
+
+    @abstractmethod
+    async def counter(self, name: str) -> int:
+        ...
+
+    @abstractmethod
+    async def reserve(self, name: str, interval: float, tolerance: float, max_wait: float) -> Tuple[float, float]:
+        """
+        Book the next slot of limit ``name``.
+
+        Returns the seconds to wait for it and the limit's new due time
+        (epoch seconds). Nothing is booked when the wait exceeds ``max_wait``.
+        """
+        ...
+
+    async def ensure_indexes(self):
+        pass
+
+    @asynccontextmanager
+    async def hold(self, name: str, ttl: float, release: bool = True) -> AsyncIterator[bool]:
+        """
+        Acquire ``name`` and keep renewing it until the block exits.
+
+        Yields whether the lease was acquired; the block should do nothing
+        when it was not. With ``release=False`` the lease is left to expire,
+        so the job is skipped cluster-wide for ``ttl`` seconds after it ran.
+        """
+        acquired = await self._try_acquire(name, ttl)
+        if not acquired:
+            yield False
+            return
+
+        async def renew():
+            while True:
+                await asyncio.sleep(ttl / 3)
+                if not await self._try_acquire(name, ttl):
+                    logger.warning(f"Lost lease {name} while holding it")
+                    return
+
+        renewer = asyncio.create_task(renew())
+        try:
+            yield True
+        finally:
+            renewer.cancel()
+            await asyncio.gather(renewer, return_exceptions=True)
+            if release:
+                try:
+                    await self.release(name)
+                except Exception as e:
+                    logger.warning(f"Could not release lease {name}: {e}")
+            else:
+                # Restart the ttl from the end of the job rather than its last renewal
+                await self._try_acquire(name, ttl)
+
+    def get_stats(self) -> Dict[str, object]:
+        return {**self.stats, "backend": type(self).__name__, "owner": self.owner}
+
+    async def _try_acquire(self, name: str, ttl: float) -> bool:
+        try:
+            acquired = await self.acquire(name, ttl)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Could not acquire lease {name}: {e}")
+            return False
+        self.stats["acquired" if acquired else "contended"] += 1
+        return acquired
+
+
+class LocalCoordinator(Coordinator):
+    """In-process backend for single-worker deployments."""
+
+    def __init__(self, owner: Optional[str] = None):
+        super().__init__(owner)
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._slots: Dict[str, float] = {}
+
+    async def acquire(self, name: str, ttl: float) -> bool:
+        now = time.monotonic()
+        owner, expires_at = self._leases.get(name, (None, 0.0))
+        if owner not in (None, self.owner) and expires_at > now:
+            return False
+        self._leases[name] = (self.owner, now + ttl)
+        return True
+
+    async def release(self, name: str):
+        if self._leases.get(name, (None, 0.0))[0] == self.owner:
+            del self._leases[name]
+
+    async def incr(self, name: str, amount: int = 1) -> int:
+        self._counters[name] += amount
+        return self._counters[name]
+
+    async def counter(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+    async def reserve(self, name: str, interval: float, tolerance: float, max_wait: float) -> Tuple[float, float]:
+        wait, due = next_slot(self._slots.get(name), time.time(), interval, tolerance)
+        if wait <= max_wait:
+            self._slots[name] = due
+        return wait, due
+
+
+class MongoCoordinator(Coordinator):
+    """
+    Backend for several workers or nodes sharing one MongoDB.
+
+    Leases are documents whose ``owner`` may only be replaced once
+    ``expires_at`` has passed; the unique ``_id`` makes concurrent
+    takeovers fail with a duplicate key instead of both succeeding.
+    Counters are updated with ``$inc``. Rate limit slots are booked with a
+    compare-and-set on the stored due time, retried on conflicts. Expiry
+    and slots compare timestamps written by the workers, so their clocks
+    should be roughly in sync.
+    """
+
+    max_conflicts = 10
+
+    def __init__(self, collection, owner: Optional[str] = None):
+        super().__init__(owner)
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        # Expired leases are cleaned up eventually; correctness never depends on it
+        await self.collection.create_index("expires_at", expireAfterSeconds=3600)
+
+    async def acquire(self, name: str, ttl: float) -> bool:
+        now = datetime.utcnow()
+        try:
+            await self.collection.find_one_and_update(
+                {"_id": f"lease:{name}", "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=ttl)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Someone else holds an unexpired lease
+            return False
+        return True
+
+    async def release(self, name: str):
+        await self.collection.delete_one({"_id": f"lease:{name}", "owner": self.owner})
+
+    async def incr(self, name: str, amount: int = 1) -> int:
+        doc = await self.collection.find_one_and_update(
+            {"_id": f"counter:{name}"},
+            {"$inc": {"value": amount}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["value"]
+
+    async def counter(self, name: str) -> int:
+        doc = await self.collection.find_one({"_id": f"counter:{name}"})
+        return doc["value"] if doc else 0
+
+    async def reserve(self, name: str, interval: float, tolerance: float, max_wait: float) -> Tuple[float, float]:
+        key = f"rate:{name}"
+        for _ in range(self.max_conflicts):
+            doc = await self.collection.find_one({"_id": key})
+            current = doc["due"] if doc else None
+            now = time.time()
+            wait, due = next_slot(current, now, interval, tolerance)
+            if wait > max_wait:
+                return wait, due
+            # Idle limits are cleaned up by the expires_at TTL index
+            fields = {"due": due, "expires_at": datetime.utcnow() + timedelta(seconds=due - now)}
+            try:
+                if doc is None:
+                    await self.collection.insert_one({"_id": key, **fields})
+                    return wait, due
+                result = await self.collection.update_one({"_id": key, "due": current}, {"$set": fields})
+                if result.modified_count:
+                    return wait, due
+            except DuplicateKeyError:
+                pass
+            self.stats["rate_conflicts"] += 1
+        raise RuntimeError(f"Rate limit {name} stayed contended")
+
+
+def next_slot(due: Optional[float], now: float, interval: float, tolerance: float) -> Tuple[float, float]:
+    """One GCRA step: seconds until a request arriving at ``now`` may run, and the new due time."""
+    start = max(due or now, now)
+    return max(start - tolerance - now, 0.0), start + interval
+
+
+def create_coordinator(backend: str, collection=None) -> Coordinator:
+    if backend == "local":
+        return LocalCoordinator()
+    if backend == "mongo":
+        return MongoCoordinator(collection)
+    raise ValueError(f"Unknown coordination backend {backend!r}, expected 'local' or 'mongo'")
@@ -0,0 +1,384 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+import uuid
+import zipfile
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from image_cache import STALE_PARTIAL_SECONDS, ImageCache, ImageFetchError
+
+logger = logging.getLogger(__name__)
+
+SAFE_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+
+# (file name inside the archive without extension, candidate URLs in order of preference)
+PageSource = Tuple[str, List[str]]
+
+
+class DownloadQueueFull(Exception):
+    """Raised when no more download jobs can be queued."""
+
+
+class DownloadJob:
+    def __init__(self, chapter_id: str, path: Path):
+        self.id = str(uuid.uuid4())
+        self.chapter_id = chapter_id
+        self.path = path
+        self.status = "queued"
+        self.total_pages = 0
+        self.done_pages = 0
+        self.fallback_pages = 0
+        self.bytes = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "chapter_id": self.chapter_id,
+            "status": self.status,
+            "total_pages": self.total_pages,
+            "done_pages": self.done_pages,
+            "fallback_pages": self.fallback_pages,
+            "bytes": self.bytes,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], path: Path) -> "DownloadJob":
+        job = cls(data["chapter_id"], path)
+        for key in ("id", "status", "total_pages", "done_pages", "fallback_pages", "bytes", "error", "created_at", "finished_at"):
+            setattr(job, key, data.get(key, getattr(job, key)))
+        return job
+
+
+class DownloadManager:
+    """
+    Background worker pool that packs chapters into CBZ archives on disk.
+
+    ``resolve_pages(chapter_id)`` returns one ``PageSource`` per page. Each
+    page is tried against its URLs in order (full quality first, then the
+    data-saver copy), retrying every URL with jittered backoff. Pages are
+    appended to a ``.part`` archive as they arrive and the file is renamed
+    once complete, so a ``<chapter_id>.cbz`` on disk is always whole and is
+    reused by later jobs for the same chapter.
+
+    Archives are bounded by ``max_bytes`` in total. After each completed
+    job the least recently used ones (by mtime, refreshed whenever an
+    archive is reused or served) are deleted. The directory itself is the
+    index, so workers sharing it enforce one limit together.
+
+    With an ``image_cache``, pages are looked up there first, so a chapter
+    the user just read is not downloaded again, and pages fetched for an
+    archive are stored there for the reader.
+
+    With a ``collection``, job state is also written to MongoDB (on every
+    status change, and at most every ``save_interval`` seconds while pages
+    arrive) so any worker can answer for a job another one queued.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        resolve_pages: Callable[[str], Awaitable[List[PageSource]]],
+        http_client: Callable[[], httpx.AsyncClient],
+        workers: int = 2,
+        page_concurrency: int = 4,
+        max_retries: int = 2,
+        max_queued: int = 100,
+        max_jobs: int = 1000,
+        max_bytes: int = 5 * 1024 ** 3,
+        collection=None,
+        save_interval: float = 1.0,
+        image_cache: Optional[ImageCache] = None
+    ):
+        self.root = Path(root)
+        self.resolve_pages = resolve_pages
+        self.http_client = http_client
+        self.workers = workers
+        self.page_concurrency = page_concurrency
+        self.max_retries = max_retries
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self.collection = collection
+        self.save_interval = save_interval
+        self.image_cache = image_cache
+        self.total_bytes = 0
+        self.stats: Dict[str, int] = defaultdict(int)
+        self._queue: "asyncio.Queue[DownloadJob]" = asyncio.Queue(max_queued)
+        self._jobs: "OrderedDict[str, DownloadJob]" = OrderedDict()
+        self._active: Dict[str, DownloadJob] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Newer partial archives may belong to a download running in another worker
+        stale_before = time.time() - STALE_PARTIAL_SECONDS
+        for path in self.root.glob("*.part"):
+            try:
+                if path.stat().st_mtime < stale_before:
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+        self._evict()
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def path_for(self, chapter_id: str) -> Path:
+        if not SAFE_NAME.match(chapter_id):
+            raise ValueError("Invalid chapter id")
+        return self.root / f"{chapter_id}.cbz"
+
+    async def submit(self, chapter_id: str) -> DownloadJob:
+        """Queue a chapter, or return the job already working on it."""
+        active = self._active.get(chapter_id)
+        if active is not None:
+            self.stats["deduplicated"] += 1
+            return active
+
+        job = DownloadJob(chapter_id, self.path_for(chapter_id))
+        size = self._reuse(job.path)
+        if size is not None:
+            job.status = "completed"
+            job.bytes = size
+            job.finished_at = time.time()
+            self.stats["reused"] += 1
+        else:
+            try:
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull:
+                self.stats["rejected"] += 1
+                raise DownloadQueueFull()
+            self._active[chapter_id] = job
+            self.stats["queued"] += 1
+
+        self._jobs[job.id] = job
+        self._prune_jobs()
+        await self._save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[DownloadJob]:
+        return self._jobs.get(job_id)
+
+    async def find(self, job_id: str) -> Optional[DownloadJob]:
+        """Look a job up locally, then in the shared collection."""
+        job = self._jobs.get(job_id)
+        if job is not None or self.collection is None:
+            return job
+        try:
+            doc = await self.collection.find_one({"_id": job_id})
+        except Exception as e:
+            logger.warning(f"Download job lookup failed: {e}")
+            return None
+        if doc is None:
+            return None
+        self.stats["shared_lookups"] += 1
+        return DownloadJob.from_dict(doc, self.path_for(doc["chapter_id"]))
+
+    def touch(self, path: Path) -> bool:
+        """Mark an archive as recently used; False when it no longer exists."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            **self.stats,
+            "queued_jobs": self._queue.qsize(),
+            "active_jobs": len(self._active),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+    def _reuse(self, path: Path) -> Optional[int]:
+        # Touch and size in one try, since another worker may evict the archive in between
+        try:
+            os.utime(path)
+            return path.stat().st_size
+        except FileNotFoundError:
+            return None
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._active.pop(job.chapter_id, None)
+                self._queue.task_done()
+
+    async def _run(self, job: DownloadJob):
+        job.status = "running"
+        await self._save(job)
+        last_save = time.monotonic()
+        partial = job.path.with_name(f"{job.path.name}.{uuid.uuid4().hex}.part")
+        try:
+            pages = await self.resolve_pages(job.chapter_id)
+            job.total_pages = len(pages)
+            # Images are already compressed, so store them as-is
+            with zipfile.ZipFile(partial, "w", compression=zipfile.ZIP_STORED) as archive:
+                write_lock = asyncio.Lock()
+                semaphore = asyncio.Semaphore(self.page_concurrency)
+
+                async def fetch_page(name: str, urls: List[str]):
+                    nonlocal last_save
+                    async with semaphore:
+                        content, index = await self._fetch_page(urls)
+                    # The data-saver copy may be a different format, keep its extension
+                    suffix = Path(urlsplit(urls[index]).path).suffix
+                    async with write_lock:
+                        await asyncio.to_thread(archive.writestr, name + suffix, content)
+                    job.done_pages += 1
+                    job.fallback_pages += index > 0
+                    job.bytes += len(content)
+                    if time.monotonic() - last_save >= self.save_interval:
+                        last_save = time.monotonic()
+                        await self._save(job)
+
+                tasks = [asyncio.create_task(fetch_page(name, urls)) for name, urls in pages]
+                try:
+                    await asyncio.gather(*tasks)
+                finally:
+                    # One page failing fails the job; stop the others before the archive closes
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+            os.replace(partial, job.path)
+        except asyncio.CancelledError:
+            partial.unlink(missing_ok=True)
+            job.status = "failed"
+            job.error = "Cancelled"
+            job.finished_at = time.time()
+            await asyncio.shield(self._save(job))
+            raise
+        except Exception as e:
+            partial.unlink(missing_ok=True)
+            job.status = "failed"
+            job.error = str(e) or type(e).__name__
+            job.finished_at = time.time()
+            self.stats["failed"] += 1
+            logger.warning(f"Download of chapter {job.chapter_id} failed: {job.error}")
+            await self._save(job)
+            return
+
+        job.status = "completed"
+        job.finished_at = time.time()
+        self.stats["completed"] += 1
+        await self._save(job)
+        await asyncio.to_thread(self._evict)
+
+    async def _save(self, job: DownloadJob):
+        if self.collection is None:
+            return
+        # updated_at drives the TTL index that expires old jobs
+        doc = {**job.to_dict(), "updated_at": datetime.now(timezone.utc)}
+        try:
+            await self.collection.replace_one({"_id": job.id}, doc, upsert=True)
+        except Exception as e:
+            self.stats["save_errors"] += 1
+            logger.warning(f"Saving download job {job.id} failed: {e}")
+
+    async def _fetch_page(self, urls: List[str]) -> Tuple[bytes, int]:
+        # Any cached copy beats a download, even a data-saver one
+        for index, url in enumerate(urls):
+            content = await self._cached_page(url)
+            if content is not None:
+                self.stats["cached_pages"] += 1
+                return content, index
+
+        last_error: Exception = ImageFetchError(404)
+        for index, url in enumerate(urls):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await self._download_page(url), index
+                except ImageFetchError as e:
+                    last_error = e
+                    # Client errors will not fix themselves, move on to the next URL
+                    if 400 <= e.status_code < 500 and e.status_code != 429:
+                        break
+                except (httpx.TransportError, FileNotFoundError) as e:
+                    last_error = e
+                if attempt < self.max_retries:
+                    self.stats["page_retries"] += 1
+                    await asyncio.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+        raise last_error
+
+    async def _cached_page(self, url: str) -> Optional[bytes]:
+        key = _image_cache_key(url) if self.image_cache is not None else None
+        path = self.image_cache.lookup(*key) if key else None
+        if path is None:
+            return None
+        try:
+            return await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError:
+            return None
+
+    async def _download_page(self, url: str) -> bytes:
+        key = _image_cache_key(url) if self.image_cache is not None else None
+        if key is None:
+            response = await self.http_client().get(url)
+            if response.status_code != 200:
+                raise ImageFetchError(response.status_code)
+            return response.content
+        path = await self.image_cache.fetch(*key, url, self.http_client())
+        return await asyncio.to_thread(path.read_bytes)
+
+    def _evict(self):
+        # Blocking directory scan; the newest archive is always kept
+        archives = []
+        for path in self.root.glob("*.cbz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            archives.append((stat.st_mtime, path, stat.st_size))
+        archives.sort()
+
+        total = sum(size for _, _, size in archives)
+        for _, path, size in archives[:-1]:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.stats["evictions"] += 1
+        self.total_bytes = total
+
+    def _prune_jobs(self):
+        # Drop the oldest finished jobs; their archives stay on disk
+        while len(self._jobs) > self.max_jobs:
+            oldest = next((job_id for job_id, job in self._jobs.items() if job.finished), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
+
+
+def _image_cache_key(url: str) -> Optional[Tuple[str, str]]:
+    # At-home page URLs end in /<quality>/<chapter hash>/<filename>, the image cache's key
+    parts = urlsplit(url).path.rsplit("/", 2)
+    if len(parts) < 3 or not SAFE_NAME.match(parts[1]) or not SAFE_NAME.match(parts[2]):
+        return None
+    return parts[1], parts[2]
@@ -0,0 +1,52 @@
+"""
+Multi-worker deployment: gunicorn managing uvicorn workers.
+
+    cd backend && gunicorn -c gunicorn.conf.py server:app
+
+Every worker is a separate process with its own MongoDB pool, MangaDex
+client, caches and write-behind buffers. WEB_CONCURRENCY is exported to
+the workers so server.py can split the node's MongoDB connection budget
+(MONGO_POOL_BUDGET) and MangaDex rate limits between them, and switch
+coordination to MongoDB so background jobs run on one worker only. Nodes
+sharing a database coordinate through the same collection.
+
+/metrics is answered by whichever worker accepts the scrape, so workers
+write their metrics to METRICS_MULTIPROC_DIR and each scrape merges all
+of them into one set of totals for the node. The directory is emptied
+when gunicorn starts so totals restart from zero along with the server.
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', '8001')}")
+workers = int(os.environ.get("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+os.environ["WEB_CONCURRENCY"] = str(workers)
+os.environ.setdefault("METRICS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), f"manga-reader-metrics-{os.getpid()}"))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# The Motor client is created at import time and must not cross a fork
+preload_app = False
+
+# Long enough for slow MangaDex calls plus retries; shutdown flushes buffered progress
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers now and then so slow leaks cannot build up; jitter avoids restarting all at once
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max(1, max_requests // 10) if max_requests else 0
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Snapshots left by a previous run would add its totals to this one
+    directory = os.environ["METRICS_MULTIPROC_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, name))
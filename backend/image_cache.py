@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import mimetypes
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Awaitable, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SAFE_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+# Older partial downloads were left behind by a crashed process; newer ones may belong to a live worker
+STALE_PARTIAL_SECONDS = 3600
+
+
+class ImageFetchError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"Image fetch failed with HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ImageCache:
+    """
+    Content-addressed page image store on local disk.
+
+    Files live at ``<root>/<hash[:2]>/<chapter hash>/<filename>``. MangaDex
+    chapter hashes and page filenames never change content, so a cached file
+    is valid forever and only the total size is bounded (LRU by access).
+
+    The directory is the source of truth and may be shared by several
+    workers. A file missing from this process's index is still used when it
+    exists on disk. Every ``rescan_interval`` seconds the index is rebuilt
+    from the directory, so each worker evicts against the shared total, in
+    the mtime order that every access refreshes.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, rescan_interval: float = 300):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self.total_bytes = 0
+        self.stats: Dict[str, int] = defaultdict(int)
+        self._index: "OrderedDict[Path, int]" = OrderedDict()
+        self._flight = SingleFlight()
+        # Files stored while a rescan runs, which its snapshot may have missed
+        self._stored_during_scan: List[Path] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self):
+        """Rebuild the LRU index from disk; blocking, run it in a thread at startup."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._index, self.total_bytes = self._scan()
+        self._evict()
+
+    def start(self):
+        if self._task is None and self.rescan_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def rescan(self):
+        self._stored_during_scan = []
+        index, total = await asyncio.to_thread(self._scan)
+        for path in self._stored_during_scan:
+            if path not in index and path in self._index:
+                index[path] = self._index[path]
+                total += index[path]
+        self._index, self.total_bytes = index, total
+        self.stats["rescans"] += 1
+        self._evict()
+
+    def path_for(self, chapter_hash: str, filename: str) -> Path:
+        if not SAFE_NAME.match(chapter_hash) or not SAFE_NAME.match(filename):
+            raise ValueError("Invalid chapter hash or filename")
+        return self.root / chapter_hash[:2] / chapter_hash / filename
+
+    def lookup(self, chapter_hash: str, filename: str) -> Optional[Path]:
+        path = self.path_for(chapter_hash, filename)
+        if path not in self._index and not self._adopt(path):
+            return None
+        try:
+            # Touch the file so access order survives a restart and is shared with other workers
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another worker
+            self.total_bytes -= self._index.pop(path)
+            return None
+        self._index.move_to_end(path)
+        self.stats["hits"] += 1
+        return path
+
+    def contains(self, chapter_hash: str, filename: str) -> Optional[Path]:
+        """Like ``lookup`` but without counting a hit or refreshing LRU order."""
+        path = self.path_for(chapter_hash, filename)
+        return path if path in self._index or self._adopt(path) else None
+
+    async def fetch(self, chapter_hash: str, filename: str, url: str, http_client: httpx.AsyncClient) -> Path:
+        async def download(partial: Path):
+            async with http_client.stream("GET", url) as response:
+                if response.status_code != 200:
+                    raise ImageFetchError(response.status_code)
+                with open(partial, "wb") as f:
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        f.write(chunk)
+
+        return await self.get_or_create(chapter_hash, filename, download)
+
+    async def get_or_create(self, chapter_hash: str, filename: str, create: Callable[[Path], Awaitable[None]]) -> Path:
+        """Return the cached file, or have ``create`` write it to a temporary path first."""
+        path = self.lookup(chapter_hash, filename)
+        if path is not None:
+            return path
+        return await self._flight.do(str(self.path_for(chapter_hash, filename)), lambda: self._store(chapter_hash, filename, create))
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            **self.stats,
+            "files": len(self._index),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+    async def _store(self, chapter_hash: str, filename: str, create: Callable[[Path], Awaitable[None]]) -> Path:
+        path = self.path_for(chapter_hash, filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+        self.stats["misses"] += 1
+
+        try:
+            await create(partial)
+            os.replace(partial, path)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            self.stats["errors"] += 1
+            raise
+
+        size = path.stat().st_size
+        self.total_bytes += size - self._index.pop(path, 0)
+        self._index[path] = size
+        self._stored_during_scan.append(path)
+        self._evict()
+        return path
+
+    def _adopt(self, path: Path) -> bool:
+        # A file another worker stored since our last rescan
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return False
+        self._index[path] = size
+        self.total_bytes += size
+        self.stats["adopted"] += 1
+        return True
+
+    def _scan(self) -> Tuple["OrderedDict[Path, int]", int]:
+        # Blocking walk of the whole directory, oldest access first
+        files = []
+        stale_before = time.time() - STALE_PARTIAL_SECONDS
+        for path in self.root.rglob("*"):
+            try:
+                if not path.is_file():
+                    continue
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.name.endswith(".part"):
+                if stat.st_mtime < stale_before:
+                    path.unlink(missing_ok=True)
+                continue
+            files.append((stat.st_mtime, path, stat.st_size))
+
+        index: "OrderedDict[Path, int]" = OrderedDict()
+        for _, path, size in sorted(files):
+            index[path] = size
+        return index, sum(index.values())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.rescan_interval)
+            try:
+                await self.rescan()
+            except Exception as e:
+                logger.warning(f"Image cache rescan failed: {e}")
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._index) > 1:
+            path, size = self._index.popitem(last=False)
+            self.total_bytes -= size
+            self.stats["evictions"] += 1
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _read_range(f: BinaryIO, start: int, end: int) -> Iterator[bytes]:
+    with f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(request: Request, path: Path, etag: str, max_age: int = 31536000) -> Response:
+    """
+    Serve an immutable cached file with ETag, single-range and zero-copy support.
+
+    Raises FileNotFoundError when the file was evicted (possibly by another
+    worker) after it was looked up.
+    """
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}, immutable",
+        "Accept-Ranges": "bytes"
+    }
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    stat = path.stat()
+    size = stat.st_size
+    range_header = request.headers.get("range")
+    match = RANGE_HEADER.match(range_header.strip()) if range_header else None
+    if match and (request.headers.get("if-range") in (None, etag)):
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        elif last:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = 0, size - 1
+        if start > end or start >= size:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        # Opened now, so an eviction after this point cannot fail the response
+        return StreamingResponse(
+            _read_range(open(path, "rb"), start, end),
+            status_code=206,
+            media_type=media_type,
+            headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)}
+        )
+
+    # FileResponse uses the server's sendfile/pathsend support when available
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
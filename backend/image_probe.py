@@ -0,0 +1,87 @@
+import struct
+from pathlib import Path
+from typing import Optional, Tuple
+
+import httpx
+
+from image_cache import ImageFetchError
+
+# Enough for PNG, GIF and WebP headers and for most JPEGs
+PROBE_BYTES = 4096
+# JPEGs with large EXIF or ICC blocks put the frame header further in
+PROBE_MAX_BYTES = 64 * 1024
+
+# JPEG start-of-frame markers carry the dimensions; C4, C8 and CC are other segments
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            if i + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        (length,) = struct.unpack(">H", data[i + 2:i + 4])
+        i += 2 + length
+    return None
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """Read (width, height) from the first bytes of a PNG, JPEG, GIF or WebP image, or None."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] == b"\xff\xd8":
+        return _jpeg_size(data)
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L" and data[20] == 0x2F:
+            (bits,) = struct.unpack("<I", data[21:25])
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    return None
+
+
+def read_image_size(path: Path) -> Optional[Tuple[int, int]]:
+    """Blocking; run it in a thread."""
+    with open(path, "rb") as f:
+        return image_size(f.read(PROBE_MAX_BYTES))
+
+
+async def _read_prefix(http_client: httpx.AsyncClient, url: str, size: int) -> bytes:
+    data = b""
+    # Servers that ignore Range send the whole image; stop reading once we have enough
+    async with http_client.stream("GET", url, headers={"Range": f"bytes=0-{size - 1}"}) as response:
+        if response.status_code not in (200, 206):
+            raise ImageFetchError(response.status_code)
+        async for chunk in response.aiter_bytes():
+            data += chunk
+            if len(data) >= size:
+                break
+    return data[:size]
+
+
+async def probe_image_size(http_client: httpx.AsyncClient, url: str) -> Optional[Tuple[int, int]]:
+    """Fetch only the start of a remote image and parse its dimensions."""
+    data = await _read_prefix(http_client, url, PROBE_BYTES)
+    size = image_size(data)
+    if size is None and data[:2] == b"\xff\xd8" and len(data) >= PROBE_BYTES:
+        size = image_size(await _read_prefix(http_client, url, PROBE_MAX_BYTES))
+    return size
@@ -0,0 +1,97 @@
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from image_probe import read_image_size
+
+logger = logging.getLogger(__name__)
+
+PIL_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+# (chapter hash, full quality filename)
+PageKey = Tuple[str, str]
+
+
+def render_webp(source: str, dest: str, width: int, quality: int) -> Tuple[int, int]:
+    """Write ``source`` scaled down to ``width`` pixels as WebP; returns the source size. Runs in a worker process."""
+    from PIL import Image
+
+    with Image.open(source) as image:
+        size = image.size
+        frame = image if image.mode in ("RGB", "RGBA", "L") else image.convert("RGB")
+        if frame.width > width:
+            frame = frame.resize((width, max(1, round(frame.height * width / frame.width))), Image.LANCZOS)
+        frame.save(dest, "WEBP", quality=quality, method=4)
+    return size
+
+
+class ImagePipeline:
+    """
+    Resizes cached page images into WebP variants in a process pool.
+
+    Variant widths are limited to ``widths`` so the disk cache holds a small,
+    fixed number of copies per page. Source dimensions seen while rendering
+    or read from cached image headers are remembered per page. Without
+    Pillow installed the pipeline reports itself unavailable and callers
+    serve the original images.
+    """
+
+    def __init__(self, widths: List[int], quality: int = 80, workers: int = 2, max_dimensions: int = 100000):
+        self.widths = sorted(widths)
+        self.quality = quality
+        self.workers = workers
+        self.max_dimensions = max_dimensions
+        self.available = PIL_AVAILABLE and bool(self.widths)
+        self.dimensions: Dict[PageKey, Tuple[int, int]] = {}
+        self.stats: Dict[str, int] = defaultdict(int)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        if self.available and self._executor is None:
+            # Forking a process that runs an event loop and threads is unsafe
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def variant_width(self, requested: int) -> int:
+        """Smallest configured width that covers the request, else the largest one."""
+        return next((width for width in self.widths if width >= requested), self.widths[-1])
+
+    async def render(self, key: PageKey, source: Path, dest: Path, width: int):
+        self.start()
+        loop = asyncio.get_running_loop()
+        size = await loop.run_in_executor(self._executor, render_webp, str(source), str(dest), width, self.quality)
+        self.remember(key, size)
+        self.stats["rendered"] += 1
+
+    async def probe(self, key: PageKey, path: Path) -> Optional[Tuple[int, int]]:
+        size = self.dimensions.get(key)
+        if size is not None:
+            return size
+        try:
+            size = await asyncio.to_thread(read_image_size, path)
+        except OSError as e:
+            logger.info(f"Could not read image size of {path}: {e}")
+            return None
+        if size is None:
+            return None
+        self.remember(key, size)
+        self.stats["probed"] += 1
+        return size
+
+    def remember(self, key: PageKey, size: Tuple[int, int]):
+        self.dimensions[key] = size
+        # Forget the oldest entries first; dicts keep insertion order
+        while len(self.dimensions) > self.max_dimensions:
+            del self.dimensions[next(iter(self.dimensions))]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, "available": self.available, "known_dimensions": len(self.dimensions)}
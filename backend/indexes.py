@@ -0,0 +1,156 @@
+import logging
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+DUPLICATE_KEY = 11000
+
+logger = logging.getLogger(__name__)
+
+# Download jobs are kept for status lookups this long after their last update
+DOWNLOAD_JOB_TTL = 7 * 86400
+
+# Indexes backing the access patterns of the library, progress and bookmark routes
+INDEXES: Dict[str, List[IndexModel]] = {
+    "user_library": [
+        IndexModel([("user_id", ASCENDING), ("manga_id", ASCENDING)], unique=True, name="user_manga_unique"),
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="user_timestamp_id"),
+        # Readers of one manga, for the new-chapter checker
+        IndexModel([("manga_id", ASCENDING)], name="manga_id"),
+    ],
+    "reading_progress": [
+        IndexModel(
+            [("user_id", ASCENDING), ("manga_id", ASCENDING), ("chapter_id", ASCENDING)],
+            unique=True, name="user_manga_chapter_unique"
+        ),
+        IndexModel(
+            [("user_id", ASCENDING), ("manga_id", ASCENDING), ("timestamp", DESCENDING)],
+            name="user_manga_latest"
+        ),
+    ],
+    "chapters": [
+        IndexModel(
+            [("manga_id", ASCENDING), ("chapter_number", ASCENDING), ("published_date", ASCENDING)],
+            name="manga_chapter_order"
+        ),
+    ],
+    "bookmarks": [
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="user_timestamp_id"),
+        # One bookmark per page; its prefix also serves per-chapter lookups
+        IndexModel(
+            [("user_id", ASCENDING), ("manga_id", ASCENDING), ("chapter_id", ASCENDING), ("page_number", ASCENDING)],
+            unique=True, name="user_manga_chapter_page_unique"
+        ),
+    ],
+    "download_jobs": [
+        IndexModel([("updated_at", ASCENDING)], expireAfterSeconds=DOWNLOAD_JOB_TTL, name="updated_at_ttl"),
+    ],
+}
+
+# One representative query per route, used by check_query_plans
+QUERY_CHECKS: List[Dict[str, Any]] = [
+    {
+        "route": "GET /api/library/{user_id}", "collection": "user_library",
+        "filter": {"user_id": ""}, "sort": [("timestamp", DESCENDING), ("_id", DESCENDING)]
+    },
+    {"route": "POST /api/library/bulk", "collection": "user_library", "filter": {"user_id": "", "manga_id": {"$in": [""]}}},
+    {"route": "new-chapter checker", "collection": "user_library", "filter": {"manga_id": ""}},
+    {
+        "route": "POST /api/progress/update", "collection": "reading_progress",
+        "filter": {"user_id": "", "manga_id": "", "chapter_id": ""}
+    },
+    {
+        "route": "GET /api/progress/{user_id}/{manga_id}", "collection": "reading_progress",
+        "filter": {"user_id": "", "manga_id": ""}, "sort": [("timestamp", DESCENDING)]
+    },
+    {
+        "route": "GET /api/bookmarks/{user_id}", "collection": "bookmarks",
+        "filter": {"user_id": ""}, "sort": [("timestamp", DESCENDING), ("_id", DESCENDING)]
+    },
+    {
+        "route": "POST /api/bookmarks/bulk", "collection": "bookmarks",
+        "filter": {"user_id": "", "manga_id": "", "chapter_id": "", "page_number": 0}
+    },
+    {
+        "route": "GET /api/manga/{manga_id}/chapters", "collection": "chapters",
+        "filter": {"manga_id": ""}, "sort": [("chapter_number", ASCENDING), ("published_date", ASCENDING)]
+    },
+    {"route": "GET /api/users/{user_id}/continue", "collection": "reading_state", "filter": {"_id": ""}},
+]
+
+
+async def ensure_indexes(db, dedupe: bool = False):
+    """
+    Create every index on its own, so one failing leaves the others in place.
+
+    A unique index fails to build over duplicate documents written before it
+    existed. With ``dedupe`` those are removed first, keeping the oldest
+    document of each group; otherwise the failure is logged.
+    """
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            name = index.document["name"]
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as e:
+                if e.code != DUPLICATE_KEY or not dedupe:
+                    hint = " (set INDEX_DEDUPE=true to remove the duplicates)" if e.code == DUPLICATE_KEY else ""
+                    logger.error(f"Could not create index {name} on {collection}{hint}: {e}")
+                    continue
+                removed = await remove_duplicates(db[collection], list(index.document["key"]))
+                logger.warning(f"Removed {removed} duplicate documents from {collection} for index {name}")
+                try:
+                    await db[collection].create_indexes([index])
+                except OperationFailure as e:
+                    logger.error(f"Could not create index {name} on {collection}: {e}")
+
+
+async def remove_duplicates(collection, fields: List[str], batch_size: int = 1000) -> int:
+    """Delete all but the oldest document (lowest ``_id``) of every group sharing ``fields``."""
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": {field: f"${field}" for field in fields}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    removed = 0
+    extra: List[Any] = []
+    async for group in collection.aggregate(pipeline, allowDiskUse=True):
+        extra.extend(group["ids"][1:])
+        if len(extra) >= batch_size:
+            removed += (await collection.delete_many({"_id": {"$in": extra}})).deleted_count
+            extra = []
+    if extra:
+        removed += (await collection.delete_many({"_id": {"$in": extra}})).deleted_count
+    return removed
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for child in plan.get("inputStages", []) + [plan.get("inputStage")]:
+        if child:
+            stages.extend(_plan_stages(child))
+    return stages
+
+
+async def check_query_plans(db) -> List[Dict[str, Any]]:
+    """Run explain() for every route query and warn about collection scans."""
+    results = []
+    for check in QUERY_CHECKS:
+        cursor = db[check["collection"]].find(check["filter"])
+        if check.get("sort"):
+            cursor = cursor.sort(check["sort"])
+        explain = await cursor.explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        # Newer servers nest the classic plan under queryPlan
+        stages = _plan_stages(winning_plan.get("queryPlan", winning_plan))
+        collscan = "COLLSCAN" in stages
+        if collscan:
+            logger.warning(f"{check['route']} runs a COLLSCAN on {check['collection']}")
+        results.append({
+            "route": check["route"],
+            "collection": check["collection"],
+            "stages": stages,
+            "collscan": collscan
+        })
+    return results
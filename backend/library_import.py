@@ -0,0 +1,135 @@
+import xml.etree.ElementTree as ElementTree
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import orjson
+
+from search_index import tokenize
+
+IMPORT_FORMATS = ("ndjson", "mal", "anilist")
+
+MAL_STATUSES = {
+    "reading": "reading",
+    "completed": "completed",
+    "on-hold": "on_hold",
+    "dropped": "dropped",
+    "plan to read": "plan_to_read",
+}
+
+ANILIST_STATUSES = {
+    "CURRENT": "reading",
+    "REPEATING": "reading",
+    "COMPLETED": "completed",
+    "PAUSED": "on_hold",
+    "DROPPED": "dropped",
+    "PLANNING": "plan_to_read",
+}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def entry(title: Optional[str], status: Optional[str] = None, **extra: Any) -> Dict[str, Any]:
+    """An import row: a title to resolve (or a known ``manga_id``) plus optional library fields."""
+    return {"title": (title or "").strip(), "status": status, **{key: value for key, value in extra.items() if value is not None}}
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Rows of a line-delimited JSON file, as written by the export route.
+
+    Lines with ``"type": "bookmark"`` are passed through for the bookmark
+    import; everything else is a library row.
+    """
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield _ndjson_row(line, line_number)
+    if buffer.strip():
+        yield _ndjson_row(buffer, line_number + 1)
+
+
+def _ndjson_row(line: bytes, line_number: int) -> Dict[str, Any]:
+    try:
+        row = orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        raise ImportFormatError(f"Line {line_number} is not valid JSON: {e}")
+    if not isinstance(row, dict):
+        raise ImportFormatError(f"Line {line_number} is not a JSON object")
+    if row.get("type") == "bookmark":
+        return row
+    return entry(
+        row.get("title"), row.get("status"),
+        manga_id=row.get("manga_id"), cover_art=row.get("cover_art"), favorite=row.get("favorite"),
+        last_read_chapter=row.get("last_read_chapter"), last_read_page=row.get("last_read_page")
+    )
+
+
+async def iter_mal_xml(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """Rows of a MyAnimeList manga list export, parsed incrementally so large files never sit in memory."""
+    parser = ElementTree.XMLPullParser(events=("end",))
+    async for chunk in chunks:
+        try:
+            parser.feed(chunk)
+        except ElementTree.ParseError as e:
+            raise ImportFormatError(f"Invalid MyAnimeList XML: {e}")
+        for row in _mal_rows(parser):
+            yield row
+    try:
+        parser.close()
+    except ElementTree.ParseError as e:
+        raise ImportFormatError(f"Invalid MyAnimeList XML: {e}")
+    for row in _mal_rows(parser):
+        yield row
+
+
+def _mal_rows(parser: ElementTree.XMLPullParser) -> Iterator[Dict[str, Any]]:
+    for _, element in parser.read_events():
+        if element.tag != "manga":
+            continue
+        status = (element.findtext("my_status") or "").strip().lower()
+        yield entry(element.findtext("series_title"), MAL_STATUSES.get(status), mal_id=element.findtext("series_mangadb_id"))
+        # Drop the parsed subtree; only the current <manga> element is ever kept
+        element.clear()
+
+
+def iter_anilist(data: bytes) -> Iterator[Dict[str, Any]]:
+    """Rows of an AniList MediaListCollection (as returned by its GraphQL API, with or without the ``data`` wrapper)."""
+    try:
+        document = orjson.loads(data)
+    except orjson.JSONDecodeError as e:
+        raise ImportFormatError(f"Invalid AniList JSON: {e}")
+    if not isinstance(document, dict):
+        raise ImportFormatError("AniList JSON must be an object")
+    wrapped = document.get("data")
+    collection = (wrapped if isinstance(wrapped, dict) else document).get("MediaListCollection") or document
+    lists = collection.get("lists") if isinstance(collection, dict) else None
+    if not isinstance(lists, list):
+        raise ImportFormatError("AniList JSON has no MediaListCollection.lists")
+
+    for media_list in lists:
+        for list_entry in media_list.get("entries") or []:
+            media = list_entry.get("media") or {}
+            titles = media.get("title") or {}
+            yield entry(
+                titles.get("english") or titles.get("romaji") or titles.get("native"),
+                ANILIST_STATUSES.get(list_entry.get("status") or ""),
+                alt_titles=[title for title in titles.values() if title] or None,
+                anilist_id=media.get("id")
+            )
+
+
+def match_title(row: Dict[str, Any], candidates: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The first candidate manga whose title or alt title matches one of the row's titles token for token."""
+    wanted = {tuple(tokenize(title)) for title in [row["title"], *row.get("alt_titles", [])] if title}
+    wanted.discard(())
+    for candidate in candidates:
+        titles = [candidate.get("title", ""), *candidate.get("alt_titles", [])]
+        if any(tuple(tokenize(title)) in wanted for title in titles):
+            return candidate
+    return None
@@ -0,0 +1,132 @@
+"""
+One-pass extractors for MangaDex API payloads.
+
+Each function turns the ``data`` array of a MangaDex response into JSON-ready
+dicts shaped like the API models (MangaInfo, ChapterInfo), so results can be
+cached and serialized without building pydantic models. Missing languages,
+null chapter numbers and absent relationships fall back to defaults instead
+of raising.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+COVER_URL = "https://uploads.mangadex.org/covers/{manga_id}/{file_name}.256.jpg"
+PREFERRED_LANGUAGE = "en"
+# MangaDex ids are UUIDs; list endpoints reject a whole request over one malformed id
+MANGADEX_ID = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+
+def is_mangadex_id(value: str) -> bool:
+    return MANGADEX_ID.match(value) is not None
+
+
+def localized(values: Optional[Dict[str, str]], default: str = "") -> str:
+    """Pick the English value of a localized string map, else the first available one."""
+    if not values:
+        return default
+    value = values.get(PREFERRED_LANGUAGE)
+    if value is not None:
+        return value
+    return next(iter(values.values()), default)
+
+
+def parse_manga(manga_data: Dict[str, Any], manga_id: Optional[str] = None) -> Dict[str, Any]:
+    manga_id = manga_id or manga_data["id"]
+    attributes = manga_data.get("attributes") or {}
+
+    # Single pass over relationships for both the cover and the author
+    cover_art = ""
+    author = None
+    for rel in manga_data.get("relationships") or ():
+        rel_type = rel.get("type")
+        if rel_type == "cover_art" and not cover_art:
+            file_name = (rel.get("attributes") or {}).get("fileName")
+            if file_name:
+                cover_art = COVER_URL.format(manga_id=manga_id, file_name=file_name)
+        elif rel_type == "author" and author is None:
+            author = (rel.get("attributes") or {}).get("name")
+        if cover_art and author is not None:
+            break
+
+    titles = attributes.get("title") or {}
+    alt_titles = list(titles.values())
+    for alt_title in attributes.get("altTitles") or ():
+        alt_titles.extend(alt_title.values())
+
+    return {
+        "id": manga_id,
+        "title": localized(titles),
+        "description": (attributes.get("description") or {}).get(PREFERRED_LANGUAGE, ""),
+        "author": author or "Unknown",
+        "status": attributes.get("status") or "unknown",
+        "cover_art": cover_art,
+        "tags": [localized((tag.get("attributes") or {}).get("name")) for tag in attributes.get("tags") or ()],
+        "chapters": 0,
+        "source": "mangadex",
+        "alt_titles": list(dict.fromkeys(alt_titles)),
+    }
+
+
+def parse_manga_list(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [parse_manga(manga_data) for manga_data in data]
+
+
+def _iso_datetime(value: Optional[str]) -> Optional[str]:
+    # MangaDex already sends ISO 8601 with an offset; only normalise a trailing Z
+    if not value:
+        return None
+    return value[:-1] + "+00:00" if value.endswith("Z") else value
+
+
+def chapter_key(chapter_data: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Identity used to drop duplicate uploads: chapter number plus scanlation group."""
+    number = (chapter_data.get("attributes") or {}).get("chapter")
+    if number is None:
+        return ("id", chapter_data["id"])
+    group = None
+    for rel in chapter_data.get("relationships") or ():
+        if rel.get("type") == "scanlation_group":
+            group = rel.get("id")
+            break
+    return (number, group)
+
+
+def chapter_manga_id(chapter_data: Dict[str, Any]) -> Optional[str]:
+    for rel in chapter_data.get("relationships") or ():
+        if rel.get("type") == "manga":
+            return rel.get("id")
+    return None
+
+
+def parse_chapter(chapter_data: Dict[str, Any], manga_id: str) -> Dict[str, Any]:
+    attributes = chapter_data.get("attributes") or {}
+    number = attributes.get("chapter")
+    try:
+        chapter_number = float(number) if number else 0.0
+    except ValueError:
+        chapter_number = 0.0
+
+    return {
+        "id": chapter_data["id"],
+        "title": attributes.get("title") or (f"Chapter {number}" if number else "Oneshot"),
+        "chapter_number": chapter_number,
+        "pages": int(attributes.get("pages") or 0),
+        "manga_id": manga_id,
+        "volume": attributes.get("volume"),
+        "published_date": _iso_datetime(attributes.get("publishAt")),
+    }
+
+
+def parse_chapters(data: List[Dict[str, Any]], manga_id: str, seen: Optional[set] = None) -> List[Dict[str, Any]]:
+    """Parse a feed page, skipping chapters whose ``chapter_key`` is already in ``seen``."""
+    seen = set() if seen is None else seen
+    chapters = []
+    append = chapters.append
+    for chapter_data in data:
+        key = chapter_key(chapter_data)
+        if key in seen:
+            continue
+        seen.add(key)
+        append(parse_chapter(chapter_data, manga_id))
+    return chapters
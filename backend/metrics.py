@@ -0,0 +1,440 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Updated from pymongo's monitoring threads as well as the event loop
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def values(self) -> Dict[LabelValues, Any]:
+        """A copy of the current value of every label set."""
+        raise NotImplementedError
+
+    def combine(self, first: Any, second: Any) -> Any:
+        """Add up the values of one label set from two processes."""
+        return first + second
+
+    def format(self, values: Dict[LabelValues, Any]) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values.items()]
+
+    def samples(self) -> List[str]:
+        return self.format(self.values())
+
+    def render(self, values: Optional[Dict[LabelValues, Any]] = None) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples() if values is None else self.format(values))
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Metric):
+    """A gauge that is either set directly or read from ``callback`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Iterable[str] = (),
+        callback: Optional[Callable[[], Dict[LabelValues, float]]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def values(self) -> Dict[LabelValues, float]:
+        if self.callback is not None:
+            return dict(self.callback())
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label set: bucket counts (non-cumulative), sum, count
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def values(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        with self._lock:
+            return {key: (list(counts), total[0]) for key, (counts, total) in self._values.items()}
+
+    def combine(self, first: Tuple[List[int], float], second: Tuple[List[int], float]) -> Tuple[List[int], float]:
+        return [a + b for a, b in zip(first[0], second[0])], first[1] + second[1]
+
+    def format(self, values: Dict[LabelValues, Tuple[List[int], float]]) -> List[str]:
+        lines = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def metrics(self) -> List[Metric]:
+        return list(self._metrics.values())
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+class MultiprocessMetrics:
+    """
+    Aggregates a registry across worker processes through a shared directory.
+
+    Under gunicorn a scrape is answered by whichever worker accepts it, so
+    each worker writes a snapshot of its registry to ``directory`` every
+    ``interval`` seconds, at shutdown and whenever it answers a scrape;
+    ``render()`` then merges every snapshot. Counters and histograms of
+    workers that have exited are kept so totals never go backwards when a
+    worker is recycled; gauges only add up snapshots written in the last
+    few intervals, i.e. by workers that are still running. Snapshots of
+    other workers are up to ``interval`` seconds old.
+    """
+
+    def __init__(self, registry: MetricsRegistry, directory: Path, interval: float = 5.0):
+        self.registry = registry
+        self.directory = Path(directory)
+        self.interval = interval
+        # pid alone is not unique: a recycled worker's pid can be reused and would overwrite its totals
+        self.path = self.directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+        self.stats: Dict[str, int] = defaultdict(int)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.write()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "written_at": time.time(),
+            "metrics": {
+                metric.name: [[list(key), value] for key, value in metric.values().items()]
+                for metric in self.registry.metrics()
+            },
+        }
+
+    async def write(self):
+        # Values are read on the event loop: gauge callbacks look at state owned by it
+        snapshot = self.snapshot()
+        try:
+            await asyncio.to_thread(self._write, snapshot)
+        except OSError as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Could not write metrics snapshot to {self.path}: {e}")
+            return
+        self.stats["written"] += 1
+
+    async def render(self) -> str:
+        await self.write()
+        return await asyncio.to_thread(self.render_snapshots)
+
+    def render_snapshots(self) -> str:
+        merged = self.merge(self._read())
+        return "\n".join(
+            metric.render(merged.get(metric.name, {})) for metric in self.registry.metrics()
+        ) + "\n"
+
+    def merge(self, snapshots: Iterable[Dict[str, Any]]) -> Dict[str, Dict[LabelValues, Any]]:
+        metrics = {metric.name: metric for metric in self.registry.metrics()}
+        live_after = time.time() - 3 * self.interval
+        merged: Dict[str, Dict[LabelValues, Any]] = {name: {} for name in metrics}
+        for snapshot in snapshots:
+            live = snapshot.get("written_at", 0) >= live_after
+            for name, values in snapshot.get("metrics", {}).items():
+                metric = metrics.get(name)
+                if metric is None or (metric.kind == "gauge" and not live):
+                    continue
+                totals = merged[name]
+                for key, value in values:
+                    key = tuple(key)
+                    if isinstance(metric, Histogram):
+                        value = (value[0], value[1])
+                    totals[key] = metric.combine(totals[key], value) if key in totals else value
+        return merged
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "directory": str(self.directory)}
+
+    def _write(self, snapshot: Dict[str, Any]):
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(snapshot))
+        # Readers never see a half-written snapshot
+        os.replace(temporary, self.path)
+
+    def _read(self) -> List[Dict[str, Any]]:
+        snapshots = []
+        for path in self.directory.glob("*.json"):
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                # Removed or replaced while listing; the next scrape picks it up again
+                self.stats["errors"] += 1
+                continue
+        self.stats["merged"] = len(snapshots)
+        return snapshots
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.write()
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route template.
+
+    Labels use the matched route path (``/api/manga/{manga_id}``) rather
+    than the raw URL so label cardinality stays bounded. Streaming
+    responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app, latency: Histogram, in_flight: Gauge):
+        self.app = app
+        self.latency = latency
+        self.in_flight = in_flight
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        method = scope["method"]
+        self.in_flight.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.dec(method=method)
+            route = scope.get("route")
+            self.latency.observe(
+                time.perf_counter() - start,
+                method=method, route=getattr(route, "path", "unmatched"), status=status
+            )
+
+
+# MangaDex endpoints we call; "{id}" matches any single path segment
+UPSTREAM_ENDPOINTS = (
+    "/manga",
+    "/manga/{id}",
+    "/manga/{id}/feed",
+    "/chapter",
+    "/chapter/{id}",
+    "/at-home/server/{id}",
+)
+OTHER_ENDPOINT = "other"
+
+_ENDPOINT_SEGMENTS = [(template, template.strip("/").split("/")) for template in UPSTREAM_ENDPOINTS]
+
+
+def endpoint_template(path: str) -> str:
+    """
+    The upstream endpoint a path belongs to, e.g. ``/manga/<id>/feed`` -> ``/manga/{id}/feed``.
+
+    Every id position is collapsed whatever the id looks like, and paths
+    outside ``UPSTREAM_ENDPOINTS`` map to ``other``, so client-supplied ids
+    can never create new label values.
+    """
+    segments = path.strip("/").split("/")
+    for template, expected in _ENDPOINT_SEGMENTS:
+        if len(expected) == len(segments) and all(
+            part == "{id}" or part == segment for part, segment in zip(expected, segments)
+        ):
+            return template
+    return OTHER_ENDPOINT
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command per command name and collection."""
+
+    def __init__(self, duration: Histogram):
+        self.duration = duration
+        self._collections: Dict[Tuple[object, int], str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            # getMore names the cursor id first and the collection separately
+            collection = event.command.get("collection", "")
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+        self.duration.observe(
+            event.duration_micros / 1e6,
+            command=event.command_name, collection=collection, outcome=outcome
+        )
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Tracks open and checked-out connections per server."""
+
+    def __init__(self, connections: Gauge, checked_out: Gauge):
+        self.connections = connections
+        self.checked_out = checked_out
+
+    def _address(self, event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.connections.inc(address=self._address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.connections.dec(address=self._address(event))
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        self.checked_out.inc(address=self._address(event))
+
+    def connection_checked_in(self, event):
+        self.checked_out.dec(address=self._address(event))
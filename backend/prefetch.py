@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """
+    Runs best-effort background warm-up jobs with bounded concurrency.
+
+    Jobs are keyed so the same job is never queued twice. A job returns True
+    when it actually warmed something; that key is then skipped for
+    ``cooldown`` seconds. Jobs time out, can be cancelled by key, and are all
+    cancelled on ``close``.
+
+    A job may be held by an ``owner`` (a reader). Each owner holds at most
+    one job: scheduling another one, or ``release``, lets go of the previous
+    job, which is cancelled once no one holds it any more. Jobs scheduled
+    without an owner are never cancelled this way.
+    """
+
+    def __init__(self, max_concurrency: int = 2, max_pending: int = 100, timeout: float = 30, cooldown: float = 300):
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.stats: Dict[str, int] = defaultdict(int)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._completed: Dict[str, float] = {}
+        # Who wants each running job (None for owner-less callers), and the job each owner holds
+        self._holders: Dict[str, Set[Optional[str]]] = {}
+        self._held: Dict[str, str] = {}
+
+    def schedule(self, key: str, job: Callable[[], Awaitable[bool]], owner: Optional[str] = None) -> bool:
+        if owner is not None and self._held.get(owner) != key:
+            self.release(owner)
+
+        now = time.monotonic()
+        if key in self._tasks:
+            self.stats["deduplicated"] += 1
+            self._hold(key, owner)
+            return False
+        if now - self._completed.get(key, float("-inf")) < self.cooldown:
+            self.stats["deduplicated"] += 1
+            return False
+        if len(self._tasks) >= self.max_pending:
+            self.stats["dropped"] += 1
+            return False
+
+        task = asyncio.create_task(self._run(key, job))
+        self._tasks[key] = task
+        self._holders[key] = set()
+        self._hold(key, owner)
+        task.add_done_callback(lambda _: self._finished(key, task))
+        self.stats["scheduled"] += 1
+        return True
+
+    def release(self, owner: str) -> bool:
+        """Let go of the owner's job; returns True when that cancelled it."""
+        key = self._held.pop(owner, None)
+        holders = self._holders.get(key) if key is not None else None
+        if holders is None:
+            return False
+        holders.discard(owner)
+        if holders:
+            return False
+        self.stats["released"] += 1
+        return self.cancel(key)
+
+    def cancel(self, key: str) -> bool:
+        task = self._tasks.get(key)
+        if task is None:
+            return False
+        # Forget it now so the key can be scheduled again before the task winds down
+        self._finished(key, task)
+        task.cancel()
+        return True
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, "pending": len(self._tasks), "owners": len(self._held)}
+
+    def _hold(self, key: str, owner: Optional[str]):
+        self._holders[key].add(owner)
+        if owner is not None:
+            self._held[owner] = key
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._tasks.get(key) is not task:
+            return
+        del self._tasks[key]
+        for owner in self._holders.pop(key, ()):
+            if owner is not None and self._held.get(owner) == key:
+                del self._held[owner]
+
+    async def _run(self, key: str, job: Callable[[], Awaitable[bool]]):
+        try:
+            async with self._semaphore:
+                warmed = await asyncio.wait_for(job(), self.timeout)
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.info(f"Prefetch {key} failed: {e}")
+            return
+
+        if warmed:
+            self.stats["completed"] += 1
+            self._completed[key] = time.monotonic()
+            self._prune_completed()
+
+    def _prune_completed(self):
+        if len(self._completed) <= self.max_pending * 10:
+            return
+        cutoff = time.monotonic() - self.cooldown
+        self._completed = {key: done for key, done in self._completed.items() if done >= cutoff}
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressBuffer:
+    """
+    Write-behind buffer for reading progress.
+
+    Page turns only update an in-memory map; a background task writes the
+    latest state with one unordered ``bulk_write`` per collection every
+    ``flush_interval`` seconds, or sooner once ``max_pending`` entries are
+    waiting. ``latest`` exposes buffered entries so readers see their own
+    writes before they reach MongoDB. Entries being flushed stay readable
+    until their write succeeds.
+
+    An optional reading-state entry passed to ``add`` is merged into the
+    user's ``reading_state`` document (one document per user, keyed by
+    manga id) in the same flush.
+
+    Workers flush on their own timers, so every write only replaces a
+    stored entry with an older timestamp: a late flush of an earlier page
+    never rolls back a newer one written by another worker.
+    """
+
+    def __init__(self, db, flush_interval: float = 1.0, max_pending: int = 500):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.stats: Dict[str, int] = defaultdict(int)
+        self._pending: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        # Newest pending entry per (user_id, manga_id), so ``latest`` never scans the buffer
+        self._latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # user_id -> manga_id -> reading-state fields
+        self._states: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # The batch a flush is writing, still served to readers during the round trip
+        self._flushing_latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._flushing_states: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def start(self):
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        # Let the loop finish a flush in progress rather than cancel it mid-write
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def add(self, progress: Dict[str, Any], state: Optional[Dict[str, Any]] = None):
+        key = (progress["user_id"], progress["manga_id"], progress["chapter_id"])
+        if key in self._pending:
+            self.stats["coalesced"] += 1
+        self._pending[key] = progress
+        self._track_latest(progress)
+        if state is not None:
+            self._merge_state(progress["user_id"], progress["manga_id"], state)
+        self.stats["buffered"] += 1
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def latest(self, user_id: str, manga_id: str) -> Optional[Dict[str, Any]]:
+        pending = self._latest.get((user_id, manga_id))
+        flushing = self._flushing_latest.get((user_id, manga_id))
+        if flushing is None or (pending is not None and pending["timestamp"] >= flushing["timestamp"]):
+            return pending
+        return flushing
+
+    def pending_states(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        states = dict(self._flushing_states.get(user_id, {}))
+        for manga_id, state in self._states.get(user_id, {}).items():
+            states[manga_id] = {**states[manga_id], **state} if manga_id in states else state
+        return states
+
+    def discard_state(self, user_id: str, manga_id: str):
+        """Drop a pending reading_state update, e.g. for a manga removed from the library."""
+        for states in (self._states, self._flushing_states):
+            manga_states = states.get(user_id)
+            if manga_states and manga_states.pop(manga_id, None) is not None and not manga_states:
+                del states[user_id]
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending and not self._states:
+                return
+            batch, self._pending = self._pending, {}
+            states, self._states = self._states, {}
+            self._flushing_latest, self._latest = self._latest, {}
+            self._flushing_states = states
+
+            progress_ops = []
+            library_updates: Dict[Tuple[str, str], Dict[str, Any]] = {}
+            for (user_id, manga_id, chapter_id), progress in batch.items():
+                key = {"user_id": user_id, "manga_id": manga_id, "chapter_id": chapter_id}
+                # Insert when missing, otherwise only replace an older entry; either order works
+                progress_ops.append(UpdateOne(key, {"$setOnInsert": progress}, upsert=True))
+                progress_ops.append(UpdateOne({**key, "timestamp": {"$lt": progress["timestamp"]}}, {"$set": progress}))
+                current = library_updates.get((user_id, manga_id))
+                if current is None or progress["timestamp"] >= current["timestamp"]:
+                    library_updates[(user_id, manga_id)] = progress
+            library_ops = [
+                UpdateOne(
+                    {"user_id": user_id, "manga_id": manga_id, "last_read_at": {"$not": {"$gte": progress["timestamp"]}}},
+                    {"$set": {
+                        "last_read_chapter": progress["chapter_id"],
+                        "last_read_page": progress["page_number"],
+                        "last_read_at": progress["timestamp"]
+                    }}
+                )
+                for (user_id, manga_id), progress in library_updates.items()
+            ]
+
+            # Per user, one upsert creating the document, then one guarded update per manga that changed
+            state_ops = []
+            for user_id, manga_states in states.items():
+                created: Dict[str, Any] = {}
+                for manga_id, state in manga_states.items():
+                    # Missing values never overwrite what is already stored
+                    fields = {f"manga.{manga_id}.{field}": value for field, value in state.items() if value is not None}
+                    if not fields:
+                        continue
+                    created.update(fields)
+                    guard = {"_id": user_id}
+                    if state.get("timestamp") is not None:
+                        guard[f"manga.{manga_id}.timestamp"] = {"$not": {"$gte": state["timestamp"]}}
+                    state_ops.append(UpdateOne(guard, {"$set": fields}))
+                if created:
+                    state_ops.append(UpdateOne({"_id": user_id}, {"$setOnInsert": created}, upsert=True))
+
+            try:
+                if progress_ops:
+                    await self.db.reading_progress.bulk_write(progress_ops, ordered=False)
+                if library_ops:
+                    await self.db.user_library.bulk_write(library_ops, ordered=False)
+                if state_ops:
+                    await self.db.reading_state.bulk_write(state_ops, ordered=False)
+            except Exception as e:
+                # Retry next round
+                self._requeue(batch, states)
+                self.stats["flush_errors"] += 1
+                logger.error(f"Progress flush of {len(batch)} entries failed: {e}")
+                return
+            except BaseException:
+                # Cancelled mid-write: keep the batch for whoever flushes next
+                self._requeue(batch, states)
+                raise
+            finally:
+                # Written or back in the buffer; newer entries added meanwhile are in the buffer either way
+                self._flushing_latest = {}
+                self._flushing_states = {}
+
+            self.stats["flushes"] += 1
+            self.stats["written"] += len(batch)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            **self.stats,
+            "pending": len(self._pending),
+            "pending_states": sum(len(manga_states) for manga_states in self._states.values())
+        }
+
+    def _track_latest(self, progress: Dict[str, Any]):
+        key = (progress["user_id"], progress["manga_id"])
+        current = self._latest.get(key)
+        if current is None or progress["timestamp"] >= current["timestamp"]:
+            self._latest[key] = progress
+
+    def _merge_state(self, user_id: str, manga_id: str, state: Dict[str, Any]):
+        manga_states = self._states.setdefault(user_id, {})
+        current = manga_states.get(manga_id)
+        if current is None:
+            manga_states[manga_id] = state
+        elif state.get("timestamp") is None or current.get("timestamp") is None or state["timestamp"] >= current["timestamp"]:
+            manga_states[manga_id] = {**current, **state}
+
+    def _requeue(self, batch: Dict[Tuple[str, str, str], Dict[str, Any]], states: Dict[str, Dict[str, Dict[str, Any]]]):
+        # Put a failed batch back unless a newer event arrived meanwhile
+        for key, progress in batch.items():
+            if key not in self._pending:
+                self._pending[key] = progress
+                self._track_latest(progress)
+        for user_id, manga_states in states.items():
+            pending = self._states.setdefault(user_id, {})
+            for manga_id, state in manga_states.items():
+                pending[manga_id] = {**state, **pending[manga_id]} if manga_id in pending else state
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Mapping, Optional, Union
+
+from coordination import Coordinator
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a request cannot get a token before its deadline; ``retry_after`` is the bucket's wait in seconds."""
+
+    def __init__(self, retry_after: float = 0.0):
+        super().__init__(f"No token within the deadline, next one in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Async token bucket. Waiters queue in FIFO order behind a lock, so a
+    request either gets a token or gives up once its deadline passes.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, deadline: float):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(self.blocked_until - now, 0)
+                if wait == 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                if now + wait > deadline:
+                    raise RateLimitTimeout(wait)
+                await asyncio.sleep(wait)
+
+    def available(self) -> float:
+        """Tokens that could be taken right now, refilled up to the current time; never blocks."""
+        now = time.monotonic()
+        if self.blocked_until > now:
+            return 0.0
+        return min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+
+    def pause(self, seconds: float):
+        """Block the bucket, e.g. after upstream reported an exhausted quota."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class SharedTokenBucket:
+    """
+    Token bucket kept on a ``Coordinator``, so every worker draws from one
+    quota instead of a fixed share of it.
+
+    Each request books a slot with ``Coordinator.reserve`` and sleeps until
+    it is due; ``capacity`` requests may run back to back after an idle
+    period. When the backend fails, requests fall back to a local bucket
+    with ``fallback_share`` of the rate.
+    """
+
+    def __init__(self, coordinator: Coordinator, name: str, rate: float, capacity: float, fallback_share: float = 1.0):
+        self.coordinator = coordinator
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.interval = 1 / rate
+        self.tolerance = (capacity - 1) * self.interval
+        self.blocked_until = 0.0
+        # Due time of the last slot this worker booked, for a local estimate of the tokens left
+        self.last_due = 0.0
+        self.fallback = TokenBucket(rate * fallback_share, max(capacity * fallback_share, 1))
+        self.stats: Dict[str, int] = defaultdict(int)
+
+    def available(self) -> float:
+        """Estimate of the tokens left, from the last slot this worker booked; never blocks."""
+        if self.blocked_until > time.monotonic():
+            return 0.0
+        behind = max(self.last_due - time.time(), 0.0)
+        return max(min(self.capacity, (self.tolerance + self.interval - behind) / self.interval), 0.0)
+
+    async def acquire(self, deadline: float):
+        blocked = self.blocked_until - time.monotonic()
+        if blocked > 0:
+            if time.monotonic() + blocked > deadline:
+                raise RateLimitTimeout(blocked)
+            await asyncio.sleep(blocked)
+
+        max_wait = deadline - time.monotonic()
+        try:
+            wait, due = await self.coordinator.reserve(self.name, self.interval, self.tolerance, max_wait)
+        except Exception as e:
+            self.stats["fallbacks"] += 1
+            logger.warning(f"Shared rate limit {self.name} unavailable, using the local share: {e}")
+            await self.fallback.acquire(deadline)
+            return
+        if wait > max_wait:
+            raise RateLimitTimeout(wait)
+        self.last_due = max(self.last_due, due)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Block the bucket on this worker, e.g. after upstream reported an exhausted quota."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.fallback.pause(seconds)
+
+
+Bucket = Union[TokenBucket, SharedTokenBucket]
+
+
+class RateLimiter:
+    """Named token buckets plus the retry/backoff policy for upstream calls."""
+
+    def __init__(self, buckets: Dict[str, Bucket], max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_cap: float = 8.0, queue_timeout: float = 10.0):
+        self.buckets = buckets
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.queue_timeout = queue_timeout
+        self.stats: Dict[str, int] = defaultdict(int)
+
+    async def acquire(self, names: Iterable[str], deadline: Optional[float] = None):
+        deadline = deadline if deadline is not None else time.monotonic() + self.queue_timeout
+        for name in names:
+            try:
+                await self.buckets[name].acquire(deadline)
+            except RateLimitTimeout:
+                self.stats["queue_timeouts"] += 1
+                raise
+        self.stats["acquired"] += 1
+
+    def observe(self, names: Iterable[str], headers: Mapping[str, str]):
+        """Apply X-RateLimit-* headers from an upstream response to the given buckets."""
+        remaining = headers.get("x-ratelimit-remaining")
+        retry_at = headers.get("x-ratelimit-retry-after")
+        if remaining is None or retry_at is None:
+            return
+        try:
+            if int(remaining) > 0:
+                return
+            wait = float(retry_at) - time.time()
+        except ValueError:
+            return
+        if wait > 0:
+            self.stats["quota_pauses"] += 1
+            for name in names:
+                self.buckets[name].pause(wait)
+
+    def retry_delay(self, attempt: int, headers: Optional[Mapping[str, str]] = None) -> float:
+        """Delay before retry number ``attempt`` (0-based), honoring Retry-After."""
+        self.stats["retries"] += 1
+        retry_after = (headers or {}).get("retry-after")
+        if retry_after is not None:
+            try:
+                return float(retry_after) + random.uniform(0, self.backoff_base)
+            except ValueError:
+                pass
+        # Full jitter keeps retrying workers from synchronising
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            **self.stats,
+            "buckets": {
+                name: {"rate": bucket.rate, "tokens": round(bucket.available(), 2)}
+                for name, bucket in self.buckets.items()
+            }
+        }
@@ -0,0 +1,206 @@
+import bisect
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+TOKEN = re.compile(r"\w+")
+
+# Relative importance of each MangaInfo field when scoring a match
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "alt_titles": 2.0,
+    "author": 2.0,
+    "tags": 1.5,
+    "description": 0.3,
+}
+
+# Score multipliers for how a query token matched an indexed term
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.7
+FUZZY_MATCH = 0.5
+
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def tokenize(text: str) -> List[str]:
+    # Fold accents and case so "Shingeki" matches "shingéki"
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return TOKEN.findall(text.lower())
+
+
+def _deletes(term: str) -> Set[str]:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        # Adjacent transposition
+        return len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    return any(longer[:i] + longer[i + 1:] == shorter for i in range(len(longer)))
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over manga metadata with BM25 ranking.
+
+    Documents are MangaInfo dicts keyed by ``id``. Every query token must
+    match a term exactly, as a prefix (for as-you-type queries) or within one
+    edit (typos, via a symmetric-delete lookup).
+
+    With ``max_docs`` set, adding a document beyond the cap evicts the one
+    seen least recently; re-adding an unchanged document counts as seeing it.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_docs: Optional[int] = None):
+        self.k1 = k1
+        self.b = b
+        self.max_docs = max_docs
+        self.stats: Dict[str, int] = defaultdict(int)
+        # Ordered from least to most recently seen
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._doc_lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._deletes: Dict[str, Set[str]] = defaultdict(set)
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, doc: Dict[str, Any]) -> bool:
+        """Index or re-index a document. Returns False when it was already indexed unchanged."""
+        doc_id = doc["id"]
+        if self.docs.get(doc_id) == doc:
+            self.docs[doc_id] = self.docs.pop(doc_id)
+            return False
+        if doc_id in self.docs:
+            self.remove(doc_id)
+
+        frequencies: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(self._field_text(doc.get(field))):
+                frequencies[token] += weight
+
+        for term, frequency in frequencies.items():
+            if term not in self._postings:
+                self._vocabulary_dirty = True
+                for variant in _deletes(term):
+                    self._deletes[variant].add(term)
+            self._postings[term][doc_id] = frequency
+
+        length = sum(frequencies.values())
+        self.docs[doc_id] = doc
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+        if self.max_docs is not None:
+            while len(self.docs) > self.max_docs:
+                self.remove(next(iter(self.docs)))
+                self.stats["evicted"] += 1
+        return True
+
+    def remove(self, doc_id: str):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for field in FIELD_WEIGHTS:
+            for term in tokenize(self._field_text(doc.get(field))):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+                    for variant in _deletes(term):
+                        self._deletes[variant].discard(term)
+                    self._vocabulary_dirty = True
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        tokens = tokenize(query)
+        if not tokens or not self.docs:
+            return []
+
+        scores: Dict[str, float] = defaultdict(float)
+        candidates = None
+        for token in tokens:
+            token_scores = self._score_token(token)
+            if not token_scores:
+                return []
+            matched = set(token_scores)
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return []
+            for doc_id, score in token_scores.items():
+                scores[doc_id] += score
+
+        ranked = sorted(candidates, key=lambda doc_id: scores[doc_id], reverse=True)
+        return [self.docs[doc_id] for doc_id in ranked[:limit]]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "docs": len(self.docs), "terms": len(self._postings)}
+
+    def _score_token(self, token: str) -> Dict[str, float]:
+        scores: Dict[str, float] = defaultdict(float)
+        for term, multiplier in self._expand(token):
+            postings = self._postings[term]
+            idf = math.log(1 + (len(self.docs) - len(postings) + 0.5) / (len(postings) + 0.5))
+            average_length = self._total_length / len(self.docs)
+            for doc_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / average_length)
+                score = multiplier * idf * frequency * (self.k1 + 1) / (frequency + norm)
+                # A token counts once per document, through its best matching term
+                scores[doc_id] = max(scores[doc_id], score)
+        return scores
+
+    def _expand(self, token: str) -> Iterable[Tuple[str, float]]:
+        matches: Dict[str, float] = {}
+        if token in self._postings:
+            matches[token] = EXACT_MATCH
+
+        if len(token) >= MIN_PREFIX_LENGTH:
+            vocabulary = self._sorted_vocabulary()
+            start = bisect.bisect_left(vocabulary, token)
+            for term in vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+                if not term.startswith(token):
+                    break
+                matches.setdefault(term, PREFIX_MATCH)
+
+        if not matches and len(token) >= MIN_FUZZY_LENGTH:
+            candidates = set(self._deletes.get(token, ()))
+            for variant in _deletes(token):
+                if variant in self._postings:
+                    candidates.add(variant)
+                candidates.update(self._deletes.get(variant, ()))
+            for term in candidates:
+                if _within_one_edit(token, term):
+                    matches.setdefault(term, FUZZY_MATCH)
+
+        return matches.items()
+
+    def _sorted_vocabulary(self) -> List[str]:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        return self._vocabulary
+
+    @staticmethod
+    def _field_text(value: Any) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, (list, tuple)):
+            return " ".join(str(item) for item in value)
+        return str(value)
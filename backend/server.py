@@ -1,28 +1,293 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse, ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from bson import ObjectId
 import os
 import logging
+import importlib.util
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Literal, Tuple
 import uuid
 from datetime import datetime
 import httpx
 import asyncio
 import json
+import time
+import math
+import base64
+from contextlib import asynccontextmanager
+import orjson
+
+from cache import CachePolicy, StaleResponseMiddleware, TieredCache
+from circuit import CircuitBreakers
+from singleflight import SingleFlight
+from ratelimit import RateLimiter, RateLimitTimeout, SharedTokenBucket
+import mangadex_parser
+from image_cache import ImageCache, ImageFetchError, file_response
+from image_variants import ImagePipeline
+from image_probe import probe_image_size
+from prefetch import Prefetcher
+from downloads import DownloadManager, DownloadQueueFull
+from chapter_sync import ChapterSync
+from coordination import create_coordinator
+from library_import import IMPORT_FORMATS, ImportFormatError, iter_anilist, iter_mal_xml, iter_ndjson, match_title
+from indexes import ensure_indexes, check_query_plans
+from progress_buffer import ProgressBuffer
+from search_index import SearchIndex
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry, MongoCommandMetrics, MongoPoolMetrics,
+    MultiprocessMetrics, OTHER_ENDPOINT, UPSTREAM_ENDPOINTS, RequestMetricsMiddleware, endpoint_template
+)
+from tracing import (
+    MongoTracingListener, OTLPFileSink, RequestIdLogFilter, Tracer, TracingMiddleware, TracingTransport
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics, exported at /metrics
+metrics = MetricsRegistry()
+http_request_duration = metrics.histogram(
+    "http_request_duration_seconds", "API request latency by route template", ["method", "route", "status"]
+)
+http_requests_in_flight = metrics.gauge("http_requests_in_flight", "Requests currently being served", ["method"])
+upstream_request_duration = metrics.histogram(
+    "mangadex_request_duration_seconds", "MangaDex API call latency per attempt", ["endpoint", "status"]
+)
+mongo_command_duration = metrics.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by collection", ["command", "collection", "outcome"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+mongo_pool_connections = metrics.gauge("mongodb_pool_connections", "Open MongoDB connections", ["address"])
+mongo_pool_checked_out = metrics.gauge("mongodb_pool_checked_out_connections", "MongoDB connections in use", ["address"])
+
+# Request tracing: spans for MangaDex calls, MongoDB commands and serialization
+TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# OTLP/JSON lines file for finished traces; empty disables export
+TRACE_FILE = os.environ.get('TRACE_FILE', '')
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0.1'))
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '1'))
+
+trace_sink = OTLPFileSink(Path(TRACE_FILE)) if TRACE_FILE else None
+tracer = Tracer(trace_sink, sample_rate=TRACE_SAMPLE_RATE, slow_request_seconds=SLOW_REQUEST_SECONDS, enabled=TRACING_ENABLED)
+
+# Deployment: worker processes on this node (set by gunicorn.conf.py) and how they coordinate
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+COORDINATION_BACKEND = os.environ.get('COORDINATION_BACKEND', 'mongo' if WEB_CONCURRENCY > 1 else 'local')
+# MongoDB connections this node may open in total, split across its workers
+MONGO_POOL_BUDGET = int(os.environ.get('MONGO_POOL_BUDGET', '100'))
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', str(max(10, MONGO_POOL_BUDGET // WEB_CONCURRENCY))))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+# Directory the workers share /metrics snapshots through (set by gunicorn.conf.py); empty serves this process only
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR', '')
+METRICS_SNAPSHOT_INTERVAL = float(os.environ.get('METRICS_SNAPSHOT_INTERVAL', '5'))
+metrics_snapshots = (
+    MultiprocessMetrics(metrics, Path(METRICS_MULTIPROC_DIR), interval=METRICS_SNAPSHOT_INTERVAL)
+    if METRICS_MULTIPROC_DIR else None
+)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=min(MONGO_MIN_POOL_SIZE, MONGO_MAX_POOL_SIZE),
+    event_listeners=[
+        MongoCommandMetrics(mongo_command_duration),
+        MongoPoolMetrics(mongo_pool_connections, mongo_pool_checked_out),
+        MongoTracingListener(tracer)
+    ]
+)
 db = client[os.environ['DB_NAME']]
+coordinator = create_coordinator(COORDINATION_BACKEND, db.coordination)
+CHECK_QUERY_PLANS = os.environ.get('CHECK_QUERY_PLANS', 'false').lower() in ('1', 'true', 'yes')
+# Remove duplicate documents that block a unique index from being built (keeps the oldest of each)
+INDEX_DEDUPE = os.environ.get('INDEX_DEDUPE', 'false').lower() in ('1', 'true', 'yes')
+
+# Upstream HTTP client settings
+MANGADEX_BASE_URL = os.environ.get('MANGADEX_BASE_URL', 'https://api.mangadex.org')
+MANGADEX_MAX_CONNECTIONS = int(os.environ.get('MANGADEX_MAX_CONNECTIONS', '100'))
+MANGADEX_MAX_KEEPALIVE = int(os.environ.get('MANGADEX_MAX_KEEPALIVE', '20'))
+MANGADEX_KEEPALIVE_EXPIRY = float(os.environ.get('MANGADEX_KEEPALIVE_EXPIRY', '30'))
+MANGADEX_HTTP2 = os.environ.get('MANGADEX_HTTP2', 'false').lower() in ('1', 'true', 'yes')
+MANGADEX_CONNECT_TIMEOUT = float(os.environ.get('MANGADEX_CONNECT_TIMEOUT', '5'))
+MANGADEX_READ_TIMEOUT = float(os.environ.get('MANGADEX_READ_TIMEOUT', '15'))
+MANGADEX_WRITE_TIMEOUT = float(os.environ.get('MANGADEX_WRITE_TIMEOUT', '5'))
+MANGADEX_POOL_TIMEOUT = float(os.environ.get('MANGADEX_POOL_TIMEOUT', '5'))
+
+# Upstream rate limits (requests per second) and retry policy
+MANGADEX_RATE_GLOBAL = float(os.environ.get('MANGADEX_RATE_GLOBAL', '5'))
+MANGADEX_RATE_SEARCH = float(os.environ.get('MANGADEX_RATE_SEARCH', '2'))
+MANGADEX_RATE_AT_HOME = float(os.environ.get('MANGADEX_RATE_AT_HOME', str(40 / 60)))
+MANGADEX_MAX_RETRIES = int(os.environ.get('MANGADEX_MAX_RETRIES', '3'))
+MANGADEX_QUEUE_TIMEOUT = float(os.environ.get('MANGADEX_QUEUE_TIMEOUT', '10'))
+# The limits are per client IP: the workers draw from shared buckets on the coordinator,
+# and fall back to an even split if it is unavailable
+MANGADEX_RATE_SHARE = 1 / WEB_CONCURRENCY
+
+# Page image disk cache
+IMAGE_CACHE_DIR = Path(os.environ.get('IMAGE_CACHE_DIR', str(ROOT_DIR / 'image_cache')))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+# Workers sharing the directory re-read it this often to evict against the shared total
+IMAGE_CACHE_RESCAN_INTERVAL = float(os.environ.get('IMAGE_CACHE_RESCAN_INTERVAL', '300'))
+
+# Resized WebP page variants
+IMAGE_VARIANT_WIDTHS = [int(width) for width in os.environ.get('IMAGE_VARIANT_WIDTHS', '480,720,1080').split(',') if width.strip()]
+IMAGE_VARIANT_QUALITY = int(os.environ.get('IMAGE_VARIANT_QUALITY', '80'))
+IMAGE_PIPELINE_WORKERS = int(os.environ.get('IMAGE_PIPELINE_WORKERS', '2'))
+
+# Page dimension probing over Range requests
+PROBE_CONCURRENCY = int(os.environ.get('PROBE_CONCURRENCY', '8'))
+
+# Next-chapter prefetch
+PREFETCH_PAGES = int(os.environ.get('PREFETCH_PAGES', '3'))
+PREFETCH_NEAR_END = int(os.environ.get('PREFETCH_NEAR_END', '3'))
+PREFETCH_CONCURRENCY = int(os.environ.get('PREFETCH_CONCURRENCY', '2'))
+PREFETCH_TIMEOUT = float(os.environ.get('PREFETCH_TIMEOUT', '30'))
+
+# Offline chapter downloads (CBZ)
+DOWNLOAD_DIR = Path(os.environ.get('DOWNLOAD_DIR', str(ROOT_DIR / 'downloads')))
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', '2'))
+DOWNLOAD_PAGE_CONCURRENCY = int(os.environ.get('DOWNLOAD_PAGE_CONCURRENCY', '4'))
+DOWNLOAD_PAGE_RETRIES = int(os.environ.get('DOWNLOAD_PAGE_RETRIES', '2'))
+DOWNLOAD_MAX_QUEUED = int(os.environ.get('DOWNLOAD_MAX_QUEUED', '100'))
+DOWNLOAD_MAX_BYTES = int(os.environ.get('DOWNLOAD_MAX_BYTES', str(5 * 1024 ** 3)))
+
+# Progress write-behind
+PROGRESS_FLUSH_INTERVAL = float(os.environ.get('PROGRESS_FLUSH_INTERVAL', '1'))
+PROGRESS_FLUSH_MAX_PENDING = int(os.environ.get('PROGRESS_FLUSH_MAX_PENDING', '500'))
+
+# New-chapter checks for library manga (seconds; 0 disables the background checker)
+CHAPTER_SYNC_INTERVAL = float(os.environ.get('CHAPTER_SYNC_INTERVAL', '1800'))
+CHAPTER_SYNC_FULL_INTERVAL = float(os.environ.get('CHAPTER_SYNC_FULL_INTERVAL', str(7 * 86400)))
+CHAPTER_SYNC_CONCURRENCY = int(os.environ.get('CHAPTER_SYNC_CONCURRENCY', '2'))
+# Users whose continue-reading entries are updated per query when new chapters arrive
+STATE_REFRESH_BATCH = int(os.environ.get('STATE_REFRESH_BATCH', '500'))
+
+# Library and bookmark listings
+LIST_PAGE_SIZE = int(os.environ.get('LIST_PAGE_SIZE', '100'))
+LIST_MAX_PAGE_SIZE = int(os.environ.get('LIST_MAX_PAGE_SIZE', '1000'))
+
+# Bulk library/bookmark changes and list imports
+BULK_MAX_OPERATIONS = int(os.environ.get('BULK_MAX_OPERATIONS', '1000'))
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '200'))
+IMPORT_MAX_BYTES = int(os.environ.get('IMPORT_MAX_BYTES', str(20 * 1024 ** 2)))
+IMPORT_RESOLVE_CONCURRENCY = int(os.environ.get('IMPORT_RESOLVE_CONCURRENCY', '2'))
+
+# Local search index
+SEARCH_INDEX_MAX_DOCS = int(os.environ.get('SEARCH_INDEX_MAX_DOCS', '100000'))
+
+# Batch manga lookups
+MANGADEX_IDS_PER_REQUEST = 100
+MANGADEX_BATCH_CONCURRENCY = int(os.environ.get('MANGADEX_BATCH_CONCURRENCY', '3'))
+BATCH_MAX_IDS = int(os.environ.get('BATCH_MAX_IDS', '500'))
+
+# Chapter feed pagination (MangaDex caps feed pages at 500 and offset + limit at 10000)
+MANGADEX_FEED_PAGE_SIZE = int(os.environ.get('MANGADEX_FEED_PAGE_SIZE', '500'))
+MANGADEX_FEED_CONCURRENCY = int(os.environ.get('MANGADEX_FEED_CONCURRENCY', '4'))
+MANGADEX_FEED_MAX_OFFSET = 10000
+
+# Upstream circuit breakers, one per MangaDex endpoint
+MANGADEX_BREAKER_WINDOW = int(os.environ.get('MANGADEX_BREAKER_WINDOW', '20'))
+MANGADEX_BREAKER_MIN_CALLS = int(os.environ.get('MANGADEX_BREAKER_MIN_CALLS', '5'))
+MANGADEX_BREAKER_FAILURE_RATE = float(os.environ.get('MANGADEX_BREAKER_FAILURE_RATE', '0.5'))
+MANGADEX_BREAKER_SLOW_CALL_RATE = float(os.environ.get('MANGADEX_BREAKER_SLOW_CALL_RATE', '0.8'))
+MANGADEX_BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('MANGADEX_BREAKER_SLOW_CALL_SECONDS', '5'))
+MANGADEX_BREAKER_OPEN_SECONDS = float(os.environ.get('MANGADEX_BREAKER_OPEN_SECONDS', '30'))
+
+# Metadata cache settings (seconds)
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '2048'))
+# Last known good values kept this long past their stale window, served only while MangaDex fails
+CACHE_FALLBACK_TTL = float(os.environ.get('CACHE_FALLBACK_TTL', str(7 * 86400)))
+CACHE_POLICIES = {
+    "search": CachePolicy(
+        ttl=float(os.environ.get('CACHE_TTL_SEARCH', '300')),
+        stale_ttl=float(os.environ.get('CACHE_STALE_TTL_SEARCH', '900')),
+        fallback_ttl=CACHE_FALLBACK_TTL
+    ),
+    "manga": CachePolicy(
+        ttl=float(os.environ.get('CACHE_TTL_MANGA', '3600')),
+        stale_ttl=float(os.environ.get('CACHE_STALE_TTL_MANGA', '86400')),
+        negative_ttl=float(os.environ.get('CACHE_NEGATIVE_TTL', '300')),
+        fallback_ttl=CACHE_FALLBACK_TTL
+    ),
+    "chapters": CachePolicy(
+        ttl=float(os.environ.get('CACHE_TTL_CHAPTERS', '600')),
+        stale_ttl=float(os.environ.get('CACHE_STALE_TTL_CHAPTERS', '3600')),
+        fallback_ttl=CACHE_FALLBACK_TTL
+    ),
+    "at-home": CachePolicy(ttl=float(os.environ.get('CACHE_TTL_AT_HOME', '300'))),
+}
+
+upstream_flight = SingleFlight()
+metadata_cache = TieredCache(db.api_cache, max_entries=CACHE_MAX_ENTRIES, policies=CACHE_POLICIES, flight=upstream_flight)
+upstream_breakers = CircuitBreakers(
+    UPSTREAM_ENDPOINTS,
+    fallback=OTHER_ENDPOINT,
+    window=MANGADEX_BREAKER_WINDOW,
+    min_calls=MANGADEX_BREAKER_MIN_CALLS,
+    failure_rate=MANGADEX_BREAKER_FAILURE_RATE,
+    slow_call_rate=MANGADEX_BREAKER_SLOW_CALL_RATE,
+    slow_call_seconds=MANGADEX_BREAKER_SLOW_CALL_SECONDS,
+    open_seconds=MANGADEX_BREAKER_OPEN_SECONDS
+)
+image_cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, rescan_interval=IMAGE_CACHE_RESCAN_INTERVAL)
+image_pipeline = ImagePipeline(IMAGE_VARIANT_WIDTHS, quality=IMAGE_VARIANT_QUALITY, workers=IMAGE_PIPELINE_WORKERS)
+progress_buffer = ProgressBuffer(db, flush_interval=PROGRESS_FLUSH_INTERVAL, max_pending=PROGRESS_FLUSH_MAX_PENDING)
+manga_search_index = SearchIndex(max_docs=SEARCH_INDEX_MAX_DOCS)
+background_tasks = set()
+prefetcher = Prefetcher(max_concurrency=PREFETCH_CONCURRENCY, timeout=PREFETCH_TIMEOUT)
+upstream_limiter = RateLimiter(
+    {
+        "global": SharedTokenBucket(
+            coordinator, "mangadex:global", MANGADEX_RATE_GLOBAL, max(MANGADEX_RATE_GLOBAL, 1), MANGADEX_RATE_SHARE
+        ),
+        "search": SharedTokenBucket(
+            coordinator, "mangadex:search", MANGADEX_RATE_SEARCH, max(MANGADEX_RATE_SEARCH, 1), MANGADEX_RATE_SHARE
+        ),
+        "at-home": SharedTokenBucket(
+            coordinator, "mangadex:at-home", MANGADEX_RATE_AT_HOME, max(MANGADEX_RATE_AT_HOME * 10, 1), MANGADEX_RATE_SHARE
+        ),
+    },
+    max_retries=MANGADEX_MAX_RETRIES,
+    queue_timeout=MANGADEX_QUEUE_TIMEOUT
+)
+
+# Serialization
+def orjson_default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+class FastJSONResponse(ORJSONResponse):
+    # Routes can return this directly with plain dicts to skip jsonable_encoder;
+    # any models left in the content are dumped by pydantic-core
+    def render(self, content: Any) -> bytes:
+        with tracer.span("serialize json", category="serialization"):
+            return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+def upstream_span_name(path: str) -> str:
+    # Image paths on at-home nodes carry a chapter hash and a file name
+    for prefix in ("/data/", "/data-saver/"):
+        if path.startswith(prefix):
+            return prefix + "{hash}/{filename}"
+    return endpoint_template(path)
+
+def model_dict(model, doc: Dict[str, Any]) -> Dict[str, Any]:
+    # Fast path for documents we wrote ourselves: project the model's fields
+    # and fill defaults instead of re-validating every value
+    return {
+        name: doc[name] if name in doc else field.get_default(call_default_factory=True)
+        for name, field in model.model_fields.items()
+    }
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -38,6 +303,7 @@ class MangaInfo(BaseModel):
     tags: List[str]
     chapters: int
     source: str = "mangadex"
+    alt_titles: List[str] = []
 
 class ChapterInfo(BaseModel):
     id: str
@@ -53,6 +319,7 @@ class MangaPage(BaseModel):
     image_url: str
     width: int
     height: int
+    data_saver_url: Optional[str] = None
 
 class ReadingProgress(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -80,130 +347,833 @@ class UserLibrary(BaseModel):
     last_read_chapter: Optional[str] = None
     last_read_page: int = 0
     favorite: bool = False
-    status: str = "reading"  # reading, completed, on_hold, dropped
+    status: str = "reading"  # see LIBRARY_STATUSES
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+LIBRARY_STATUSES = ("reading", "completed", "on_hold", "dropped", "plan_to_read")
+
+class LibraryOperation(BaseModel):
+    op: Literal["add", "remove", "update"]
+    manga_id: str
+    # add
+    title: Optional[str] = None
+    cover_art: Optional[str] = None
+    # add and update
+    status: Optional[str] = None
+    favorite: Optional[bool] = None
+
+class LibraryBulkRequest(BaseModel):
+    user_id: str
+    operations: List[LibraryOperation]
+
+class BookmarkOperation(BaseModel):
+    op: Literal["add", "remove"]
+    # remove
+    id: Optional[str] = None
+    # add
+    manga_id: Optional[str] = None
+    chapter_id: Optional[str] = None
+    page_number: Optional[int] = None
+    title: Optional[str] = None
+
+class BookmarkBulkRequest(BaseModel):
+    user_id: str
+    operations: List[BookmarkOperation]
+
+class ContinueReading(BaseModel):
+    manga_id: str
+    title: Optional[str] = None
+    cover_art: Optional[str] = None
+    chapter_id: str
+    page_number: int
+    chapter_number: Optional[float] = None
+    next_chapter_id: Optional[str] = None
+    unread_count: Optional[int] = None
+    timestamp: datetime
+
 # MangaDex API Integration
+def upstream_failure(response: httpx.Response, detail: str) -> HTTPException:
+    """
+    The error for an upstream response that retries could not fix.
+
+    An exhausted quota or an overloaded MangaDex is temporary, so it becomes
+    a 503 with upstream's Retry-After when it sent one; anything else is a
+    502 rather than a failure of our own.
+    """
+    if response.status_code not in (429, 503):
+        return HTTPException(status_code=502, detail=detail)
+    
+    retry_after = None
+    try:
+        if response.headers.get("retry-after"):
+            retry_after = float(response.headers["retry-after"])
+        elif response.headers.get("x-ratelimit-retry-after"):
+            retry_after = float(response.headers["x-ratelimit-retry-after"]) - time.time()
+    except ValueError:
+        pass
+    headers = {"Retry-After": str(max(1, math.ceil(retry_after)))} if retry_after is not None else None
+    return HTTPException(status_code=503, detail=f"{detail}: MangaDex is busy, try again later", headers=headers)
+
 class MangaDexAPI:
-    BASE_URL = "https://api.mangadex.org"
+    BASE_URL = MANGADEX_BASE_URL
+    client: Optional[httpx.AsyncClient] = None
     
     @staticmethod
-    async def search_manga(query: str, limit: int = 20) -> List[MangaInfo]:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{MangaDexAPI.BASE_URL}/manga",
-                params={
-                    "title": query,
-                    "limit": limit,
-                    "includes[]": ["cover_art", "author"]
-                }
+    def create_client() -> httpx.AsyncClient:
+        http2 = MANGADEX_HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logging.getLogger(__name__).warning("MANGADEX_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+            http2 = False
+        
+        transport = httpx.AsyncHTTPTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=MANGADEX_MAX_CONNECTIONS,
+                max_keepalive_connections=MANGADEX_MAX_KEEPALIVE,
+                keepalive_expiry=MANGADEX_KEEPALIVE_EXPIRY
             )
+        )
+        return httpx.AsyncClient(
+            base_url=MangaDexAPI.BASE_URL,
+            transport=TracingTransport(transport, tracer, name=upstream_span_name),
+            timeout=httpx.Timeout(
+                connect=MANGADEX_CONNECT_TIMEOUT,
+                read=MANGADEX_READ_TIMEOUT,
+                write=MANGADEX_WRITE_TIMEOUT,
+                pool=MANGADEX_POOL_TIMEOUT
+            )
+        )
+    
+    @staticmethod
+    def http() -> httpx.AsyncClient:
+        # Lazily create the shared client so the API also works outside the app lifecycle
+        if MangaDexAPI.client is None or MangaDexAPI.client.is_closed:
+            MangaDexAPI.client = MangaDexAPI.create_client()
+        return MangaDexAPI.client
+    
+    @staticmethod
+    async def close():
+        if MangaDexAPI.client is not None:
+            await MangaDexAPI.client.aclose()
+            MangaDexAPI.client = None
+    
+    @staticmethod
+    def pool_stats() -> Dict[str, Any]:
+        http_client = MangaDexAPI.client
+        if http_client is None or http_client.is_closed:
+            return {"open": False}
+        
+        # httpx does not expose pool state publicly, so read it from the httpcore pool
+        transport = getattr(http_client._transport, "transport", http_client._transport)
+        pool = getattr(transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "open": True,
+            "http2": getattr(pool, "_http2", False),
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+            "pending_requests": len(getattr(pool, "_requests", [])),
+            "max_connections": MANGADEX_MAX_CONNECTIONS,
+            "max_keepalive_connections": MANGADEX_MAX_KEEPALIVE,
+        }
+    
+    @staticmethod
+    def rate_limit_buckets(path: str) -> List[str]:
+        if path.startswith("/at-home/"):
+            return ["at-home", "global"]
+        if path == "/manga":
+            return ["search", "global"]
+        return ["global"]
+    
+    @staticmethod
+    async def get(path: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        # Fail fast while the endpoint's circuit is open, throttle, then retry 429/5xx
+        # and connection errors with jittered backoff.
+        # The last response is returned so callers keep their own status handling.
+        endpoint = endpoint_template(path)
+        breaker = upstream_breakers.get(endpoint)
+        buckets = MangaDexAPI.rate_limit_buckets(path)
+        deadline = time.monotonic() + upstream_limiter.queue_timeout
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                await upstream_limiter.acquire(buckets, deadline)
+            except RateLimitTimeout as e:
+                raise HTTPException(
+                    status_code=503,
+                    detail="MangaDex rate limit exceeded, try again later",
+                    headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+                )
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=500, detail="Failed to search manga")
-            
-            data = response.json()
-            manga_list = []
+            start = time.perf_counter()
+            try:
+                response = await MangaDexAPI.http().get(path, params=params)
+            except httpx.TransportError as e:
+                duration = time.perf_counter() - start
+                upstream_request_duration.observe(duration, endpoint=endpoint, status="error")
+                breaker.record(True, duration)
+                if attempt >= upstream_limiter.max_retries:
+                    raise HTTPException(status_code=502, detail=f"MangaDex is unreachable: {type(e).__name__}") from e
+                await asyncio.sleep(upstream_limiter.retry_delay(attempt))
+                attempt += 1
+                continue
+            duration = time.perf_counter() - start
+            upstream_request_duration.observe(duration, endpoint=endpoint, status=str(response.status_code))
+            breaker.record(response.status_code >= 500, duration)
             
-            for manga_data in data.get("data", []):
-                # Get cover art
-                cover_art_url = ""
-                for rel in manga_data.get("relationships", []):
-                    if rel["type"] == "cover_art":
-                        cover_filename = rel["attributes"]["fileName"]
-                        cover_art_url = f"https://uploads.mangadex.org/covers/{manga_data['id']}/{cover_filename}.256.jpg"
-                        break
-                
-                # Get author
-                author = "Unknown"
-                for rel in manga_data.get("relationships", []):
-                    if rel["type"] == "author":
-                        author = rel["attributes"].get("name", "Unknown")
-                        break
-                
-                manga_info = MangaInfo(
-                    id=manga_data["id"],
-                    title=manga_data["attributes"]["title"].get("en", list(manga_data["attributes"]["title"].values())[0]),
-                    description=manga_data["attributes"]["description"].get("en", ""),
-                    author=author,
-                    status=manga_data["attributes"]["status"],
-                    cover_art=cover_art_url,
-                    tags=[tag["attributes"]["name"]["en"] for tag in manga_data["attributes"]["tags"]],
-                    chapters=0,
-                    source="mangadex"
-                )
-                manga_list.append(manga_info)
+            upstream_limiter.observe(buckets, response.headers)
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+            if attempt >= upstream_limiter.max_retries:
+                return response
             
-            return manga_list
+            delay = upstream_limiter.retry_delay(attempt, response.headers)
+            if response.status_code == 429:
+                for bucket in buckets:
+                    upstream_limiter.buckets[bucket].pause(delay)
+            if time.monotonic() + delay > deadline:
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    # Parsed results are JSON-ready dicts shaped like MangaInfo/ChapterInfo (see mangadex_parser)
     
     @staticmethod
-    async def get_manga_chapters(manga_id: str, limit: int = 100) -> List[ChapterInfo]:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{MangaDexAPI.BASE_URL}/manga/{manga_id}/feed",
-                params={
-                    "limit": limit,
-                    "order[chapter]": "asc",
-                    "translatedLanguage[]": "en"
-                }
-            )
+    async def search_manga(query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        response = await MangaDexAPI.get(
+            "/manga",
+            params={
+                "title": query,
+                "limit": limit,
+                "includes[]": ["cover_art", "author"]
+            }
+        )
+        
+        if response.status_code != 200:
+            raise upstream_failure(response, "Failed to search manga")
+        
+        return mangadex_parser.parse_manga_list(response.json().get("data", []))
+    
+    @staticmethod
+    async def get_many(manga_ids: List[str]) -> List[Dict[str, Any]]:
+        # The list endpoint accepts up to 100 ids[] per call; chunks are fetched concurrently
+        semaphore = asyncio.Semaphore(MANGADEX_BATCH_CONCURRENCY)
+        
+        async def fetch_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                response = await MangaDexAPI.get(
+                    "/manga",
+                    params={
+                        "ids[]": chunk,
+                        "limit": len(chunk),
+                        "includes[]": ["cover_art", "author"],
+                        "contentRating[]": ["safe", "suggestive", "erotica", "pornographic"]
+                    }
+                )
             
             if response.status_code != 200:
-                raise HTTPException(status_code=500, detail="Failed to get chapters")
-            
-            data = response.json()
-            chapters = []
-            
-            for chapter_data in data.get("data", []):
-                chapter_info = ChapterInfo(
-                    id=chapter_data["id"],
-                    title=chapter_data["attributes"]["title"] or f"Chapter {chapter_data['attributes']['chapter']}",
-                    chapter_number=float(chapter_data["attributes"]["chapter"] or 0),
-                    pages=int(chapter_data["attributes"]["pages"] or 0),
-                    manga_id=manga_id,
-                    volume=chapter_data["attributes"]["volume"],
-                    published_date=datetime.fromisoformat(chapter_data["attributes"]["publishAt"].replace("Z", "+00:00")) if chapter_data["attributes"]["publishAt"] else None
-                )
-                chapters.append(chapter_info)
+                raise upstream_failure(response, "Failed to get manga")
             
-            return chapters
+            return mangadex_parser.parse_manga_list(response.json().get("data", []))
+        
+        chunks = [manga_ids[i:i + MANGADEX_IDS_PER_REQUEST] for i in range(0, len(manga_ids), MANGADEX_IDS_PER_REQUEST)]
+        results = await asyncio.gather(*[fetch_chunk(chunk) for chunk in chunks])
+        return [manga for chunk in results for manga in chunk]
+    
+    @staticmethod
+    async def get_manga_details(manga_id: str) -> Dict[str, Any]:
+        response = await MangaDexAPI.get(
+            f"/manga/{manga_id}",
+            params={"includes[]": ["cover_art", "author"]}
+        )
+        
+        # MangaDex answers 400 for malformed ids; anything else is an upstream failure, not a miss
+        if response.status_code in (400, 404):
+            raise HTTPException(status_code=404, detail="Manga not found")
+        if response.status_code != 200:
+            raise upstream_failure(response, "Failed to get manga")
+        
+        return mangadex_parser.parse_manga(response.json()["data"], manga_id)
+    
+    @staticmethod
+    async def get_feed_page(manga_id: str, offset: int) -> Dict[str, Any]:
+        response = await MangaDexAPI.get(
+            f"/manga/{manga_id}/feed",
+            params={
+                "limit": MANGADEX_FEED_PAGE_SIZE,
+                "offset": offset,
+                "order[chapter]": "asc",
+                "translatedLanguage[]": "en"
+            }
+        )
+        
+        if response.status_code != 200:
+            raise upstream_failure(response, "Failed to get chapters")
+        
+        return response.json()
+    
+    @staticmethod
+    async def iter_manga_chapters(manga_id: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        # The first page tells us the feed size; the remaining pages are fetched
+        # concurrently but yielded in order so callers can stream them
+        first_page = await MangaDexAPI.get_feed_page(manga_id, 0)
+        total = min(first_page.get("total", 0), MANGADEX_FEED_MAX_OFFSET)
+        semaphore = asyncio.Semaphore(MANGADEX_FEED_CONCURRENCY)
+        # Shared across pages so duplicate (chapter, scanlation group) uploads are dropped
+        seen = set()
+        
+        async def fetch_page(offset: int) -> Dict[str, Any]:
+            async with semaphore:
+                return await MangaDexAPI.get_feed_page(manga_id, offset)
+        
+        tasks = [
+            asyncio.ensure_future(fetch_page(offset))
+            for offset in range(MANGADEX_FEED_PAGE_SIZE, total, MANGADEX_FEED_PAGE_SIZE)
+        ]
+        try:
+            yield mangadex_parser.parse_chapters(first_page.get("data", []), manga_id, seen)
+            for task in tasks:
+                page = await task
+                yield mangadex_parser.parse_chapters(page.get("data", []), manga_id, seen)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    @staticmethod
+    async def get_manga_chapters(manga_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        chapters = []
+        async for page in MangaDexAPI.iter_manga_chapters(manga_id):
+            chapters.extend(page)
+        return chapters[:limit] if limit is not None else chapters
+    
+    @staticmethod
+    async def get_at_home_server(chapter_id: str) -> Dict[str, Any]:
+        response = await MangaDexAPI.get(f"/at-home/server/{chapter_id}")
+        
+        if response.status_code != 200:
+            raise upstream_failure(response, "Failed to get chapter pages")
+        
+        return response.json()
+    
+    @staticmethod
+    def build_pages(data: Dict[str, Any]) -> List[MangaPage]:
+        base_url = data["baseUrl"]
+        chapter_hash = data["chapter"]["hash"]
+        pages_data = data["chapter"]["data"]
+        data_saver = data["chapter"].get("dataSaver") or []
+        
+        pages = []
+        for i, page_filename in enumerate(pages_data):
+            page_url = f"{base_url}/data/{chapter_hash}/{page_filename}"
+            pages.append(MangaPage(
+                page_number=i + 1,
+                image_url=page_url,
+                width=0,  # Filled in when the image is known locally
+                height=0,
+                data_saver_url=f"{base_url}/data-saver/{chapter_hash}/{data_saver[i]}" if i < len(data_saver) else None
+            ))
+        
+        return pages
+
+# Local search index
+def remember_manga(items: List[Dict[str, Any]]):
+    # Index every manga we have seen and persist new or changed entries to the catalog
+    changed = [item for item in items if manga_search_index.add(item)]
+    if not changed:
+        return
+    
+    async def persist():
+        try:
+            await db.manga_catalog.bulk_write(
+                [ReplaceOne({"_id": item["id"]}, item, upsert=True) for item in changed],
+                ordered=False
+            )
+        except Exception as e:
+            logger.warning(f"Could not persist {len(changed)} manga to the catalog: {e}")
+    
+    task = asyncio.create_task(persist())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def load_search_index():
+    async for doc in db.manga_catalog.find({}).limit(SEARCH_INDEX_MAX_DOCS):
+        doc.pop("_id", None)
+        manga_search_index.add(doc)
+    logger.info(f"Loaded {len(manga_search_index)} manga into the search index")
+
+# Cached MangaDex access
+class CachedMangaDexAPI:
+    # MangaDexAPI results are JSON-ready dicts, cached as-is so both cache tiers return identical data.
+    # Concurrent misses for the same key share one upstream request and one cache fill.
+    # The *_items methods return those JSON dicts as-is for routes that serialize them directly.
+    
+    @staticmethod
+    async def search_manga_items(query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        key = f"{query.strip().lower()}:{limit}"
+        
+        async def fetch():
+            return await MangaDexAPI.search_manga(query, limit)
+        
+        items = await metadata_cache.get_or_fetch("search", key, fetch)
+        remember_manga(items)
+        return items
+    
+    @staticmethod
+    async def get_manga_details_item(manga_id: str) -> Dict[str, Any]:
+        async def fetch():
+            return await MangaDexAPI.get_manga_details(manga_id)
+        
+        item = await metadata_cache.get_or_fetch("manga", manga_id, fetch)
+        remember_manga([item])
+        return item
+    
+    @staticmethod
+    async def get_many_items(manga_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        # Malformed ids can never match and would fail their whole upstream chunk, so they are left out as missing
+        manga_ids = [manga_id for manga_id in manga_ids if mangadex_parser.is_mangadex_id(manga_id)]
+        found = await metadata_cache.peek_many("manga", manga_ids)
+        
+        missing = [manga_id for manga_id in manga_ids if manga_id not in found]
+        if missing:
+            fetched = await MangaDexAPI.get_many(missing)
+            fetched_items = {item["id"]: item for item in fetched}
+            await metadata_cache.put_many("manga", fetched_items)
+            found.update(fetched_items)
+            remember_manga(fetched)
+        
+        return found
+    
+    @staticmethod
+    async def get_local_chapter_items(manga_id: str) -> Optional[List[Dict[str, Any]]]:
+        # Library manga are kept in the local chapters collection by the new-chapter checker
+        try:
+            return await chapter_sync.local_chapters(manga_id)
+        except Exception as e:
+            logger.warning(f"Local chapter read for {manga_id} failed: {e}")
+            return None
+    
+    @staticmethod
+    async def get_manga_chapter_items(manga_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        async def fetch():
+            local = await CachedMangaDexAPI.get_local_chapter_items(manga_id)
+            if local is not None:
+                return local
+            return await MangaDexAPI.get_manga_chapters(manga_id)
+        
+        items = await metadata_cache.get_or_fetch("chapters", manga_id, fetch)
+        return items[:limit] if limit is not None else items
+    
+    @staticmethod
+    async def iter_manga_chapter_items(manga_id: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        cached = await metadata_cache.peek("chapters", manga_id)
+        if cached is None:
+            cached = await CachedMangaDexAPI.get_local_chapter_items(manga_id)
+            if cached is not None:
+                await metadata_cache.put("chapters", manga_id, cached)
+        if cached is not None:
+            yield cached
+            return
+        
+        # Stream straight from upstream and fill the cache once the whole feed has arrived
+        items = []
+        async for page in MangaDexAPI.iter_manga_chapters(manga_id):
+            items.extend(page)
+            yield page
+        await metadata_cache.put("chapters", manga_id, items)
+    
+    @staticmethod
+    async def get_at_home_server(chapter_id: str) -> Dict[str, Any]:
+        # At-home node URLs expire after ~15 minutes, so this TTL stays well below that
+        return await metadata_cache.get_or_fetch("at-home", chapter_id, lambda: MangaDexAPI.get_at_home_server(chapter_id))
     
     @staticmethod
     async def get_chapter_pages(chapter_id: str) -> List[MangaPage]:
-        async with httpx.AsyncClient() as client:
-            # Get chapter info
-            response = await client.get(f"{MangaDexAPI.BASE_URL}/at-home/server/{chapter_id}")
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=500, detail="Failed to get chapter pages")
-            
-            data = response.json()
-            base_url = data["baseUrl"]
-            chapter_hash = data["chapter"]["hash"]
-            pages_data = data["chapter"]["data"]
-            
-            pages = []
-            for i, page_filename in enumerate(pages_data):
-                page_url = f"{base_url}/data/{chapter_hash}/{page_filename}"
-                pages.append(MangaPage(
-                    page_number=i + 1,
-                    image_url=page_url,
-                    width=0,  # Will be determined by frontend
-                    height=0
-                ))
-            
-            return pages
+        at_home = await CachedMangaDexAPI.get_at_home_server(chapter_id)
+        pages = MangaDexAPI.build_pages(at_home)
+        await fill_page_dimensions(at_home, pages)
+        return pages
+
+# Offline downloads
+async def chapter_page_sources(chapter_id: str) -> List[Tuple[str, List[str]]]:
+    # Full quality page first, the data-saver copy of the same page as fallback
+    at_home = await CachedMangaDexAPI.get_at_home_server(chapter_id)
+    return [
+        (f"{page.page_number:04d}", [page.image_url] + ([page.data_saver_url] if page.data_saver_url else []))
+        for page in MangaDexAPI.build_pages(at_home)
+    ]
+
+downloads = DownloadManager(
+    DOWNLOAD_DIR,
+    chapter_page_sources,
+    MangaDexAPI.http,
+    workers=DOWNLOAD_WORKERS,
+    page_concurrency=DOWNLOAD_PAGE_CONCURRENCY,
+    max_retries=DOWNLOAD_PAGE_RETRIES,
+    max_queued=DOWNLOAD_MAX_QUEUED,
+    max_bytes=DOWNLOAD_MAX_BYTES,
+    collection=db.download_jobs,
+    image_cache=image_cache
+)
+
+# New-chapter checker
+async def chapters_changed(manga_id: str):
+    await metadata_cache.invalidate("chapters", manga_id)
+    try:
+        await refresh_chapter_positions(manga_id)
+    except Exception as e:
+        logger.warning(f"Updating continue-reading positions for manga {manga_id} failed: {e}")
+
+async def refresh_chapter_positions(manga_id: str):
+    """Recompute next chapter and unread count in the reading_state of every user with the manga in their library."""
+    if not state_key_allowed(manga_id):
+        return
+    chapters = await chapter_sync.local_chapters(manga_id)
+    if not chapters:
+        return
+    prefix = f"manga.{manga_id}"
+    user_ids = [doc["user_id"] async for doc in db.user_library.find({"manga_id": manga_id}, {"user_id": 1})]
+    for start in range(0, len(user_ids), STATE_REFRESH_BATCH):
+        batch = user_ids[start:start + STATE_REFRESH_BATCH]
+        requests = []
+        async for state in db.reading_state.find({"_id": {"$in": batch}, f"{prefix}.chapter_id": {"$exists": True}}, {prefix: 1}):
+            chapter_id = state["manga"][manga_id]["chapter_id"]
+            position = chapter_position(chapters, chapter_id)
+            if position["chapter_number"] is None:
+                continue
+            # Skip users who moved to another chapter since the read
+            requests.append(UpdateOne(
+                {"_id": state["_id"], f"{prefix}.chapter_id": chapter_id},
+                {"$set": {f"{prefix}.{field}": value for field, value in position.items()}}
+            ))
+        if requests:
+            await db.reading_state.bulk_write(requests, ordered=False)
+
+chapter_sync = ChapterSync(
+    db,
+    MangaDexAPI.get,
+    interval=CHAPTER_SYNC_INTERVAL,
+    full_interval=CHAPTER_SYNC_FULL_INTERVAL,
+    feed_page_size=MANGADEX_FEED_PAGE_SIZE,
+    concurrency=CHAPTER_SYNC_CONCURRENCY,
+    on_change=chapters_changed,
+    coordinator=coordinator
+)
+
+# Page image proxy
+async def fetch_page_image(chapter_id: str, page_number: int, data_saver: bool = False) -> Tuple[Path, str]:
+    quality, key = ("data-saver", "dataSaver") if data_saver else ("data", "data")
+    for attempt in range(2):
+        at_home = await CachedMangaDexAPI.get_at_home_server(chapter_id)
+        filenames = at_home["chapter"].get(key) or []
+        if not 1 <= page_number <= len(filenames):
+            raise HTTPException(status_code=404, detail="Page not found")
+        
+        chapter_hash = at_home["chapter"]["hash"]
+        filename = filenames[page_number - 1]
+        etag = f'"{chapter_hash}-{filename}"'
+        try:
+            path = await image_cache.fetch(
+                chapter_hash, filename, f"{at_home['baseUrl']}/{quality}/{chapter_hash}/{filename}", MangaDexAPI.http()
+            )
+            return path, etag
+        except (ImageFetchError, httpx.TransportError) as e:
+            # The at-home node may have expired or gone away; ask for a fresh one once
+            logger.warning(f"Page image fetch for {chapter_id}/{page_number} failed: {e}")
+            await metadata_cache.invalidate("at-home", chapter_id)
+    
+    raise HTTPException(status_code=502, detail="Failed to fetch page image")
+
+async def fetch_page_variant(chapter_id: str, page_number: int, width: int) -> Tuple[Path, str]:
+    # Variants are rendered from the full quality page and cached next to it
+    source, _ = await fetch_page_image(chapter_id, page_number)
+    at_home = await CachedMangaDexAPI.get_at_home_server(chapter_id)
+    chapter_hash = at_home["chapter"]["hash"]
+    filename = at_home["chapter"]["data"][page_number - 1]
+    width = image_pipeline.variant_width(width)
+    variant = f"{Path(filename).stem}.w{width}.webp"
+    
+    path = await image_cache.get_or_create(
+        chapter_hash, variant,
+        lambda partial: image_pipeline.render((chapter_hash, filename), source, partial, width)
+    )
+    return path, f'"{chapter_hash}-{variant}"'
+
+async def fill_page_dimensions(at_home: Dict[str, Any], pages: List[MangaPage]):
+    chapter_hash = at_home["chapter"]["hash"]
+    filenames = at_home["chapter"]["data"]
+    missing = []
+    for page, filename in zip(pages, filenames):
+        key = (chapter_hash, filename)
+        size = image_pipeline.dimensions.get(key)
+        if size is None:
+            path = image_cache.contains(chapter_hash, filename)
+            size = await image_pipeline.probe(key, path) if path else None
+        if size:
+            page.width, page.height = size
+        else:
+            missing.append(page)
+    if not missing:
+        return
+    
+    try:
+        stored = await db.page_dimensions.find_one({"_id": chapter_hash})
+    except Exception as e:
+        logger.warning(f"Could not load page dimensions for {chapter_hash}: {e}")
+        stored = None
+    sizes = stored["sizes"] if stored else []
+    unknown = False
+    for page in missing:
+        size = sizes[page.page_number - 1] if page.page_number <= len(sizes) else None
+        if size:
+            page.width, page.height = size
+            image_pipeline.remember((chapter_hash, filenames[page.page_number - 1]), tuple(size))
+        else:
+            unknown = True
+    
+    # Measure the rest in the background so later readers get them
+    if unknown:
+        prefetcher.schedule(f"dimensions:{chapter_hash}", lambda: probe_chapter_dimensions(at_home))
+
+async def probe_chapter_dimensions(at_home: Dict[str, Any]) -> bool:
+    # Reads only the first few KB of each page image, never the whole file
+    chapter_hash = at_home["chapter"]["hash"]
+    semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+    
+    async def probe(filename: str) -> Optional[Tuple[int, int]]:
+        key = (chapter_hash, filename)
+        if key in image_pipeline.dimensions:
+            return image_pipeline.dimensions[key]
+        async with semaphore:
+            try:
+                size = await probe_image_size(MangaDexAPI.http(), f"{at_home['baseUrl']}/data/{chapter_hash}/{filename}")
+            except (ImageFetchError, httpx.TransportError) as e:
+                logger.info(f"Dimension probe for {chapter_hash}/{filename} failed: {e}")
+                return None
+        if size:
+            image_pipeline.remember(key, size)
+        return size
+    
+    sizes = await asyncio.gather(*[probe(filename) for filename in at_home["chapter"]["data"]])
+    await db.page_dimensions.update_one(
+        {"_id": chapter_hash},
+        {"$set": {"sizes": [list(size) if size else None for size in sizes], "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return all(sizes)
+
+# Next-chapter prefetch
+def find_next_chapter(chapters: List[Dict[str, Any]], chapter_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    for i, chapter in enumerate(chapters):
+        if chapter["id"] == chapter_id:
+            # Skip other scanlation groups' releases of the same chapter number
+            number = chapter["chapter_number"]
+            return chapter, next((c for c in chapters[i + 1:] if c["chapter_number"] > number), None)
+    return None, None
+
+async def prefetch_chapter(chapter_id: str) -> bool:
+    # Never let warm-up work eat the at-home quota that live readers need
+    if upstream_limiter.buckets["at-home"].available() < 1:
+        return False
+    
+    # The reader loads pages through the image proxy, so this is what its first page requests hit
+    at_home = await CachedMangaDexAPI.get_at_home_server(chapter_id)
+    page_count = min(PREFETCH_PAGES, len(at_home["chapter"]["data"]))
+    await asyncio.gather(*[fetch_page_image(chapter_id, n) for n in range(1, page_count + 1)])
+    return True
+
+async def prefetch_after(manga_id: str, chapter_id: str) -> bool:
+    _, next_chapter = find_next_chapter(await CachedMangaDexAPI.get_manga_chapter_items(manga_id), chapter_id)
+    return next_chapter is not None and await prefetch_chapter(next_chapter["id"])
+
+async def schedule_next_chapter_prefetch(
+    manga_id: str, chapter_id: str, page_number: Optional[int] = None, reader: Optional[str] = None
+):
+    """
+    Warm the chapter after ``chapter_id`` when a reader opens a chapter
+    (``page_number`` None) or gets within PREFETCH_NEAR_END pages of its end.
+
+    Runs on every page turn, so the checks only use the locally cached feed.
+    Each reader holds one prefetch; opening another chapter or moving on to
+    a different next chapter cancels the old one unless others want it.
+    """
+    chapters = await metadata_cache.peek("chapters", manga_id, local_only=True)
+    if chapters is None:
+        # Opening a chapter before its feed is cached: resolve the feed in the background too
+        if page_number is None:
+            prefetcher.schedule(f"next:{manga_id}:{chapter_id}", lambda: prefetch_after(manga_id, chapter_id), owner=reader)
+        return
+    
+    current, next_chapter = find_next_chapter(chapters, chapter_id)
+    near_end = page_number is None or not current["pages"] or page_number >= current["pages"] - PREFETCH_NEAR_END
+    if next_chapter is not None and near_end:
+        next_id = next_chapter["id"]
+        prefetcher.schedule(f"chapter:{next_id}", lambda: prefetch_chapter(next_id), owner=reader)
+    elif page_number is None and reader is not None:
+        prefetcher.release(reader)
+
+# Continue reading
+def state_key_allowed(manga_id: str) -> bool:
+    # Manga ids become field names in the reading_state document
+    return bool(manga_id) and "." not in manga_id and not manga_id.startswith("$")
+
+def chapter_position(chapters: List[Dict[str, Any]], chapter_id: str) -> Dict[str, Any]:
+    chapter, next_chapter = find_next_chapter(chapters, chapter_id)
+    if chapter is None:
+        return {"chapter_number": None, "next_chapter_id": None, "unread_count": None}
+    number = chapter["chapter_number"]
+    return {
+        "chapter_number": number,
+        "next_chapter_id": next_chapter["id"] if next_chapter else None,
+        # Count chapter numbers, not releases, so several scanlations of one chapter count once
+        "unread_count": len({c["chapter_number"] for c in chapters if c["chapter_number"] > number})
+    }
+
+async def reading_state_entry(manga_id: str, chapter_id: str, page_number: int, timestamp: datetime) -> Dict[str, Any]:
+    """
+    Build the reading_state fields for one manga from what is already cached.
+
+    Runs on every page turn, so it never goes upstream: the chapter list
+    comes from the local cache, or the shared tier on a local miss. Chapter
+    fields are left out when the chapter is not found, and the title when
+    the manga is not known locally, so the existing values are kept.
+    """
+    entry = {"chapter_id": chapter_id, "page_number": page_number, "timestamp": timestamp}
+    chapters = await metadata_cache.peek("chapters", manga_id, local_only=True)
+    if chapters is None:
+        chapters = await metadata_cache.peek("chapters", manga_id)
+    position = chapter_position(chapters or [], chapter_id)
+    if position["chapter_number"] is not None:
+        entry.update(position)
+    
+    manga = manga_search_index.docs.get(manga_id) or await metadata_cache.peek("manga", manga_id, local_only=True)
+    if manga:
+        entry["title"] = manga["title"]
+        entry["cover_art"] = manga["cover_art"]
+    return entry
+
+async def rebuild_reading_state(user_id: str, state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Backfill the state document from reading_progress for users who read before it existed."""
+    entries = dict((state or {}).get("manga", {}))
+    updates = {}
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$sort": {"manga_id": 1, "timestamp": -1}},
+        {"$group": {
+            "_id": "$manga_id",
+            "chapter_id": {"$first": "$chapter_id"},
+            "page_number": {"$first": "$page_number"},
+            "timestamp": {"$first": "$timestamp"}
+        }}
+    ]
+    async for doc in db.reading_progress.aggregate(pipeline):
+        manga_id = doc["_id"]
+        if not state_key_allowed(manga_id) or entries.get(manga_id, {}).get("chapter_id"):
+            continue
+        updates[manga_id] = await reading_state_entry(manga_id, doc["chapter_id"], doc["page_number"], doc["timestamp"])
+    
+    # Library items carry titles for manga that were never in the local cache
+    async for item in db.user_library.find({"user_id": user_id}, {"manga_id": 1, "title": 1, "cover_art": 1}):
+        manga_id = item["manga_id"]
+        if not state_key_allowed(manga_id) or (updates.get(manga_id) or entries.get(manga_id, {})).get("title"):
+            continue
+        entry = updates.setdefault(manga_id, {})
+        entry["title"] = item["title"]
+        entry["cover_art"] = item["cover_art"]
+    
+    fields = {f"manga.{manga_id}.{field}": value for manga_id, entry in updates.items() for field, value in entry.items()}
+    await db.reading_state.update_one({"_id": user_id}, {"$set": {**fields, "complete": True}}, upsert=True)
+    for manga_id, entry in updates.items():
+        entries[manga_id] = {**entries.get(manga_id, {}), **entry}
+    return {"_id": user_id, "manga": entries, "complete": True}
+
+async def load_reading_state(user_id: str) -> Dict[str, Any]:
+    state = await db.reading_state.find_one({"_id": user_id})
+    if state is None or not state.get("complete"):
+        state = await rebuild_reading_state(user_id, state)
+    return state
+
+async def forget_reading_state(user_id: str, manga_ids: List[str]):
+    """Drop manga removed from the library from the continue-reading list."""
+    manga_ids = [manga_id for manga_id in manga_ids if state_key_allowed(manga_id)]
+    if not manga_ids:
+        return
+    # Build the document first, or a later backfill would bring the entries back from reading_progress
+    await load_reading_state(user_id)
+    await db.reading_state.update_one({"_id": user_id}, {"$unset": {f"manga.{manga_id}": "" for manga_id in manga_ids}})
+    for manga_id in manga_ids:
+        progress_buffer.discard_state(user_id, manga_id)
 
 # API Routes
 @api_router.get("/")
 async def root():
     return {"message": "Manga Reader API"}
 
+@api_router.get("/upstream/stats")
+async def get_upstream_stats():
+    return component_stats()
+
+def component_stats() -> Dict[str, Any]:
+    return {
+        "pool": MangaDexAPI.pool_stats(),
+        "cache": metadata_cache.get_stats(),
+        "singleflight": upstream_flight.get_stats(),
+        "rate_limit": upstream_limiter.get_stats(),
+        "circuit": upstream_breakers.get_stats(),
+        "images": image_cache.get_stats(),
+        "chapter_sync": chapter_sync.get_stats(),
+        "coordination": coordinator.get_stats(),
+        "tracing": tracer.get_stats(),
+        "image_pipeline": image_pipeline.get_stats(),
+        "prefetch": prefetcher.get_stats(),
+        "downloads": downloads.get_stats(),
+        "progress_buffer": progress_buffer.get_stats(),
+        "search_index": manga_search_index.get_stats()
+    }
+
+@api_router.get("/diagnostics/query-plans")
+async def get_query_plans():
+    try:
+        return {"queries": await check_query_plans(db)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/manga/search")
-async def search_manga(query: str, limit: int = 20):
+async def search_manga(query: str, limit: int = 20, local: bool = True):
+    try:
+        # Answer from the local index when it knows matching titles, otherwise ask MangaDex
+        if local:
+            matches = manga_search_index.search(query, limit)
+            if matches:
+                return FastJSONResponse({"manga": [model_dict(MangaInfo, item) for item in matches]})
+        
+        manga_list = await CachedMangaDexAPI.search_manga_items(query, limit)
+        return FastJSONResponse({"manga": manga_list})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/manga/batch")
+async def get_manga_batch(ids: List[str] = Query(...)):
+    # Accepts repeated ids parameters as well as comma separated lists
+    manga_ids = list(dict.fromkeys(manga_id.strip() for value in ids for manga_id in value.split(",") if manga_id.strip()))
+    if len(manga_ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IDS} ids per request")
+    
     try:
-        manga_list = await MangaDexAPI.search_manga(query, limit)
-        return {"manga": manga_list}
+        found = await CachedMangaDexAPI.get_many_items(manga_ids)
+        return FastJSONResponse({
+            "manga": [found[manga_id] for manga_id in manga_ids if manga_id in found],
+            "missing": [manga_id for manga_id in manga_ids if manga_id not in found]
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -211,74 +1181,153 @@ async def search_manga(query: str, limit: int = 20):
 async def get_manga_details(manga_id: str):
     try:
         # Get manga info from MangaDX
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{MangaDexAPI.BASE_URL}/manga/{manga_id}",
-                params={"includes[]": ["cover_art", "author"]}
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=404, detail="Manga not found")
-            
-            data = response.json()
-            manga_data = data["data"]
-            
-            # Get cover art
-            cover_art_url = ""
-            for rel in manga_data.get("relationships", []):
-                if rel["type"] == "cover_art":
-                    cover_filename = rel["attributes"]["fileName"]
-                    cover_art_url = f"https://uploads.mangadex.org/covers/{manga_id}/{cover_filename}.256.jpg"
-                    break
-            
-            # Get author
-            author = "Unknown"
-            for rel in manga_data.get("relationships", []):
-                if rel["type"] == "author":
-                    author = rel["attributes"].get("name", "Unknown")
-                    break
-            
-            manga_info = MangaInfo(
-                id=manga_id,
-                title=manga_data["attributes"]["title"].get("en", list(manga_data["attributes"]["title"].values())[0]),
-                description=manga_data["attributes"]["description"].get("en", ""),
-                author=author,
-                status=manga_data["attributes"]["status"],
-                cover_art=cover_art_url,
-                tags=[tag["attributes"]["name"]["en"] for tag in manga_data["attributes"]["tags"]],
-                chapters=0,
-                source="mangadex"
-            )
-            
-            return manga_info
+        return FastJSONResponse(await CachedMangaDexAPI.get_manga_details_item(manga_id))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/manga/{manga_id}/chapters")
-async def get_manga_chapters(manga_id: str, limit: int = 100):
+async def get_manga_chapters(manga_id: str, limit: Optional[int] = None, stream: bool = False):
+    if stream:
+        return StreamingResponse(stream_manga_chapters(manga_id, limit), media_type="application/x-ndjson")
+    
     try:
-        chapters = await MangaDexAPI.get_manga_chapters(manga_id, limit)
-        return {"chapters": chapters}
+        chapters = await CachedMangaDexAPI.get_manga_chapter_items(manga_id, limit)
+        return FastJSONResponse({"chapters": chapters})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def stream_manga_chapters(manga_id: str, limit: Optional[int] = None):
+    # One ChapterInfo JSON object per line, emitted as each feed page arrives
+    sent = 0
+    try:
+        async for page in CachedMangaDexAPI.iter_manga_chapter_items(manga_id):
+            for chapter in page:
+                if limit is not None and sent >= limit:
+                    return
+                yield orjson.dumps(chapter) + b"\n"
+                sent += 1
+    except Exception as e:
+        logger.error(f"Chapter stream for {manga_id} failed: {e}")
+        yield orjson.dumps({"error": str(e)}) + b"\n"
+
+@api_router.get("/chapter/{chapter_id}/page/{page_number}")
+async def get_chapter_page_image(chapter_id: str, page_number: int, request: Request, data_saver: bool = False, width: Optional[int] = None):
+    for attempt in range(2):
+        try:
+            if width and image_pipeline.available:
+                path, etag = await fetch_page_variant(chapter_id, page_number, width)
+            else:
+                path, etag = await fetch_page_image(chapter_id, page_number, data_saver)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        
+        try:
+            return file_response(request, path, etag)
+        except FileNotFoundError:
+            # Evicted by another worker since the lookup; the next lookup misses and fetches it again
+            logger.info(f"Cached page {chapter_id}/{page_number} disappeared before it was served")
+    raise HTTPException(status_code=404, detail="Page image is no longer available")
+
 @api_router.get("/chapter/{chapter_id}/pages")
-async def get_chapter_pages(chapter_id: str):
+async def get_chapter_pages(chapter_id: str, manga_id: Optional[str] = None, user_id: Optional[str] = None):
     try:
-        pages = await MangaDexAPI.get_chapter_pages(chapter_id)
-        return {"pages": pages}
+        pages = await CachedMangaDexAPI.get_chapter_pages(chapter_id)
+        if manga_id:
+            await schedule_next_chapter_prefetch(manga_id, chapter_id, reader=user_id)
+        elif user_id:
+            prefetcher.release(user_id)
+        return FastJSONResponse({"pages": pages})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/chapter/{chapter_id}/download", status_code=202)
+async def download_chapter(chapter_id: str):
+    try:
+        job = await downloads.submit(chapter_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid chapter id")
+    except DownloadQueueFull:
+        raise HTTPException(status_code=503, detail="Too many downloads queued, try again later")
+    return job.to_dict()
+
+@api_router.get("/downloads/{job_id}")
+async def get_download(job_id: str):
+    job = await downloads.find(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Download not found")
+    return job.to_dict()
+
+@api_router.get("/downloads/{job_id}/file")
+async def get_download_file(job_id: str):
+    job = await downloads.find(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Download not found")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Download is {job.status}")
+    if not downloads.touch(job.path):
+        raise HTTPException(status_code=410, detail="Download has expired, request it again")
+    return FileResponse(job.path, media_type="application/vnd.comicbook+zip", filename=job.path.name)
+
+# Keyset pagination for per-user listings, newest first by (timestamp, _id)
+LISTING_SORT = [("timestamp", -1), ("_id", -1)]
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    payload = json.dumps({"t": doc["timestamp"].isoformat(), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def listing_query(user_id: str, cursor: Optional[str]) -> Dict[str, Any]:
+    if not cursor:
+        return {"user_id": user_id}
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        timestamp = datetime.fromisoformat(payload["t"])
+        last_id = ObjectId(payload["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {
+        "user_id": user_id,
+        "$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": last_id}}
+        ]
+    }
+
+def listing_projection(model) -> Dict[str, int]:
+    return {field: 1 for field in model.model_fields}
+
+async def fetch_listing_page(collection, user_id: str, model, limit: int, cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    limit = max(1, min(limit, LIST_MAX_PAGE_SIZE))
+    # Read one extra document to know whether another page exists
+    docs = await collection.find(
+        listing_query(user_id, cursor), listing_projection(model)
+    ).sort(LISTING_SORT).limit(limit + 1).to_list(limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+def stream_listing(collection, user_id: str, model, cursor: Optional[str], transform=None) -> StreamingResponse:
+    query = listing_query(user_id, cursor)
+    
+    async def lines():
+        documents = collection.find(query, listing_projection(model)).sort(LISTING_SORT).batch_size(LIST_PAGE_SIZE)
+        async for doc in documents:
+            if transform:
+                doc = transform(doc)
+            yield orjson.dumps(model_dict(model, doc)) + b"\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 # Library Management
 @api_router.post("/library/add")
 async def add_to_library(user_id: str, manga_id: str, title: str, cover_art: str):
     try:
-        # Check if already in library
-        existing = await db.user_library.find_one({"user_id": user_id, "manga_id": manga_id})
-        if existing:
-            return {"message": "Already in library"}
-        
         library_item = UserLibrary(
             user_id=user_id,
             manga_id=manga_id,
@@ -286,16 +1335,51 @@ async def add_to_library(user_id: str, manga_id: str, title: str, cover_art: str
             cover_art=cover_art
         )
         
-        await db.user_library.insert_one(library_item.dict())
+        # An upsert keeps one item per manga even before the unique (user_id, manga_id) index is built
+        try:
+            result = await db.user_library.update_one(
+                {"user_id": user_id, "manga_id": manga_id},
+                {"$setOnInsert": library_item.model_dump()},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # A concurrent add inserted it first
+            return {"message": "Already in library"}
+        if result.upserted_id is None:
+            return {"message": "Already in library"}
+        
+        # Only touch existing state documents; new users get theirs on the first read or progress write
+        if state_key_allowed(manga_id):
+            await db.reading_state.update_one(
+                {"_id": user_id},
+                {"$set": {f"manga.{manga_id}.title": title, f"manga.{manga_id}.cover_art": cover_art}}
+            )
         return {"message": "Added to library"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def apply_pending_progress(item: Dict[str, Any]) -> Dict[str, Any]:
+    pending = progress_buffer.latest(item["user_id"], item["manga_id"])
+    if pending:
+        item["last_read_chapter"] = pending["chapter_id"]
+        item["last_read_page"] = pending["page_number"]
+    return item
+
 @api_router.get("/library/{user_id}")
-async def get_user_library(user_id: str):
+async def get_user_library(user_id: str, limit: int = LIST_PAGE_SIZE, cursor: Optional[str] = None, stream: bool = False):
     try:
-        library_items = await db.user_library.find({"user_id": user_id}).to_list(1000)
-        return {"library": [UserLibrary(**item) for item in library_items]}
+        if stream:
+            return stream_listing(db.user_library, user_id, UserLibrary, cursor, transform=apply_pending_progress)
+        
+        library_items, next_cursor = await fetch_listing_page(db.user_library, user_id, UserLibrary, limit, cursor)
+        return FastJSONResponse({
+            "library": [model_dict(UserLibrary, apply_pending_progress(item)) for item in library_items],
+            "next_cursor": next_cursor
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -309,20 +1393,17 @@ async def update_reading_progress(user_id: str, manga_id: str, chapter_id: str,
             page_number=page_number
         )
         
-        # Update or insert progress
-        await db.reading_progress.replace_one(
-            {"user_id": user_id, "manga_id": manga_id, "chapter_id": chapter_id},
-            progress.dict(),
-            upsert=True
-        )
+        # Progress, the library item and the reading state are written in batches by the write-behind buffer
+        state = None
+        if state_key_allowed(manga_id):
+            state = await reading_state_entry(manga_id, chapter_id, page_number, progress.timestamp)
+        progress_buffer.add(progress.model_dump(), state)
         
-        # Update library item
-        await db.user_library.update_one(
-            {"user_id": user_id, "manga_id": manga_id},
-            {"$set": {"last_read_chapter": chapter_id, "last_read_page": page_number}}
-        )
+        await schedule_next_chapter_prefetch(manga_id, chapter_id, page_number, reader=user_id)
         
         return {"message": "Progress updated"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -334,10 +1415,34 @@ async def get_reading_progress(user_id: str, manga_id: str):
             sort=[("timestamp", -1)]
         )
         
+        # Prefer progress that is still waiting in the write-behind buffer
+        pending = progress_buffer.latest(user_id, manga_id)
+        if pending and (not progress or pending["timestamp"] >= progress["timestamp"]):
+            progress = pending
+        
         if progress:
-            return ReadingProgress(**progress)
+            return FastJSONResponse(model_dict(ReadingProgress, progress))
         else:
             return {"message": "No progress found"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/users/{user_id}/continue")
+async def get_continue_reading(user_id: str, limit: int = 20):
+    try:
+        state = await load_reading_state(user_id)
+        entries = dict(state.get("manga", {}))
+        for manga_id, pending in progress_buffer.pending_states(user_id).items():
+            entries[manga_id] = {**entries.get(manga_id, {}), **pending}
+        
+        # Entries created by add_to_library alone have nothing to continue yet
+        items = [{"manga_id": manga_id, **entry} for manga_id, entry in entries.items() if entry.get("chapter_id")]
+        items.sort(key=lambda item: item["timestamp"], reverse=True)
+        return FastJSONResponse({"items": [model_dict(ContinueReading, item) for item in items[:max(limit, 0)]]})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -353,37 +1458,447 @@ async def add_bookmark(user_id: str, manga_id: str, chapter_id: str, page_number
             title=title
         )
         
-        await db.bookmarks.insert_one(bookmark.dict())
+        # One bookmark per page; the upsert holds even before the unique index is built
+        try:
+            result = await db.bookmarks.update_one(
+                {"user_id": user_id, "manga_id": manga_id, "chapter_id": chapter_id, "page_number": page_number},
+                {"$setOnInsert": bookmark.model_dump()},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # A concurrent add inserted it first
+            return {"message": "Already bookmarked"}
+        if result.upserted_id is None:
+            return {"message": "Already bookmarked"}
         return {"message": "Bookmark added"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/bookmarks/{user_id}")
-async def get_user_bookmarks(user_id: str):
+async def get_user_bookmarks(user_id: str, limit: int = LIST_PAGE_SIZE, cursor: Optional[str] = None, stream: bool = False):
+    try:
+        if stream:
+            return stream_listing(db.bookmarks, user_id, Bookmark, cursor)
+        
+        bookmarks, next_cursor = await fetch_listing_page(db.bookmarks, user_id, Bookmark, limit, cursor)
+        return FastJSONResponse({
+            "bookmarks": [model_dict(Bookmark, bookmark) for bookmark in bookmarks],
+            "next_cursor": next_cursor
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Bulk changes, import and export
+async def run_bulk(collection, requests: List[Any]) -> Tuple[set, Dict[int, str]]:
+    """Run an unordered bulk write; returns the indexes that upserted and the error message per failed index."""
+    if not requests:
+        return set(), {}
+    try:
+        result = await collection.bulk_write(requests, ordered=False)
+        return set(result.upserted_ids), {}
+    except BulkWriteError as e:
+        # The other writes of an unordered batch still went through
+        upserted = {item["index"] for item in e.details.get("upserted", [])}
+        # A duplicate key means a concurrent request inserted the same item first, so it exists
+        errors = {
+            error["index"]: error.get("errmsg", "write failed")
+            for error in e.details.get("writeErrors", []) if error.get("code") != 11000
+        }
+        return upserted, errors
+
+def record_bulk_results(items: List[Dict[str, Any]], upserted: set, errors: Dict[int, str]):
+    # items[i] is the result entry of the i-th write; upserts that matched an existing document stay "exists"
+    for index, result in enumerate(items):
+        if index in errors:
+            result.update(result="error", detail=errors[index])
+        elif index in upserted:
+            result["result"] = "added"
+        elif result["result"] == "exists":
+            # The id generated for a new bookmark was not used
+            result.pop("id", None)
+
+def library_upsert(user_id: str, manga_id: str, title: str, cover_art: str, changes: Dict[str, Any], **seed: Any) -> UpdateOne:
+    # Fields in changes are applied to existing items too; the rest (and seed) only fill new ones
+    new_item = UserLibrary(user_id=user_id, manga_id=manga_id, title=title, cover_art=cover_art, **seed).model_dump()
+    update = {"$setOnInsert": {field: value for field, value in new_item.items() if field not in changes}}
+    if changes:
+        update["$set"] = changes
+    return UpdateOne({"user_id": user_id, "manga_id": manga_id}, update, upsert=True)
+
+def library_changes(status: Optional[str], favorite: Optional[bool]) -> Dict[str, Any]:
+    changes = {}
+    if status is not None:
+        changes["status"] = status
+    if favorite is not None:
+        changes["favorite"] = favorite
+    return changes
+
+def check_bulk_size(operations: List[Any]):
+    if len(operations) > BULK_MAX_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_OPERATIONS} operations per request")
+
+@api_router.post("/library/bulk")
+async def bulk_update_library(body: LibraryBulkRequest):
+    check_bulk_size(body.operations)
+    try:
+        manga_ids = list({operation.manga_id for operation in body.operations})
+        existing = {
+            doc["manga_id"] async for doc in db.user_library.find(
+                {"user_id": body.user_id, "manga_id": {"$in": manga_ids}}, {"manga_id": 1}
+            )
+        }
+        
+        results: List[Dict[str, Any]] = []
+        requests, request_items, seen = [], [], set()
+        for operation in body.operations:
+            result = {"op": operation.op, "manga_id": operation.manga_id}
+            results.append(result)
+            if operation.manga_id in seen:
+                # Writes in an unordered batch have no order, so a second change to one manga is refused
+                result.update(result="invalid", detail="Duplicate manga_id in this request")
+                continue
+            seen.add(operation.manga_id)
+            if operation.status is not None and operation.status not in LIBRARY_STATUSES:
+                result.update(result="invalid", detail=f"status must be one of {', '.join(LIBRARY_STATUSES)}")
+                continue
+            
+            changes = library_changes(operation.status, operation.favorite)
+            if operation.op == "add":
+                if operation.title is None:
+                    result.update(result="invalid", detail="title is required to add")
+                    continue
+                if operation.manga_id in existing:
+                    result["result"] = "exists"
+                    continue
+                requests.append(library_upsert(body.user_id, operation.manga_id, operation.title, operation.cover_art or "", changes))
+                result["result"] = "exists"  # Becomes "added" if this write inserts the item
+            elif operation.manga_id not in existing:
+                result["result"] = "not_found"
+                continue
+            elif operation.op == "remove":
+                requests.append(DeleteOne({"user_id": body.user_id, "manga_id": operation.manga_id}))
+                result["result"] = "removed"
+            else:
+                if not changes:
+                    result.update(result="invalid", detail="Nothing to update")
+                    continue
+                requests.append(UpdateOne({"user_id": body.user_id, "manga_id": operation.manga_id}, {"$set": changes}))
+                result["result"] = "updated"
+            request_items.append(result)
+        
+        record_bulk_results(request_items, *await run_bulk(db.user_library, requests))
+        await forget_reading_state(
+            body.user_id, [result["manga_id"] for result in request_items if result["result"] == "removed"]
+        )
+        return FastJSONResponse({"results": results})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/bookmarks/bulk")
+async def bulk_update_bookmarks(body: BookmarkBulkRequest):
+    check_bulk_size(body.operations)
+    try:
+        remove_ids = [operation.id for operation in body.operations if operation.op == "remove" and operation.id]
+        existing = {
+            doc["id"] async for doc in db.bookmarks.find({"user_id": body.user_id, "id": {"$in": remove_ids}}, {"id": 1})
+        } if remove_ids else set()
+        
+        results: List[Dict[str, Any]] = []
+        requests, request_items = [], []
+        for operation in body.operations:
+            result: Dict[str, Any] = {"op": operation.op}
+            results.append(result)
+            if operation.op == "remove":
+                result["id"] = operation.id
+                if operation.id not in existing:
+                    result["result"] = "not_found"
+                    continue
+                requests.append(DeleteOne({"user_id": body.user_id, "id": operation.id}))
+                result["result"] = "removed"
+            else:
+                missing = [
+                    field for field in ("manga_id", "chapter_id", "page_number", "title")
+                    if getattr(operation, field) is None
+                ]
+                if missing:
+                    result.update(result="invalid", detail=f"Missing {', '.join(missing)}")
+                    continue
+                requests.append(bookmark_upsert(
+                    body.user_id, operation.manga_id, operation.chapter_id, operation.page_number, operation.title, result
+                ))
+                result["result"] = "exists"  # Becomes "added" if this write inserts the bookmark
+            request_items.append(result)
+        
+        record_bulk_results(request_items, *await run_bulk(db.bookmarks, requests))
+        return FastJSONResponse({"results": results})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def bookmark_upsert(user_id: str, manga_id: str, chapter_id: str, page_number: int, title: str, result: Dict[str, Any]) -> UpdateOne:
+    # The same page bookmarked twice stays one bookmark
+    bookmark = Bookmark(user_id=user_id, manga_id=manga_id, chapter_id=chapter_id, page_number=page_number, title=title)
+    result["id"] = bookmark.id
+    return UpdateOne(
+        {"user_id": user_id, "manga_id": manga_id, "chapter_id": chapter_id, "page_number": page_number},
+        {"$setOnInsert": bookmark.model_dump()},
+        upsert=True
+    )
+
+@api_router.get("/users/{user_id}/export")
+async def export_user_data(user_id: str):
+    # One JSON object per line; POST it back to /library/{user_id}/import to restore
+    async def lines():
+        for kind, collection, model in (("library", db.user_library, UserLibrary), ("bookmark", db.bookmarks, Bookmark)):
+            documents = collection.find({"user_id": user_id}, listing_projection(model)).sort(LISTING_SORT).batch_size(LIST_PAGE_SIZE)
+            async for doc in documents:
+                yield orjson.dumps({"type": kind, **model_dict(model, doc)}, default=orjson_default) + b"\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+async def resolve_import_rows(rows: List[Dict[str, Any]], upstream: bool) -> List[Optional[Dict[str, Any]]]:
+    """Find the manga for each row: its manga_id, then the local catalog, then (optionally) a MangaDex search."""
+    semaphore = asyncio.Semaphore(IMPORT_RESOLVE_CONCURRENCY)
+    
+    async def resolve(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if row.get("manga_id"):
+            known = manga_search_index.docs.get(row["manga_id"]) or {}
+            match = {"id": row["manga_id"], "title": row["title"] or known.get("title", ""), "cover_art": row.get("cover_art") or known.get("cover_art", "")}
+        elif not row["title"]:
+            return None
+        else:
+            match = match_title(row, manga_search_index.search(row["title"], 5))
+            if match is None and upstream:
+                async with semaphore:
+                    try:
+                        match = match_title(row, await CachedMangaDexAPI.search_manga_items(row["title"], 5))
+                    except Exception as e:
+                        logger.warning(f"Import search for {row['title']!r} failed: {e}")
+        if match is None:
+            return None
+        # Reading position from an export, restored on items the import creates
+        progress = {}
+        if isinstance(row.get("last_read_chapter"), str):
+            progress["last_read_chapter"] = row["last_read_chapter"]
+        if isinstance(row.get("last_read_page"), int) and not isinstance(row["last_read_page"], bool):
+            progress["last_read_page"] = row["last_read_page"]
+        return {**match, "progress": progress}
+    
+    return await asyncio.gather(*[resolve(row) for row in rows])
+
+async def import_batch(user_id: str, rows: List[Tuple[int, Dict[str, Any]]], upstream: bool, results: List[Dict[str, Any]]):
+    library_rows = [(number, row) for number, row in rows if row.get("type") != "bookmark"]
+    bookmark_rows = [(number, row) for number, row in rows if row.get("type") == "bookmark"]
+    
+    requests, request_items, seen = [], [], set()
+    matches = await resolve_import_rows([row for _, row in library_rows], upstream)
+    for (number, row), manga in zip(library_rows, matches):
+        result = {"row": number, "type": "library", "title": row["title"]}
+        results.append(result)
+        status = row.get("status")
+        if status is not None and status not in LIBRARY_STATUSES:
+            result.update(result="invalid", detail=f"Unknown status {status!r}")
+            continue
+        if manga is None:
+            result["result"] = "unmatched"
+            continue
+        result["manga_id"] = manga["id"]
+        if manga["id"] in seen:
+            result["result"] = "duplicate"
+            continue
+        seen.add(manga["id"])
+        changes = library_changes(status, row.get("favorite"))
+        requests.append(library_upsert(user_id, manga["id"], manga["title"], manga.get("cover_art", ""), changes, **manga["progress"]))
+        result["result"] = "updated" if changes else "exists"
+        request_items.append(result)
+    
+    record_bulk_results(request_items, *await run_bulk(db.user_library, requests))
+    
+    requests, request_items = [], []
+    for number, row in bookmark_rows:
+        result = {"row": number, "type": "bookmark"}
+        results.append(result)
+        try:
+            requests.append(bookmark_upsert(
+                user_id, row["manga_id"], row["chapter_id"], int(row["page_number"]), row.get("title") or "", result
+            ))
+        except (KeyError, TypeError, ValueError):
+            result.update(result="invalid", detail="Bookmarks need manga_id, chapter_id and page_number")
+            continue
+        result["result"] = "exists"
+        request_items.append(result)
+    
+    record_bulk_results(request_items, *await run_bulk(db.bookmarks, requests))
+
+@api_router.post("/library/{user_id}/import")
+async def import_library(user_id: str, request: Request, source: str = Query("ndjson", alias="format"), resolve: bool = False):
+    """
+    Import a library from an export file sent as the raw request body.
+    
+    ndjson (our own export) and MyAnimeList XML are parsed while the body
+    streams in and written in batches of IMPORT_BATCH_SIZE; AniList JSON
+    is read whole, up to IMPORT_MAX_BYTES. Titles are matched against the
+    local catalog, and against MangaDex search when resolve=true.
+    """
+    if source not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(IMPORT_FORMATS)}")
+    
+    async def body_chunks() -> AsyncIterator[bytes]:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if source == "anilist" and received > IMPORT_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"AniList imports are limited to {IMPORT_MAX_BYTES} bytes")
+            yield chunk
+    
+    async def anilist_rows() -> AsyncIterator[Dict[str, Any]]:
+        data = b"".join([chunk async for chunk in body_chunks()])
+        for row in iter_anilist(data):
+            yield row
+    
+    if source == "anilist":
+        rows = anilist_rows()
+    else:
+        rows = {"ndjson": iter_ndjson, "mal": iter_mal_xml}[source](body_chunks())
+    results: List[Dict[str, Any]] = []
     try:
-        bookmarks = await db.bookmarks.find({"user_id": user_id}).to_list(1000)
-        return {"bookmarks": [Bookmark(**bookmark) for bookmark in bookmarks]}
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        async for row in rows:
+            batch.append((len(results) + len(batch) + 1, row))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await import_batch(user_id, batch, resolve, results)
+                batch = []
+        if batch:
+            await import_batch(user_id, batch, resolve, results)
+    except ImportFormatError as e:
+        # Batches before the bad row are already written; report how far we got
+        raise HTTPException(status_code=400, detail={"error": str(e), "imported": len(results)})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    summary: Dict[str, int] = {}
+    for result in results:
+        summary[result["result"]] = summary.get(result["result"], 0) + 1
+    return FastJSONResponse({"summary": summary, "results": results})
 
 # Include the router in the main app
 app.include_router(api_router)
 
+def flatten_stats(stats: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for name, value in stats.items():
+        key = f"{prefix}{name}"
+        if isinstance(value, dict):
+            flat.update(flatten_stats(value, f"{key}."))
+        elif isinstance(value, (int, float)):
+            flat[key] = value
+    return flat
+
+def component_stat_samples() -> Dict[Tuple[str, ...], float]:
+    return {
+        (component, stat): value
+        for component, stats in component_stats().items()
+        for stat, value in flatten_stats(stats).items()
+    }
+
+metrics.gauge(
+    "backend_component_stat", "Counters and sizes reported by /api/upstream/stats",
+    ["component", "stat"], callback=component_stat_samples
+)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    if metrics_snapshots is not None:
+        return Response(await metrics_snapshots.render(), media_type=METRICS_CONTENT_TYPE)
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+app.add_middleware(StaleResponseMiddleware)
+app.add_middleware(RequestMetricsMiddleware, latency=http_request_duration, in_flight=http_requests_in_flight)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Trace-ID"],
 )
+# Outermost, so the server span covers every other middleware
+app.add_middleware(TracingMiddleware, tracer=tracer)
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
 )
+for log_handler in logging.getLogger().handlers:
+    log_handler.addFilter(RequestIdLogFilter())
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+async def ensure_db_indexes():
+    try:
+        await ensure_indexes(db, dedupe=INDEX_DEDUPE)
+        if CHECK_QUERY_PLANS:
+            await check_query_plans(db)
+    except Exception as e:
+        logger.warning(f"Could not ensure database indexes: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    MangaDexAPI.client = MangaDexAPI.create_client()
+    
+    try:
+        await metadata_cache.ensure_indexes()
+        await coordinator.ensure_indexes()
+    except Exception as e:
+        logger.warning(f"Could not create cache indexes: {e}")
+    
+    # Index builds and plan checks only need one worker per deployment
+    async with coordinator.hold("startup:indexes", ttl=300, release=False) as held:
+        if held:
+            await ensure_db_indexes()
+    
+    progress_buffer.start()
+    
+    try:
+        await load_search_index()
+    except Exception as e:
+        logger.warning(f"Could not load the search index: {e}")
+    
+    await asyncio.to_thread(image_cache.load)
+    image_cache.start()
+    downloads.start()
+    chapter_sync.start()
+    if trace_sink is not None:
+        trace_sink.start()
+    if metrics_snapshots is not None:
+        metrics_snapshots.start()
+    
+    yield
+    
+    await prefetcher.close()
+    await chapter_sync.close()
+    await downloads.close()
+    await image_cache.close()
+    image_pipeline.close()
+    await metadata_cache.close()
+    await MangaDexAPI.close()
+    # Flush buffered progress before the connection goes away
+    await progress_buffer.close()
+    client.close()
+    if trace_sink is not None:
+        await trace_sink.close()
+    if metrics_snapshots is not None:
+        await metrics_snapshots.close()
+
+# Assigned here rather than in FastAPI() because the hooks use everything defined above
+app.router.lifespan_context = lifespan
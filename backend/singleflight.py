@@ -0,0 +1,57 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one shared task.
+
+    Every waiter receives the leader's result or exception. A waiter that is
+    cancelled only detaches itself; the shared task is cancelled once no
+    waiters are left.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.stats: Dict[str, int] = defaultdict(int)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.stats["calls"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Forget it now so a caller arriving before the task winds down starts afresh
+                self._forget(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.stats["calls"],
+            "coalesced": self.stats["coalesced"],
+            "in_flight": len(self._calls),
+            "waiters": sum(call.waiters for call in self._calls.values())
+        }
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
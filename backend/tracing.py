@@ -0,0 +1,400 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+import orjson
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+def new_id(hex_digits: int) -> str:
+    return f"{random.getrandbits(hex_digits * 4):0{hex_digits}x}"
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "category", "attributes", "start_ns", "end_ns", "status", "message")
+
+    def __init__(self, trace: "Trace", name: str, kind: int, category: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = new_id(16)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.category = category
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = STATUS_OK
+        self.message = ""
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set_error(self, message: str):
+        self.status = STATUS_ERROR
+        self.message = message
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        self.trace.add(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [otlp_attribute(key, value) for key, value in self.attributes.items() if value is not None],
+            "status": {"code": self.status, **({"message": self.message} if self.message else {})},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Trace:
+    """The spans of one request. Spans that end after the request finished (background work it started) are dropped."""
+
+    def __init__(self, trace_id: str, request_id: str):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.spans: List[Span] = []
+        self.finished = False
+        self.late_spans = 0
+        # Motor spans end on its executor threads
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            if self.finished:
+                self.late_spans += 1
+            else:
+                self.spans.append(span)
+
+    def finish(self) -> List[Span]:
+        with self._lock:
+            self.finished = True
+            return list(self.spans)
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    span = current_span.get()
+    return span.trace.request_id if span is not None else None
+
+
+class Tracer:
+    """
+    Per-request tracing: a server span per request with child spans for
+    MangaDex calls, MongoDB commands and response serialization.
+
+    Finished traces go to ``sink`` (sampled at ``sample_rate``, slow ones
+    always) and requests slower than ``slow_request_seconds`` are logged
+    with their time broken down by span category.
+    """
+
+    def __init__(self, sink: Optional["OTLPFileSink"] = None, sample_rate: float = 1.0, slow_request_seconds: float = 1.0, enabled: bool = True):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.slow_request_seconds = slow_request_seconds
+        self.enabled = enabled
+        self.stats: Dict[str, int] = defaultdict(int)
+
+    def start_span(self, name: str, kind: int = INTERNAL, category: str = "internal", **attributes: Any) -> Optional[Span]:
+        """Start a child of the current span; None outside a traced request."""
+        parent = current_span.get()
+        if parent is None or not self.enabled:
+            return None
+        return Span(parent.trace, name, kind, category, parent.span_id, attributes)
+
+    @contextmanager
+    def span(self, name: str, kind: int = INTERNAL, category: str = "internal", **attributes: Any) -> Iterator[Optional[Span]]:
+        span = self.start_span(name, kind, category, **attributes)
+        if span is None:
+            yield None
+            return
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            current_span.reset(token)
+            span.end()
+
+    def finish(self, root: Span):
+        spans = root.trace.finish()
+        self.stats["traces"] += 1
+        slow = root.duration >= self.slow_request_seconds
+        if slow:
+            self.stats["slow_requests"] += 1
+            logger.warning(self.describe(root, spans))
+        if self.sink is not None and (slow or random.random() < self.sample_rate):
+            self.sink.export(spans)
+
+    @staticmethod
+    def describe(root: Span, spans: List[Span]) -> str:
+        totals: Dict[str, List[float]] = defaultdict(list)
+        for span in spans:
+            if span is not root:
+                totals[span.category].append(span.duration)
+        breakdown = ", ".join(
+            f"{category} {sum(durations) * 1000:.0f}ms/{len(durations)}"
+            for category, durations in sorted(totals.items(), key=lambda item: -sum(item[1]))
+        )
+        slowest = sorted((span for span in spans if span is not root), key=lambda span: -span.duration)[:5]
+        details = "; ".join(f"{span.name} {span.duration * 1000:.0f}ms" for span in slowest)
+        return (
+            f"Slow request {root.name} took {root.duration * 1000:.0f}ms "
+            f"(request_id={root.trace.request_id}, trace_id={root.trace.trace_id}): "
+            f"{breakdown or 'no child spans'}" + (f" | slowest: {details}" if details else "")
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {**self.stats, "enabled": self.enabled}
+        if self.sink is not None:
+            stats["sink"] = self.sink.get_stats()
+        return stats
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening the server span of each request.
+
+    Continues a W3C ``traceparent`` sent by the client, reuses or assigns an
+    ``X-Request-ID`` and returns it (with ``X-Trace-ID``) on the response.
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        parent = TRACEPARENT.match(headers.get(b"traceparent", b"").decode("latin-1"))
+        trace_id, parent_id = (parent.group(1), parent.group(2)) if parent else (new_id(32), None)
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")
+        if not REQUEST_ID.match(request_id):
+            request_id = trace_id
+
+        trace = Trace(trace_id, request_id)
+        root = Span(trace, f"{scope['method']} {scope['path']}", SERVER, "request", parent_id, {
+            "http.request.method": scope["method"],
+            "url.path": scope["path"],
+            "http.request_id": request_id,
+        })
+        token = current_span.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.response.status_code"] = message["status"]
+                if message["status"] >= 500:
+                    root.status = STATUS_ERROR
+                response_headers = list(message.get("headers", []))
+                response_headers.append((b"x-request-id", request_id.encode()))
+                response_headers.append((b"x-trace-id", trace_id.encode()))
+                message = {**message, "headers": response_headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.set_error(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+                root.attributes["http.route"] = route.path
+            root.end()
+            # Still inside the request's context so the slow-request log carries its id
+            self.tracer.finish(root)
+            current_span.reset(token)
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """Wraps an httpx transport with a client span per request (time to response headers)."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, tracer: Tracer, category: str = "mangadex", name=None):
+        self.transport = transport
+        self.tracer = tracer
+        self.category = category
+        # Turns a URL path into a low-cardinality span name
+        self.name = name or (lambda path: path)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with self.tracer.span(
+            f"{request.method} {self.name(request.url.path)}", CLIENT, self.category,
+            **{"http.request.method": request.method, "server.address": request.url.host, "url.path": request.url.path}
+        ) as span:
+            response = await self.transport.handle_async_request(request)
+            if span is not None:
+                span.attributes["http.response.status_code"] = response.status_code
+                if response.status_code >= 500:
+                    span.status = STATUS_ERROR
+            return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class MongoTracingListener(monitoring.CommandListener):
+    """
+    Adds a span per MongoDB command to the request that issued it.
+
+    Motor runs commands on executor threads but copies the caller's context
+    there, so ``current_span`` still points at the request.
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._spans: Dict[Any, Span] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.command.get("collection", "")
+        span = self.tracer.start_span(
+            f"mongodb {event.command_name} {collection}".rstrip(), CLIENT, "mongodb",
+            **{"db.system": "mongodb", "db.operation.name": event.command_name, "db.collection.name": collection or None}
+        )
+        if span is not None:
+            with self._lock:
+                self._spans[(event.connection_id, event.request_id)] = span
+
+    def _finish(self, event, error: Optional[str] = None):
+        with self._lock:
+            span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is None:
+            return
+        if error:
+            span.set_error(error)
+        span.end()
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure.get("errmsg", "command failed")))
+
+
+class OTLPFileSink:
+    """
+    Appends finished traces to a file as OTLP/JSON, one ``ExportTraceServiceRequest`` per line.
+
+    Traces are buffered and written by a background task every
+    ``flush_interval`` seconds; the buffer is bounded and drops traces
+    rather than grow when the disk cannot keep up.
+    """
+
+    def __init__(self, path: Path, service_name: str = "manga-reader-backend", flush_interval: float = 1.0, max_buffered: int = 10000):
+        self.path = Path(path)
+        self.service_name = service_name
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.stats: Dict[str, int] = defaultdict(int)
+        self._buffer: List[List[Span]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def export(self, spans: List[Span]):
+        if len(self._buffer) >= self.max_buffered:
+            self.stats["dropped"] += 1
+            return
+        self._buffer.append(spans)
+
+    def start(self):
+        if self._task is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        lines = b"".join(orjson.dumps(self._request(spans)) + b"\n" for spans in batch)
+        try:
+            await asyncio.to_thread(self._append, lines)
+        except OSError as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Could not write traces to {self.path}: {e}")
+            return
+        self.stats["written"] += len(batch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "buffered": len(self._buffer), "path": str(self.path)}
+
+    def _request(self, spans: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                otlp_attribute("service.name", self.service_name),
+                otlp_attribute("process.pid", os.getpid()),
+            ]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+
+    def _append(self, lines: bytes):
+        with open(self.path, "ab") as file:
+            file.write(lines)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+class RequestIdLogFilter(logging.Filter):
+    """Adds ``request_id`` to every log record ("-" outside a request)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id() or "-"
+        return True
@@ -123,6 +123,31 @@ class MangaReaderTester:
             self.log_test("Manga Details", False, f"Request error: {str(e)}")
             return False
     
+    def test_manga_batch(self):
+        """Test batch manga details endpoint"""
+        if not self.manga_id:
+            self.log_test("Manga Batch", False, "No manga ID available from search test")
+            return False
+        
+        try:
+            response = self.session.get(f"{BASE_URL}/manga/batch", params={"ids": f"{self.manga_id},invalid-id"})
+            
+            if response.status_code == 200:
+                data = response.json()
+                found = [manga["id"] for manga in data.get("manga", [])]
+                if found == [self.manga_id] and data.get("missing") == ["invalid-id"]:
+                    self.log_test("Manga Batch", True, "Batch lookup returned the known manga and reported the missing one")
+                    return True
+                else:
+                    self.log_test("Manga Batch", False, "Unexpected batch result", data)
+                    return False
+            else:
+                self.log_test("Manga Batch", False, f"HTTP {response.status_code}", response.text)
+                return False
+        except Exception as e:
+            self.log_test("Manga Batch", False, f"Request error: {str(e)}")
+            return False
+    
     def test_manga_chapters(self):
         """Test manga chapters endpoint"""
         if not self.manga_id:
@@ -165,6 +190,32 @@ class MangaReaderTester:
             self.log_test("Manga Chapters", False, f"Request error: {str(e)}")
             return False
     
+    def test_manga_chapters_stream(self):
+        """Test NDJSON streaming of the full chapter feed"""
+        if not self.manga_id:
+            self.log_test("Manga Chapters Stream", False, "No manga ID available from search test")
+            return False
+        
+        try:
+            response = self.session.get(f"{BASE_URL}/manga/{self.manga_id}/chapters", params={"stream": "true"})
+            
+            if response.status_code == 200:
+                lines = [line for line in response.text.splitlines() if line.strip()]
+                chapters = [json.loads(line) for line in lines]
+                errors = [chapter for chapter in chapters if "error" in chapter]
+                if chapters and not errors:
+                    self.log_test("Manga Chapters Stream", True, f"Streamed {len(chapters)} chapters")
+                    return True
+                else:
+                    self.log_test("Manga Chapters Stream", False, "No chapters streamed", response.text[:500])
+                    return False
+            else:
+                self.log_test("Manga Chapters Stream", False, f"HTTP {response.status_code}", response.text)
+                return False
+        except Exception as e:
+            self.log_test("Manga Chapters Stream", False, f"Request error: {str(e)}")
+            return False
+    
     def test_chapter_pages(self):
         """Test chapter pages endpoint"""
         if not self.chapter_id:
@@ -205,6 +256,40 @@ class MangaReaderTester:
             self.log_test("Chapter Pages", False, f"Request error: {str(e)}")
             return False
     
+    def test_chapter_download(self):
+        """Test offline chapter download job"""
+        if not self.chapter_id:
+            self.log_test("Chapter Download", False, "No chapter ID available from chapters test")
+            return False
+        
+        try:
+            response = self.session.post(f"{BASE_URL}/chapter/{self.chapter_id}/download")
+            if response.status_code != 202:
+                self.log_test("Chapter Download", False, f"HTTP {response.status_code}", response.text)
+                return False
+            
+            job_id = response.json()["id"]
+            job = response.json()
+            deadline = time.time() + TIMEOUT * 2
+            while job["status"] in ("queued", "running") and time.time() < deadline:
+                time.sleep(1)
+                job = self.session.get(f"{BASE_URL}/downloads/{job_id}").json()
+            
+            if job["status"] != "completed":
+                self.log_test("Chapter Download", False, f"Job ended as {job['status']}", job)
+                return False
+            
+            archive = self.session.get(f"{BASE_URL}/downloads/{job_id}/file")
+            if archive.status_code == 200 and archive.content[:2] == b"PK":
+                self.log_test("Chapter Download", True, f"Downloaded {job['done_pages']} pages as CBZ ({len(archive.content)} bytes)")
+                return True
+            else:
+                self.log_test("Chapter Download", False, f"HTTP {archive.status_code} for the archive")
+                return False
+        except Exception as e:
+            self.log_test("Chapter Download", False, f"Request error: {str(e)}")
+            return False
+    
     def test_library_add(self):
         """Test adding manga to library"""
         if not self.manga_id:
@@ -236,6 +321,42 @@ class MangaReaderTester:
             self.log_test("Library Add", False, f"Request error: {str(e)}")
             return False
     
+    def test_library_bulk(self):
+        """Test bulk library changes and export"""
+        if not self.manga_id:
+            self.log_test("Library Bulk", False, "No manga ID available for bulk test")
+            return False
+        
+        try:
+            payload = {
+                "user_id": TEST_USER_ID,
+                "operations": [
+                    {"op": "add", "manga_id": self.manga_id, "title": "One Piece"},
+                    {"op": "update", "manga_id": "not-in-library", "status": "completed"}
+                ]
+            }
+            response = self.session.post(f"{BASE_URL}/library/bulk", json=payload)
+            
+            if response.status_code != 200:
+                self.log_test("Library Bulk", False, f"HTTP {response.status_code}", response.text)
+                return False
+            results = response.json().get("results", [])
+            if [result.get("result") for result in results] != ["exists", "not_found"]:
+                self.log_test("Library Bulk", False, "Unexpected per-item results", results)
+                return False
+            
+            response = self.session.get(f"{BASE_URL}/users/{TEST_USER_ID}/export")
+            lines = [json.loads(line) for line in response.text.splitlines() if line]
+            if response.status_code == 200 and any(line.get("manga_id") == self.manga_id for line in lines):
+                self.log_test("Library Bulk", True, f"Bulk results ok, exported {len(lines)} items")
+                return True
+            else:
+                self.log_test("Library Bulk", False, "Export is missing the library item", response.text[:200])
+                return False
+        except Exception as e:
+            self.log_test("Library Bulk", False, f"Request error: {str(e)}")
+            return False
+    
     def test_library_get(self):
         """Test getting user library"""
         try:
@@ -328,6 +449,29 @@ class MangaReaderTester:
             self.log_test("Progress Get", False, f"Request error: {str(e)}")
             return False
     
+    def test_continue_reading(self):
+        """Test the continue-reading list"""
+        try:
+            response = self.session.get(f"{BASE_URL}/users/{TEST_USER_ID}/continue")
+            
+            if response.status_code == 200:
+                data = response.json()
+                items = data.get("items")
+                if not isinstance(items, list):
+                    self.log_test("Continue Reading", False, "Invalid response format", data)
+                    return False
+                if self.manga_id and not any(item.get("manga_id") == self.manga_id for item in items):
+                    self.log_test("Continue Reading", False, "Recently read manga missing from the list", data)
+                    return False
+                self.log_test("Continue Reading", True, f"Retrieved {len(items)} in-progress manga")
+                return True
+            else:
+                self.log_test("Continue Reading", False, f"HTTP {response.status_code}", response.text)
+                return False
+        except Exception as e:
+            self.log_test("Continue Reading", False, f"Request error: {str(e)}")
+            return False
+    
     def test_bookmarks_add(self):
         """Test adding bookmark"""
         if not self.manga_id or not self.chapter_id:
@@ -409,7 +553,14 @@ class MangaReaderTester:
                 self.log_test("Error Handling - Invalid Chapter", True, f"Properly handled invalid chapter ID with HTTP {response.status_code}")
             else:
                 self.log_test("Error Handling - Invalid Chapter", False, f"Unexpected response for invalid chapter ID: HTTP {response.status_code}")
-            
+
+            # Error responses still carry the request ID for finding the request's trace
+            response = self.session.get(f"{BASE_URL}/manga/invalid-id", headers={"X-Request-ID": "backend-test-request"})
+            if response.headers.get("X-Request-ID") == "backend-test-request" and response.headers.get("X-Trace-ID"):
+                self.log_test("Error Handling - Request ID", True, f"Request ID echoed, trace {response.headers['X-Trace-ID']}")
+            else:
+                self.log_test("Error Handling - Request ID", False, "Missing X-Request-ID/X-Trace-ID response headers", dict(response.headers))
+
             return True
         except Exception as e:
             self.log_test("Error Handling", False, f"Request error: {str(e)}")
@@ -429,16 +580,21 @@ class MangaReaderTester:
         self.test_api_root()
         self.test_manga_search()
         self.test_manga_details()
+        self.test_manga_batch()
         self.test_manga_chapters()
+        self.test_manga_chapters_stream()
         self.test_chapter_pages()
+        self.test_chapter_download()
         
         # Library management tests
         self.test_library_add()
         self.test_library_get()
+        self.test_library_bulk()
         
         # Progress tracking tests
         self.test_progress_update()
         self.test_progress_get()
+        self.test_continue_reading()
         
         # Bookmark tests
         self.test_bookmarks_add()
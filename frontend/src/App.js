@@ -67,11 +67,22 @@ const MangaReader = () => {
     }
   };
 
+  // Pages load through the backend image cache, which the next-chapter prefetch warms.
+  // Small screens get the lighter data-saver images
+  const pageImageUrl = (page) => {
+    if (!page || !currentChapter) return undefined;
+    const dataSaver = window.innerWidth < 768 && page.data_saver_url ? '?data_saver=true' : '';
+    return `${API}/chapter/${currentChapter.id}/page/${page.page_number}${dataSaver}`;
+  };
+
   // Get chapter pages
   const getChapterPages = async (chapterId) => {
     setLoading(true);
     try {
-      const response = await axios.get(`${API}/chapter/${chapterId}/pages`);
+      // Passing the manga and reader lets the backend prefetch the next chapter for this reader
+      const response = await axios.get(`${API}/chapter/${chapterId}/pages`, {
+        params: selectedManga ? { manga_id: selectedManga.id, user_id: userId } : { user_id: userId }
+      });
       setCurrentPages(response.data.pages);
       setCurrentPage(0);
       setCurrentView('reader');
@@ -102,8 +113,17 @@ const MangaReader = () => {
   // Load library
   const loadLibrary = async () => {
     try {
-      const response = await axios.get(`${API}/library/${userId}`);
-      setLibrary(response.data.library);
+      // The library is paginated; follow cursors until the last page
+      let items = [];
+      let cursor = null;
+      do {
+        const response = await axios.get(`${API}/library/${userId}`, {
+          params: cursor ? { cursor } : {}
+        });
+        items = items.concat(response.data.library);
+        cursor = response.data.next_cursor;
+      } while (cursor);
+      setLibrary(items);
     } catch (error) {
       console.error('Library error:', error);
     }
@@ -306,7 +326,9 @@ const MangaReader = () => {
         <div className="flex justify-center items-center min-h-screen p-4">
           <div className="relative max-w-4xl w-full">
             <img
-              src={currentPages[currentPage]?.image_url}
+              src={pageImageUrl(currentPages[currentPage])}
+              width={currentPages[currentPage]?.width || undefined}
+              height={currentPages[currentPage]?.height || undefined}
               alt={`Page ${currentPage + 1}`}
               className="w-full h-auto max-h-screen object-contain"
               onClick={nextPage}
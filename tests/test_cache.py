@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from cache import CacheEntry, CachePolicy, TieredCache, stale_age
+
+
+class FakeCollection:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.docs = {}
+        self.reads = 0
+        self.writes = 0
+
+    async def find_one(self, query):
+        self.reads += 1
+        await asyncio.sleep(self.delay)
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc is not None else None
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.writes += 1
+        await asyncio.sleep(self.delay)
+        self.docs[query["_id"]] = doc
+
+    async def delete_one(self, query):
+        self.docs.pop(query["_id"], None)
+
+    def find(self, query):
+        self.reads += 1
+        docs = [dict(self.docs[key], _id=key) for key in query["_id"]["$in"] if key in self.docs]
+
+        async def cursor():
+            for doc in docs:
+                yield doc
+
+        return cursor()
+
+    async def bulk_write(self, ops, ordered=True):
+        self.writes += 1
+        for op in ops:
+            self.docs[op._filter["_id"]] = op._doc
+
+
+def counting_fetch(value="value", delay=0.01, error=None):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return value
+
+    return fetch, calls
+
+
+def test_coalesced_misses_fill_the_cache_once():
+    collection = FakeCollection(delay=0.001)
+    fetch, calls = counting_fetch({"chapters": list(range(1000))})
+
+    async def scenario():
+        cache = TieredCache(collection, policies={"chapters": CachePolicy(ttl=60)})
+        return await asyncio.gather(*[cache.get_or_fetch("chapters", "m1", fetch) for _ in range(200)])
+
+    results = asyncio.run(scenario())
+    assert all(result == {"chapters": list(range(1000))} for result in results)
+    assert len(calls) == 1
+    assert collection.writes == 1
+    assert collection.reads == 1
+
+
+def test_shared_tier_hit_skips_the_fetch():
+    collection = FakeCollection()
+    fetch, calls = counting_fetch()
+
+    async def scenario():
+        writer = TieredCache(collection)
+        await writer.put("manga", "m1", {"id": "m1"})
+        reader = TieredCache(collection)
+        return await reader.get_or_fetch("manga", "m1", fetch)
+
+    assert asyncio.run(scenario()) == {"id": "m1"}
+    assert calls == []
+
+
+def test_not_found_is_cached_as_negative_entry():
+    fetch, calls = counting_fetch(error=HTTPException(status_code=404, detail="Manga not found"))
+
+    async def scenario():
+        cache = TieredCache(policies={"manga": CachePolicy(ttl=60, negative_ttl=60)})
+        for _ in range(3):
+            with pytest.raises(HTTPException) as error:
+                await cache.get_or_fetch("manga", "missing", fetch)
+            assert error.value.status_code == 404
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+
+
+def test_stale_value_is_served_while_refreshing():
+    fetch, calls = counting_fetch("fresh")
+
+    async def scenario():
+        cache = TieredCache(policies={"search": CachePolicy(ttl=60, stale_ttl=60)})
+        now = time.time()
+        cache.memory.set("search:q", CacheEntry("old", fresh_until=now - 1, stale_until=now + 60, fetched_at=now - 61))
+        served = await cache.get_or_fetch("search", "q", fetch)
+        age = stale_age.get()
+        await asyncio.sleep(0.05)
+        return served, age, await cache.get_or_fetch("search", "q", fetch)
+
+    served, age, refreshed = asyncio.run(scenario())
+    assert served == "old"
+    assert age >= 60
+    assert refreshed == "fresh"
+    assert len(calls) == 1
+
+
+def test_fallback_value_is_served_when_upstream_fails():
+    fetch, _ = counting_fetch(error=RuntimeError("upstream down"))
+
+    async def scenario():
+        cache = TieredCache(policies={"manga": CachePolicy(ttl=60, fallback_ttl=600)})
+        now = time.time()
+        cache.memory.set("manga:m1", CacheEntry(
+            {"id": "m1"}, fresh_until=now - 10, stale_until=now - 5, fetched_at=now - 70, fallback_until=now + 600
+        ))
+        return await cache.get_or_fetch("manga", "m1", fetch)
+
+    assert asyncio.run(scenario()) == {"id": "m1"}
+
+
+def test_batch_peek_and_put_use_one_round_trip_each():
+    collection = FakeCollection()
+
+    async def scenario():
+        writer = TieredCache(collection)
+        await writer.put_many("manga", {f"m{i}": {"id": f"m{i}"} for i in range(200)})
+        reader = TieredCache(collection)
+        reader.memory.set("manga:m0", writer.memory.get("manga:m0"))
+        return await reader.peek_many("manga", [f"m{i}" for i in range(250)])
+
+    found = asyncio.run(scenario())
+    assert found == {f"m{i}": {"id": f"m{i}"} for i in range(200)}
+    assert collection.writes == 1
+    assert collection.reads == 1
@@ -0,0 +1,107 @@
+import asyncio
+
+import httpx
+import pytest
+
+import chapter_sync
+from chapter_sync import ChapterSync
+
+
+def chapter(chapter_id, manga_id, number, updated, group="g1", title=None):
+    return {
+        "id": chapter_id,
+        "attributes": {
+            "title": title, "chapter": number, "pages": 10, "volume": None,
+            "publishAt": f"2024-01-{int(float(number)):02d}T00:00:00Z", "updatedAt": updated,
+        },
+        "relationships": [{"type": "manga", "id": manga_id}, {"type": "scanlation_group", "id": group}],
+    }
+
+
+class Upstream:
+    """Serves /manga/{id}/feed and /chapter from a list of chapters, paged like MangaDex."""
+
+    def __init__(self, chapters):
+        self.chapters = chapters
+        self.requests = []
+
+    async def get(self, path, params):
+        self.requests.append((path, params))
+        if path == "/chapter":
+            since = params["updatedAtSince"]
+            matches = sorted(
+                (item for item in self.chapters
+                 if chapter_sync.mangadex_parser.chapter_manga_id(item) in params["manga[]"]
+                 and item["attributes"]["updatedAt"][:19] >= since),
+                key=lambda item: item["attributes"]["updatedAt"]
+            )
+        else:
+            manga_id = path.split("/")[2]
+            matches = [item for item in self.chapters if chapter_sync.mangadex_parser.chapter_manga_id(item) == manga_id]
+        offset, limit = params["offset"], params["limit"]
+        body = {"data": matches[offset:offset + limit], "total": len(matches)}
+        return httpx.Response(200, json=body, request=httpx.Request("GET", f"https://api.test{path}"))
+
+
+@pytest.fixture
+def db():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient()["test"]
+
+
+def test_full_sync_then_delta_merge(db):
+    upstream = Upstream([
+        chapter("c1", "m1", "1", "2024-02-01T00:00:00Z"),
+        chapter("c1-dup", "m1", "1", "2024-02-01T00:00:00Z"),
+        chapter("c2", "m1", "2", "2024-02-02T00:00:00Z"),
+        chapter("other", "m2", "1", "2024-02-02T00:00:00Z"),
+    ])
+    changed = []
+
+    async def on_change(manga_id):
+        changed.append(manga_id)
+
+    sync = ChapterSync(db, upstream.get, feed_page_size=2, on_change=on_change)
+
+    async def scenario():
+        await db.user_library.insert_one({"user_id": "u", "manga_id": "m1"})
+        first = await sync.check()
+        after_full = await sync.local_chapters("m1")
+
+        # Later upstream changes: c1 retitled, c3 published, and an update for a manga nobody follows
+        await db.chapter_sync.update_one({"_id": "m1"}, {"$set": {"high_water_mark": chapter_sync._parse_time("2024-03-01T00:00:00Z")}})
+        upstream.chapters[0] = chapter("c1", "m1", "1", "2024-03-02T00:00:00Z", title="Retitled")
+        upstream.chapters.append(chapter("c3", "m1", "3", "2024-03-03T00:00:00Z"))
+        upstream.chapters.append(chapter("other-new", "m2", "2", "2024-03-03T00:00:00Z"))
+        upstream.requests.clear()
+        second = await sync.check()
+        return first, after_full, second, await sync.local_chapters("m1"), await db.chapter_sync.find_one({"_id": "m1"})
+
+    first, after_full, second, after_delta, mark = asyncio.run(scenario())
+
+    assert first == {"manga": 1, "full_syncs": 1, "delta_batches": 0}
+    # Duplicate uploads of one chapter from one group collapse to the first
+    assert [item["id"] for item in after_full] == ["c1", "c2"]
+
+    assert second == {"manga": 1, "full_syncs": 0, "delta_batches": 1}
+    assert [path for path, _ in upstream.requests] == ["/chapter"]
+    assert upstream.requests[0][1]["updatedAtSince"] == "2024-03-01T00:00:00"
+    assert [(item["id"], item["title"]) for item in after_delta] == [("c1", "Retitled"), ("c2", "Chapter 2"), ("c3", "Chapter 3")]
+    assert mark["high_water_mark"] == chapter_sync._parse_time("2024-03-03T00:00:00Z")
+    assert changed == ["m1", "m1"]
+    assert asyncio.run(db.chapters.count_documents({"manga_id": "m2"})) == 0
+
+
+def test_delta_restarts_from_the_newest_update_past_the_offset_cap(db, monkeypatch):
+    monkeypatch.setattr(chapter_sync, "CHAPTER_LIST_LIMIT", 2)
+    monkeypatch.setattr(chapter_sync, "MAX_OFFSET", 4)
+    upstream = Upstream([
+        chapter(f"c{i}", "m1", str(i), f"2024-03-{i:02d}T00:00:00Z") for i in range(1, 8)
+    ])
+    sync = ChapterSync(db, upstream.get)
+
+    asyncio.run(sync.delta_sync(["m1"], chapter_sync._parse_time("2024-01-01T00:00:00Z")))
+
+    assert asyncio.run(db.chapters.count_documents({"manga_id": "m1"})) == 7
+    restarted = [params for _, params in upstream.requests if params["offset"] == 0]
+    assert [params["updatedAtSince"] for params in restarted] == ["2024-01-01T00:00:00", "2024-03-04T00:00:00"]
@@ -0,0 +1,118 @@
+import asyncio
+
+import httpx
+import pytest
+
+import circuit
+from circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit.time, "monotonic", clock)
+    return clock
+
+
+def open_breaker(breaker: CircuitBreaker, calls: int = 5):
+    for _ in range(calls):
+        breaker.before_call()
+        breaker.record(True, 0.1)
+
+
+def test_opens_at_failure_rate_and_rejects_with_retry_after(clock):
+    breaker = CircuitBreaker("/manga/{id}", window=10, min_calls=5, failure_rate=0.5, open_seconds=30)
+    for _ in range(4):
+        breaker.before_call()
+        breaker.record(True, 0.1)
+    assert breaker.state == CLOSED  # below min_calls
+
+    breaker.before_call()
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+
+    clock.now += 10
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == "20"
+
+
+def test_opens_on_slow_calls(clock):
+    breaker = CircuitBreaker("/manga", min_calls=5, slow_call_rate=0.8, slow_call_seconds=2)
+    for _ in range(5):
+        breaker.before_call()
+        breaker.record(False, 3.0)
+    assert breaker.state == OPEN
+
+
+def test_half_open_trial_success_closes(clock):
+    breaker = CircuitBreaker("/manga", min_calls=5, open_seconds=30, half_open_calls=1)
+    open_breaker(breaker)
+
+    clock.now += 30
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Only one trial call is let through at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_half_open_trial_failure_reopens(clock):
+    breaker = CircuitBreaker("/manga", min_calls=5, open_seconds=30)
+    open_breaker(breaker)
+
+    clock.now += 30
+    breaker.before_call()
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_lost_trial_call_does_not_block_forever(clock):
+    breaker = CircuitBreaker("/manga", min_calls=5, open_seconds=30)
+    open_breaker(breaker)
+
+    clock.now += 30
+    breaker.before_call()  # trial that never reports back
+    clock.now += 30
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+
+
+def test_unknown_names_share_the_fallback_breaker():
+    breakers = CircuitBreakers(["/manga", "/manga/{id}"], fallback="other", min_calls=5)
+    assert breakers.get("/manga") is not breakers.get("/manga/{id}")
+    assert breakers.get("/does-not-exist") is breakers.get("/also-unknown") is breakers.get("other")
+    assert set(breakers.get_stats()) == {"/manga", "/manga/{id}", "other"}
+
+
+def test_open_circuit_reaches_clients_as_503(monkeypatch):
+    import server
+
+    monkeypatch.setattr(server.metadata_cache, "shared", None)
+    breaker = server.upstream_breakers.get("/manga/{id}")
+    monkeypatch.setattr(breaker, "state", OPEN)
+    monkeypatch.setattr(breaker, "changed_at", circuit.time.monotonic())
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/manga/circuit-test-id")
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
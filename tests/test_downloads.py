@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+import zipfile
+
+import httpx
+import pytest
+
+from downloads import DownloadManager
+
+
+def make_manager(root, max_bytes, collection=None):
+    async def resolve_pages(chapter_id):
+        return [(f"{n:04d}", [f"https://node.test/data/{chapter_id}/{n}.png"]) for n in range(1, 4)]
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=b"x" * 1000)))
+    return DownloadManager(root, resolve_pages, lambda: client, workers=1, max_bytes=max_bytes, collection=collection)
+
+
+async def wait_for(manager, job):
+    while not manager.get(job.id).finished:
+        await asyncio.sleep(0.01)
+
+
+def test_least_recently_used_archives_are_evicted(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path, max_bytes=7000)
+        manager.start()
+        for chapter_id in ("c1", "c2"):
+            await wait_for(manager, await manager.submit(chapter_id))
+        # Make c1 older, then reuse it so c2 becomes the least recently used
+        past = time.time() - 60
+        os.utime(tmp_path / "c1.cbz", (past, past))
+        os.utime(tmp_path / "c2.cbz", (past + 1, past + 1))
+        assert (await manager.submit("c1")).status == "completed"
+        await wait_for(manager, await manager.submit("c3"))
+        await manager.close()
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert sorted(path.name for path in tmp_path.glob("*.cbz")) == ["c1.cbz", "c3.cbz"]
+    stats = manager.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= 7000
+
+
+def test_newest_archive_is_kept_even_over_the_limit(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path, max_bytes=10)
+        manager.start()
+        await wait_for(manager, await manager.submit("c1"))
+        await manager.close()
+
+    asyncio.run(scenario())
+    assert [path.name for path in tmp_path.glob("*.cbz")] == ["c1.cbz"]
+
+
+def test_job_is_visible_to_another_worker(tmp_path):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["test"]["download_jobs"]
+        manager = make_manager(tmp_path, max_bytes=10_000, collection=collection)
+        other = make_manager(tmp_path, max_bytes=10_000, collection=collection)
+        manager.start()
+        job = await manager.submit("c1")
+        await wait_for(manager, job)
+        await manager.close()
+        return job, await other.find(job.id), await other.find("missing")
+
+    job, found, missing = asyncio.run(scenario())
+    assert found.to_dict() == job.to_dict()
+    assert found.path == tmp_path / "c1.cbz"
+    assert missing is None
+
+
+def test_start_keeps_partial_archives_of_running_downloads(tmp_path):
+    running = tmp_path / "c1.cbz.abc.part"
+    running.write_bytes(b"x")
+    stale = tmp_path / "c2.cbz.def.part"
+    stale.write_bytes(b"x")
+    past = time.time() - 2 * 3600
+    os.utime(stale, (past, past))
+
+    async def scenario():
+        manager = make_manager(tmp_path, max_bytes=10_000)
+        manager.start()
+        await manager.close()
+
+    asyncio.run(scenario())
+    assert running.exists()
+    assert not stale.exists()
+
+
+def test_pages_come_from_and_go_to_the_image_cache(tmp_path):
+    from image_cache import ImageCache
+
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        return httpx.Response(200, content=b"y" * 10)
+
+    async def resolve_pages(chapter_id):
+        return [(f"{n:04d}", [f"https://node.test/data/{chapter_id}/{n}.png"]) for n in range(1, 4)]
+
+    async def scenario():
+        cache = ImageCache(tmp_path / "images", max_bytes=10_000)
+        cache.load()
+        # The reader already loaded page 1
+        async def create(partial):
+            partial.write_bytes(b"cached")
+        await cache.get_or_create("c1", "1.png", create)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        manager = DownloadManager(tmp_path / "downloads", resolve_pages, lambda: client, workers=1, image_cache=cache)
+        manager.start()
+        await wait_for(manager, await manager.submit("c1"))
+        await manager.close()
+        return cache, manager
+
+    cache, manager = asyncio.run(scenario())
+    assert sorted(requested) == ["/data/c1/2.png", "/data/c1/3.png"]
+    assert cache.contains("c1", "3.png") is not None
+    assert manager.get_stats()["cached_pages"] == 1
+    with zipfile.ZipFile(tmp_path / "downloads" / "c1.cbz") as archive:
+        assert archive.read("0001.png") == b"cached"
@@ -0,0 +1,85 @@
+import asyncio
+
+import mangadex_parser
+
+
+def chapter(chapter_id, number, group="g1"):
+    return {
+        "id": chapter_id,
+        "attributes": {"title": None, "chapter": number, "pages": 1, "volume": None, "publishAt": None},
+        "relationships": [{"type": "scanlation_group", "id": group}],
+    }
+
+
+def test_feed_pages_drop_duplicate_uploads():
+    seen = set()
+    first = mangadex_parser.parse_chapters(
+        [chapter("c1", "1"), chapter("c1-dup", "1"), chapter("c1-other", "1", group="g2")], "m", seen
+    )
+    # Later pages share the seen set, and chapters without a number never collide
+    second = mangadex_parser.parse_chapters([chapter("c1-late", "1"), chapter("x1", None), chapter("x2", None)], "m", seen)
+
+    assert [item["id"] for item in first] == ["c1", "c1-other"]
+    assert [item["id"] for item in second] == ["x1", "x2"]
+
+
+def serve_feed(server, monkeypatch, chapters, page_size=2, concurrency=2):
+    monkeypatch.setattr(server, "MANGADEX_FEED_PAGE_SIZE", page_size)
+    monkeypatch.setattr(server, "MANGADEX_FEED_CONCURRENCY", concurrency)
+    requested, active, peak = [], [0], [0]
+
+    async def get_feed_page(manga_id, offset):
+        requested.append(offset)
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        # Later pages answer first; the iterator must still yield them in order
+        await asyncio.sleep(0.01 * (len(chapters) - offset) / len(chapters))
+        active[0] -= 1
+        return {"data": chapters[offset:offset + page_size], "total": len(chapters)}
+
+    monkeypatch.setattr(server.MangaDexAPI, "get_feed_page", staticmethod(get_feed_page))
+    return requested, peak
+
+
+def test_pages_are_fetched_concurrently_and_yielded_in_order(monkeypatch):
+    import server
+
+    chapters = [chapter(f"c{i}", str(i)) for i in range(1, 8)]
+    # A duplicate upload straddling a page boundary
+    chapters.insert(2, chapter("c2-dup", "2"))
+    requested, peak = serve_feed(server, monkeypatch, chapters)
+
+    result = asyncio.run(server.MangaDexAPI.get_manga_chapters("m"))
+
+    assert [item["id"] for item in result] == [f"c{i}" for i in range(1, 8)]
+    assert sorted(requested) == [0, 2, 4, 6]
+    assert peak[0] == 2
+
+
+def test_feed_stops_at_the_offset_cap(monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "MANGADEX_FEED_MAX_OFFSET", 4)
+    requested, _ = serve_feed(server, monkeypatch, [chapter(f"c{i}", str(i)) for i in range(10)])
+
+    result = asyncio.run(server.MangaDexAPI.get_manga_chapters("m"))
+
+    assert sorted(requested) == [0, 2]
+    assert len(result) == 4
+
+
+def test_closing_early_cancels_pending_pages(monkeypatch):
+    import server
+
+    serve_feed(server, monkeypatch, [chapter(f"c{i}", str(i)) for i in range(20)], concurrency=1)
+
+    async def first_page_only():
+        pages = server.MangaDexAPI.iter_manga_chapters("m")
+        first = await pages.__anext__()
+        await pages.aclose()
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return first, pending
+
+    first, pending = asyncio.run(first_page_only())
+    assert [item["id"] for item in first] == ["c0", "c1"]
+    assert pending == []
@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from image_cache import file_response
+
+ETAG = '"abc-1.png"'
+
+
+def serve(tmp_path, headers=None, content=b"0123456789"):
+    path = tmp_path / "1.png"
+    path.write_bytes(content)
+    app = FastAPI()
+
+    @app.get("/page")
+    async def page(request: Request):
+        return file_response(request, path, ETAG)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/page", headers=headers or {})
+
+    return asyncio.run(scenario())
+
+
+def test_whole_file_with_validators(tmp_path):
+    response = serve(tmp_path)
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+    assert response.headers["etag"] == ETAG
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_matching_etag_is_not_modified(tmp_path):
+    response = serve(tmp_path, {"If-None-Match": ETAG})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+@pytest.mark.parametrize("header, body, content_range", [
+    ("bytes=2-5", b"2345", "bytes 2-5/10"),
+    ("bytes=7-", b"789", "bytes 7-9/10"),
+    ("bytes=-3", b"789", "bytes 7-9/10"),
+    ("bytes=8-100", b"89", "bytes 8-9/10"),
+])
+def test_single_ranges(tmp_path, header, body, content_range):
+    response = serve(tmp_path, {"Range": header})
+    assert response.status_code == 206
+    assert response.content == body
+    assert response.headers["content-range"] == content_range
+
+
+def test_unsatisfiable_range(tmp_path):
+    response = serve(tmp_path, {"Range": "bytes=10-12"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */10"
+
+
+def test_stale_if_range_gets_the_whole_file(tmp_path):
+    response = serve(tmp_path, {"Range": "bytes=2-5", "If-Range": '"other"'})
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+
+
+def test_evicted_file_raises_for_the_caller_to_refetch(tmp_path):
+    request = Request({"type": "http", "method": "GET", "headers": []})
+    with pytest.raises(FileNotFoundError):
+        file_response(request, tmp_path / "gone.png", ETAG)
+
+
+def test_page_evicted_before_serving_is_fetched_again(tmp_path, monkeypatch):
+    import server
+
+    page = tmp_path / "1.png"
+    page.write_bytes(b"page")
+    paths = [tmp_path / "evicted.png", page]
+
+    async def fetch_page_image(chapter_id, page_number, data_saver=False):
+        return paths.pop(0), ETAG
+
+    monkeypatch.setattr(server, "fetch_page_image", fetch_page_image)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/chapter/c1/page/1")
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert response.content == b"page"
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+
+async def keepalive_server(delay=0.0):
+    """A minimal HTTP/1.1 server that keeps connections open and counts them."""
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        try:
+            while await reader.readuntil(b"\r\n\r\n"):
+                await asyncio.sleep(delay)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    host, port = server.sockets[0].getsockname()[:2]
+    return server, f"http://{host}:{port}", connections
+
+
+@pytest.fixture
+def api(monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "MANGADEX_MAX_CONNECTIONS", 3)
+    monkeypatch.setattr(server, "MANGADEX_MAX_KEEPALIVE", 3)
+    monkeypatch.setattr(server.MangaDexAPI, "client", None)
+    return server.MangaDexAPI
+
+
+def test_sequential_calls_reuse_one_connection(api, monkeypatch):
+    async def scenario():
+        upstream, base_url, connections = await keepalive_server()
+        monkeypatch.setattr(api, "BASE_URL", base_url)
+        try:
+            for _ in range(10):
+                assert (await api.http().get("/manga")).status_code == 200
+            stats = api.pool_stats()
+            same_client = api.http() is api.http()
+        finally:
+            await api.close()
+            upstream.close()
+        return len(connections), stats, same_client
+
+    opened, stats, same_client = asyncio.run(scenario())
+    assert opened == 1
+    assert same_client
+    assert (stats["connections"], stats["idle"], stats["max_connections"]) == (1, 1, 3)
+
+
+def test_concurrent_calls_stay_within_the_pool_limit(api, monkeypatch):
+    async def scenario():
+        upstream, base_url, connections = await keepalive_server(delay=0.02)
+        monkeypatch.setattr(api, "BASE_URL", base_url)
+        try:
+            responses = await asyncio.gather(*[api.http().get(f"/manga/{i}") for i in range(12)])
+        finally:
+            await api.close()
+            upstream.close()
+        return responses, len(connections)
+
+    responses, opened = asyncio.run(scenario())
+    assert all(response.status_code == 200 for response in responses)
+    assert opened == 3
+
+
+def test_a_closed_client_is_recreated(api):
+    async def scenario():
+        first = api.http()
+        await api.close()
+        assert api.pool_stats() == {"open": False}
+        second = api.http()
+        await api.close()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is not second and first.is_closed
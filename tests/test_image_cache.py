@@ -0,0 +1,57 @@
+import asyncio
+import os
+import time
+
+from image_cache import ImageCache
+
+
+def store(cache, filename, size):
+    async def create(partial):
+        partial.write_bytes(b"x" * size)
+
+    return asyncio.run(cache.get_or_create("abcdef", filename, create))
+
+
+def test_file_stored_by_another_worker_is_adopted(tmp_path):
+    first = ImageCache(tmp_path, max_bytes=10_000)
+    second = ImageCache(tmp_path, max_bytes=10_000)
+    first.load()
+    second.load()
+
+    path = store(first, "1.png", 100)
+
+    assert second.contains("abcdef", "1.png") == path
+    assert second.lookup("abcdef", "1.png") == path
+    assert second.get_stats()["adopted"] == 1
+    assert second.get_stats()["bytes"] == 100
+
+
+def test_rescan_evicts_against_the_shared_total(tmp_path):
+    first = ImageCache(tmp_path, max_bytes=250)
+    second = ImageCache(tmp_path, max_bytes=250)
+    first.load()
+    second.load()
+
+    old = store(first, "1.png", 100)
+    store(second, "2.png", 100)
+    store(second, "3.png", 100)
+    # Neither worker alone is over the limit
+    assert old.exists()
+    past = time.time() - 60
+    os.utime(old, (past, past))
+
+    asyncio.run(first.rescan())
+
+    assert not old.exists()
+    assert sorted(path.name for path in tmp_path.rglob("*.png")) == ["2.png", "3.png"]
+    assert first.get_stats()["bytes"] == 200
+
+
+def test_missing_file_is_dropped_from_the_index(tmp_path):
+    cache = ImageCache(tmp_path, max_bytes=10_000)
+    cache.load()
+    path = store(cache, "1.png", 100)
+    path.unlink()
+
+    assert cache.lookup("abcdef", "1.png") is None
+    assert cache.get_stats()["bytes"] == 0
@@ -0,0 +1,81 @@
+import asyncio
+import io
+
+import httpx
+import pytest
+
+from image_cache import ImageFetchError
+from image_probe import PROBE_BYTES, image_size, probe_image_size
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def encode(format, size=(123, 45), **options):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("format, options", [
+    ("PNG", {}),
+    ("GIF", {}),
+    ("JPEG", {}),
+    ("JPEG", {"progressive": True}),
+    ("WEBP", {}),
+    ("WEBP", {"lossless": True}),
+])
+def test_header_dimensions(format, options):
+    assert image_size(encode(format, **options)[:PROBE_BYTES]) == (123, 45)
+
+
+def test_unknown_or_truncated_data_has_no_size():
+    assert image_size(b"not an image") is None
+    assert image_size(encode("PNG")[:20]) is None
+
+
+def large_exif_jpeg():
+    # An APP1 block bigger than the first probe pushes the frame header out of it
+    exif = Image.Exif()
+    exif[0x010E] = "x" * (PROBE_BYTES * 2)
+    return encode("JPEG", exif=exif.tobytes())
+
+
+def serve(data, honor_range=True, status=None):
+    requested = []
+
+    def handler(request):
+        requested.append(request.headers.get("Range"))
+        if status is not None:
+            return httpx.Response(status)
+        if not honor_range:
+            return httpx.Response(200, content=data)
+        end = int(request.headers["Range"].split("-")[1])
+        return httpx.Response(206, content=data[:end + 1])
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), requested
+
+
+def test_probe_requests_only_the_start():
+    client, requested = serve(encode("PNG"))
+    assert asyncio.run(probe_image_size(client, "https://img.test/1.png")) == (123, 45)
+    assert requested == [f"bytes=0-{PROBE_BYTES - 1}"]
+
+
+def test_probe_reads_further_for_large_jpeg_headers():
+    data = large_exif_jpeg()
+    assert image_size(data[:PROBE_BYTES]) is None
+    client, requested = serve(data)
+
+    assert asyncio.run(probe_image_size(client, "https://img.test/1.jpg")) == (123, 45)
+    assert len(requested) == 2
+
+
+def test_probe_works_when_range_is_ignored():
+    client, _ = serve(encode("JPEG") + b"\0" * 100_000, honor_range=False)
+    assert asyncio.run(probe_image_size(client, "https://img.test/1.jpg")) == (123, 45)
+
+
+def test_probe_raises_on_upstream_errors():
+    client, _ = serve(b"", status=404)
+    with pytest.raises(ImageFetchError):
+        asyncio.run(probe_image_size(client, "https://img.test/missing.jpg"))
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from indexes import ensure_indexes
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def seed_duplicates():
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+
+    async def seed():
+        await db.user_library.insert_many([
+            {"_id": 1, "user_id": "u", "manga_id": "m1", "status": "reading"},
+            {"_id": 2, "user_id": "u", "manga_id": "m1", "status": "dropped"},
+            {"_id": 3, "user_id": "u", "manga_id": "m2", "status": "reading"},
+        ])
+
+    asyncio.run(seed())
+    return db
+
+
+def index_names(db, collection):
+    async def names():
+        return set(await db[collection].index_information())
+
+    return asyncio.run(names())
+
+
+def test_duplicates_only_block_the_unique_index(caplog):
+    db = seed_duplicates()
+    asyncio.run(ensure_indexes(db))
+
+    names = index_names(db, "user_library")
+    assert "user_timestamp_id" in names and "manga_id" in names
+    assert "user_manga_unique" not in names
+    assert "INDEX_DEDUPE" in caplog.text
+
+
+def test_dedupe_keeps_the_oldest_document():
+    db = seed_duplicates()
+    asyncio.run(ensure_indexes(db, dedupe=True))
+
+    assert "user_manga_unique" in index_names(db, "user_library")
+    remaining = asyncio.run(db.user_library.find({}, {"_id": 1}).to_list(None))
+    assert sorted(doc["_id"] for doc in remaining) == [1, 3]
@@ -0,0 +1,178 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from indexes import ensure_indexes
+
+
+@pytest.fixture
+def server(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import server
+
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server.progress_buffer, "db", db)
+    monkeypatch.setattr(server.metadata_cache, "shared", None)
+    monkeypatch.setattr(server.progress_buffer, "_states", {})
+    asyncio.run(ensure_indexes(db))
+    return server
+
+
+async def request(server, method, url, **kwargs):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.request(method, url, **kwargs)
+
+
+def test_removed_manga_leave_continue_reading(server):
+    now = datetime.utcnow()
+
+    async def scenario():
+        for offset, manga_id in enumerate(("m1", "m2")):
+            await server.db.user_library.insert_one({"user_id": "u", "manga_id": manga_id, "title": manga_id, "cover_art": ""})
+            await server.db.reading_progress.insert_one({
+                "user_id": "u", "manga_id": manga_id, "chapter_id": f"{manga_id}-c1",
+                "page_number": 3, "timestamp": now - timedelta(minutes=offset)
+            })
+        # A page turn still waiting in the write-behind buffer
+        server.progress_buffer._merge_state("u", "m1", {"chapter_id": "m1-c2", "page_number": 1, "timestamp": now})
+
+        removed = await request(server, "POST", "/api/library/bulk", json={
+            "user_id": "u", "operations": [{"op": "remove", "manga_id": "m1"}]
+        })
+        listing = await request(server, "GET", "/api/users/u/continue")
+        return removed, listing
+
+    removed, listing = asyncio.run(scenario())
+    assert removed.json()["results"] == [{"op": "remove", "manga_id": "m1", "result": "removed"}]
+    assert [item["manga_id"] for item in listing.json()["items"]] == ["m2"]
+
+
+def test_a_page_is_bookmarked_once(server):
+    params = {"user_id": "u", "manga_id": "m1", "chapter_id": "c1", "page_number": 4, "title": "Page 4"}
+
+    async def scenario():
+        first = await request(server, "POST", "/api/bookmarks/add", params=params)
+        second = await request(server, "POST", "/api/bookmarks/add", params=params)
+        return first, second, await server.db.bookmarks.count_documents({"user_id": "u"})
+
+    first, second, count = asyncio.run(scenario())
+    assert first.json() == {"message": "Bookmark added"}
+    assert second.json() == {"message": "Already bookmarked"}
+    assert count == 1
+
+
+def test_chapter_fields_survive_a_chapter_list_cache_miss(server):
+    now = datetime.utcnow()
+
+    async def scenario():
+        await server.db.reading_state.insert_one({"_id": "u", "complete": True, "manga": {"m1": {
+            "chapter_id": "c1", "page_number": 1, "timestamp": now - timedelta(minutes=1),
+            "chapter_number": 1.0, "next_chapter_id": "c2", "unread_count": 4
+        }}})
+        # Nothing cached on this worker: the chapter list cannot be found
+        await request(server, "POST", "/api/progress/update", params={
+            "user_id": "u", "manga_id": "m1", "chapter_id": "c1", "page_number": 2
+        })
+        await server.progress_buffer.flush()
+        return await request(server, "GET", "/api/users/u/continue")
+
+    item = asyncio.run(scenario()).json()["items"][0]
+    assert item["page_number"] == 2
+    assert (item["chapter_number"], item["next_chapter_id"], item["unread_count"]) == (1.0, "c2", 4)
+
+
+def test_new_chapters_update_unread_counts(server, monkeypatch):
+    chapters = [{"id": f"c{n}", "chapter_number": float(n)} for n in range(1, 5)]
+
+    async def local_chapters(manga_id):
+        return chapters
+
+    monkeypatch.setattr(server.chapter_sync, "local_chapters", local_chapters)
+
+    async def scenario():
+        await server.db.user_library.insert_one({"user_id": "u", "manga_id": "m1", "title": "m1", "cover_art": ""})
+        await server.db.reading_state.insert_one({"_id": "u", "complete": True, "manga": {"m1": {
+            "chapter_id": "c3", "page_number": 1, "timestamp": datetime.utcnow(),
+            "chapter_number": 3.0, "next_chapter_id": None, "unread_count": 0
+        }}})
+        await server.chapters_changed("m1")
+        return await server.db.reading_state.find_one({"_id": "u"})
+
+    entry = asyncio.run(scenario())["manga"]["m1"]
+    assert (entry["next_chapter_id"], entry["unread_count"]) == ("c4", 1)
+
+
+def test_adding_twice_keeps_one_item_without_the_unique_index(server):
+    params = {"user_id": "u", "manga_id": "m1", "title": "Title", "cover_art": ""}
+
+    async def scenario():
+        await server.db.user_library.drop_indexes()
+        first = await request(server, "POST", "/api/library/add", params=params)
+        second = await request(server, "POST", "/api/library/add", params=params)
+        return first, second, await server.db.user_library.count_documents({"user_id": "u"})
+
+    first, second, count = asyncio.run(scenario())
+    assert first.json() == {"message": "Added to library"}
+    assert second.json() == {"message": "Already in library"}
+    assert count == 1
+
+
+def test_export_round_trip_keeps_the_reading_position(server):
+    async def scenario():
+        await server.db.user_library.insert_one({
+            "id": "i1", "user_id": "u", "manga_id": "m1", "title": "One", "cover_art": "",
+            "last_read_chapter": "c7", "last_read_page": 12, "favorite": True, "status": "reading",
+            "timestamp": datetime.utcnow()
+        })
+        exported = await request(server, "GET", "/api/users/u/export")
+        imported = await request(server, "POST", "/api/library/u2/import", content=exported.content)
+        return imported, await server.db.user_library.find_one({"user_id": "u2"})
+
+    imported, item = asyncio.run(scenario())
+    assert imported.status_code == 200
+    assert (item["last_read_chapter"], item["last_read_page"], item["favorite"]) == ("c7", 12, True)
+
+
+def test_cursor_round_trips_and_breaks_ties_on_id(server):
+    from bson import ObjectId
+
+    doc = {"_id": ObjectId(), "timestamp": datetime(2024, 5, 1, 12, 30, 15, 123000)}
+    query = server.listing_query("u", server.encode_cursor(doc))
+
+    assert query == {"user_id": "u", "$or": [
+        {"timestamp": {"$lt": doc["timestamp"]}},
+        {"timestamp": doc["timestamp"], "_id": {"$lt": doc["_id"]}},
+    ]}
+    assert server.listing_query("u", None) == {"user_id": "u"}
+
+
+def test_invalid_cursors_are_rejected(server):
+    response = asyncio.run(request(server, "GET", "/api/bookmarks/u", params={"cursor": "not-a-cursor"}))
+    assert response.status_code == 400
+
+
+def test_pages_cover_every_bookmark_once_when_timestamps_tie(server):
+    now = datetime.utcnow().replace(microsecond=0)
+
+    async def scenario():
+        # Five bookmarks share one timestamp, so only _id orders them
+        await server.db.bookmarks.insert_many([
+            {"id": f"b{i}", "user_id": "u", "manga_id": "m", "chapter_id": "c", "page_number": i, "title": "",
+             "timestamp": now if i < 5 else now - timedelta(minutes=i)}
+            for i in range(7)
+        ])
+        pages, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            body = (await request(server, "GET", "/api/bookmarks/u", params=params)).json()
+            pages.append([bookmark["id"] for bookmark in body["bookmarks"]])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                return pages
+
+    pages = asyncio.run(scenario())
+    assert pages == [["b4", "b3"], ["b2", "b1"], ["b0", "b5"], ["b6"]]
@@ -0,0 +1,20 @@
+import pytest
+
+from library_import import ImportFormatError, iter_anilist
+
+
+@pytest.mark.parametrize("body", [b"[]", b"42", b'"lists"', b'{"data": []}'])
+def test_anilist_json_that_is_not_an_object_is_a_format_error(body):
+    with pytest.raises(ImportFormatError):
+        list(iter_anilist(body))
+
+
+def test_anilist_rows_come_from_every_list():
+    body = b'''{"data": {"MediaListCollection": {"lists": [
+        {"entries": [{"status": "CURRENT", "media": {"id": 1, "title": {"english": "One", "romaji": "Ichi"}}}]},
+        {"entries": [{"status": "PLANNING", "media": {"id": 2, "title": {"romaji": "Ni"}}}]}
+    ]}}}'''
+    rows = list(iter_anilist(body))
+    assert [(row["title"], row["status"], row["anilist_id"]) for row in rows] == [
+        ("One", "reading", 1), ("Ni", "plan_to_read", 2)
+    ]
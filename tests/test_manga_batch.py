@@ -0,0 +1,30 @@
+import asyncio
+
+import httpx
+
+import mangadex_parser
+
+
+def test_mangadex_ids_must_be_uuids():
+    assert mangadex_parser.is_mangadex_id("a96676e5-8ae2-425e-b549-7f15dd34a6d8")
+    assert not mangadex_parser.is_mangadex_id("invalid-id")
+    assert not mangadex_parser.is_mangadex_id("a96676e5-8ae2-425e-b549-7f15dd34a6d8/feed")
+
+
+def test_malformed_ids_are_missing_without_an_upstream_call(monkeypatch):
+    import server
+
+    async def fail(*args, **kwargs):
+        raise AssertionError("malformed ids must not reach MangaDex")
+
+    monkeypatch.setattr(server.metadata_cache, "shared", None)
+    monkeypatch.setattr(server.MangaDexAPI, "get", fail)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/manga/batch", params={"ids": "invalid-id,also bad"})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert response.json() == {"manga": [], "missing": ["invalid-id", "also bad"]}
@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import mangadex_parser
+
+MANGA_ID = "a96676e5-8ae2-425e-b549-7f15dd34a6d8"
+
+
+def manga_payload(**attributes):
+    return {
+        "id": MANGA_ID,
+        "attributes": {
+            "title": {"ja-ro": "Shingeki no Kyojin", "en": "Attack on Titan"},
+            "altTitles": [{"ja": "進撃の巨人"}, {"en": "Attack on Titan"}],
+            "description": {"en": "Walls.", "fr": "Murs."},
+            "status": "completed",
+            "tags": [{"attributes": {"name": {"en": "Action"}}}, {"attributes": {"name": {"en": "Drama"}}}],
+            **attributes,
+        },
+        "relationships": [
+            {"type": "author", "attributes": {"name": "Isayama Hajime"}},
+            {"type": "cover_art", "attributes": {"fileName": "cover.jpg"}},
+        ],
+    }
+
+
+def chapter_payload(chapter_id, number, group="g1", **attributes):
+    return {
+        "id": chapter_id,
+        "attributes": {
+            "title": None, "chapter": number, "pages": 20, "volume": "1",
+            "publishAt": "2024-01-02T03:04:05Z", **attributes,
+        },
+        "relationships": [{"type": "scanlation_group", "id": group}, {"type": "manga", "id": MANGA_ID}],
+    }
+
+
+def model_manga(manga_data):
+    # The pydantic path the one-pass parser replaced
+    from server import MangaInfo
+    author = next(rel["attributes"].get("name", "Unknown") for rel in manga_data["relationships"] if rel["type"] == "author")
+    cover = next(rel["attributes"]["fileName"] for rel in manga_data["relationships"] if rel["type"] == "cover_art")
+    attributes = manga_data["attributes"]
+    return MangaInfo(
+        id=manga_data["id"],
+        title=attributes["title"].get("en", list(attributes["title"].values())[0]),
+        description=attributes["description"].get("en", ""),
+        author=author,
+        status=attributes["status"],
+        cover_art=f"https://uploads.mangadex.org/covers/{manga_data['id']}/{cover}.256.jpg",
+        tags=[tag["attributes"]["name"]["en"] for tag in attributes["tags"]],
+        chapters=0,
+        source="mangadex",
+        alt_titles=["Shingeki no Kyojin", "Attack on Titan", "進撃の巨人"],
+    )
+
+
+def model_chapter(chapter_data, manga_id):
+    from server import ChapterInfo
+    attributes = chapter_data["attributes"]
+    return ChapterInfo(
+        id=chapter_data["id"],
+        title=attributes["title"] or f"Chapter {attributes['chapter']}",
+        chapter_number=float(attributes["chapter"] or 0),
+        pages=int(attributes["pages"] or 0),
+        manga_id=manga_id,
+        volume=attributes["volume"],
+        published_date=datetime.fromisoformat(attributes["publishAt"].replace("Z", "+00:00")) if attributes["publishAt"] else None,
+    )
+
+
+def test_manga_matches_the_model_path():
+    from server import MangaInfo
+    payload = manga_payload()
+    parsed = mangadex_parser.parse_manga(payload)
+
+    assert MangaInfo.model_validate(parsed) == model_manga(payload)
+    assert parsed == MangaInfo.model_validate(parsed).model_dump()
+
+
+def test_chapter_matches_the_model_path():
+    from server import ChapterInfo
+    for payload in (chapter_payload("c1", "12.5"), chapter_payload("c2", "3", title="Named", publishAt=None)):
+        parsed = mangadex_parser.parse_chapter(payload, MANGA_ID)
+        assert ChapterInfo.model_validate(parsed) == model_chapter(payload, MANGA_ID)
+
+
+def test_missing_fields_fall_back_instead_of_raising():
+    from server import ChapterInfo, MangaInfo
+    manga = mangadex_parser.parse_manga({"id": MANGA_ID, "attributes": {"title": {"ja": "Only Japanese"}, "description": None}})
+    chapter = mangadex_parser.parse_chapter({"id": "c1", "attributes": {"chapter": "extra", "pages": None}}, MANGA_ID)
+
+    assert MangaInfo.model_validate(manga).title == "Only Japanese"
+    assert (manga["author"], manga["status"], manga["cover_art"], manga["tags"]) == ("Unknown", "unknown", "", [])
+    assert ChapterInfo.model_validate(chapter).chapter_number == 0.0
+    assert (chapter["title"], chapter["pages"], chapter["published_date"]) == ("Chapter extra", 0, None)
+
@@ -0,0 +1,71 @@
+from metrics import OTHER_ENDPOINT, endpoint_template
+
+
+def test_every_id_position_is_collapsed():
+    assert endpoint_template("/manga/invalid-id") == "/manga/{id}"
+    assert endpoint_template("/manga/2b1c3d4e-0000-4000-8000-000000000000/feed") == "/manga/{id}/feed"
+    assert endpoint_template("/at-home/server/xyz") == "/at-home/server/{id}"
+    assert endpoint_template("/manga") == "/manga"
+
+
+def test_unknown_paths_share_one_label():
+    assert endpoint_template("/manga/a/b/c") == OTHER_ENDPOINT
+    assert endpoint_template("/user/follows/manga") == OTHER_ENDPOINT
+
+
+def make_registry():
+    from metrics import MetricsRegistry
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ["route"])
+    in_flight = registry.gauge("in_flight", "In flight", ["method"])
+    latency = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+    return registry, requests, in_flight, latency
+
+
+def test_worker_snapshots_are_merged(tmp_path):
+    import asyncio
+    from metrics import MultiprocessMetrics
+
+    first, requests, in_flight, latency = make_registry()
+    requests.inc(route="/a")
+    in_flight.inc(method="GET")
+    latency.observe(0.05, route="/a")
+    second, other_requests, other_in_flight, other_latency = make_registry()
+    other_requests.inc(2, route="/a")
+    other_requests.inc(route="/b")
+    other_in_flight.inc(method="GET")
+    other_latency.observe(0.5, route="/a")
+
+    worker = MultiprocessMetrics(first, tmp_path)
+    asyncio.run(MultiprocessMetrics(second, tmp_path).write())
+    text = asyncio.run(worker.render())
+
+    assert 'requests_total{route="/a"} 3' in text
+    assert 'requests_total{route="/b"} 1' in text
+    assert 'in_flight{method="GET"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'latency_seconds_count{route="/a"} 2' in text
+    assert 'latency_seconds_sum{route="/a"} 0.55' in text
+
+
+def test_exited_workers_keep_counters_but_not_gauges(tmp_path):
+    import asyncio
+    import json
+    from metrics import MultiprocessMetrics
+
+    exited, requests, in_flight, _ = make_registry()
+    requests.inc(5, route="/a")
+    in_flight.set(3, method="GET")
+    snapshots = MultiprocessMetrics(exited, tmp_path, interval=1)
+    asyncio.run(snapshots.write())
+    snapshot = json.loads(snapshots.path.read_text())
+    snapshot["written_at"] -= 60
+    snapshots.path.write_text(json.dumps(snapshot))
+
+    current, _, current_in_flight, _ = make_registry()
+    current_in_flight.set(1, method="GET")
+    text = asyncio.run(MultiprocessMetrics(current, tmp_path, interval=1).render())
+
+    assert 'requests_total{route="/a"} 5' in text
+    assert 'in_flight{method="GET"} 1' in text
@@ -0,0 +1,79 @@
+import asyncio
+
+from prefetch import Prefetcher
+
+
+def slow_job(started: list, name: str, delay: float = 0.2):
+    async def job():
+        started.append(name)
+        await asyncio.sleep(delay)
+        return True
+
+    return job
+
+
+def test_new_job_for_an_owner_cancels_the_old_one():
+    async def scenario():
+        prefetcher = Prefetcher()
+        started = []
+        prefetcher.schedule("chapter:2", slow_job(started, "2"), owner="reader")
+        await asyncio.sleep(0.01)
+        prefetcher.schedule("chapter:9", slow_job(started, "9"), owner="reader")
+        await asyncio.sleep(0.3)
+        return prefetcher.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["cancelled"] == 1
+    assert stats["completed"] == 1
+    assert stats["pending"] == 0
+    assert stats["owners"] == 0
+
+
+def test_shared_and_owner_less_jobs_survive_a_release():
+    async def scenario():
+        prefetcher = Prefetcher()
+        started = []
+        prefetcher.schedule("chapter:2", slow_job(started, "2"), owner="a")
+        prefetcher.schedule("chapter:2", slow_job(started, "2"), owner="b")
+        prefetcher.schedule("chapter:3", slow_job(started, "3"))
+        prefetcher.schedule("chapter:3", slow_job(started, "3"), owner="c")
+        await asyncio.sleep(0.01)
+        released = [prefetcher.release("a"), prefetcher.release("c"), prefetcher.release("nobody")]
+        await asyncio.sleep(0.3)
+        return released, prefetcher.get_stats()
+
+    released, stats = asyncio.run(scenario())
+    assert released == [False, False, False]
+    assert stats["completed"] == 2
+    assert "cancelled" not in stats
+
+
+def test_last_release_cancels_and_allows_rescheduling():
+    async def scenario():
+        prefetcher = Prefetcher()
+        started = []
+        prefetcher.schedule("chapter:2", slow_job(started, "first"), owner="reader")
+        await asyncio.sleep(0.01)
+        assert prefetcher.release("reader")
+        # The cancelled task may still be winding down; the key must be free again
+        assert prefetcher.schedule("chapter:2", slow_job(started, "second", 0.01))
+        await asyncio.sleep(0.05)
+        return started, prefetcher.get_stats()
+
+    started, stats = asyncio.run(scenario())
+    assert started == ["first", "second"]
+    assert stats["cancelled"] == 1
+    assert stats["completed"] == 1
+
+
+def test_warmed_jobs_cool_down():
+    async def scenario():
+        prefetcher = Prefetcher(cooldown=60)
+        started = []
+        prefetcher.schedule("chapter:2", slow_job(started, "2", 0))
+        await asyncio.sleep(0.01)
+        return prefetcher.schedule("chapter:2", slow_job(started, "2", 0)), started
+
+    scheduled, started = asyncio.run(scenario())
+    assert scheduled is False
+    assert started == ["2"]
@@ -0,0 +1,145 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from progress_buffer import ProgressBuffer
+
+
+class SlowCollection:
+    def __init__(self, delay: float = 0.0, fail: int = 0):
+        self.delay = delay
+        self.fail = fail
+        self.writes = []
+
+    async def bulk_write(self, ops, ordered=True):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("write failed")
+        self.writes.extend(ops)
+
+
+class FakeDB:
+    def __init__(self, delay: float = 0.0, fail: int = 0):
+        self.reading_progress = SlowCollection(delay, fail)
+        self.user_library = SlowCollection()
+        self.reading_state = SlowCollection()
+
+
+def guarded_writes(collection):
+    # The conditional $set of each flushed entry; the other op only inserts missing documents
+    return [op._doc["$set"] for op in collection.writes if "$set" in op._doc]
+
+
+def progress(chapter_id: str, page: int, at: datetime, user_id: str = "u", manga_id: str = "m"):
+    return {
+        "user_id": user_id, "manga_id": manga_id, "chapter_id": chapter_id,
+        "page_number": page, "total_pages": 20, "timestamp": at
+    }
+
+
+def test_close_during_flush_keeps_the_batch():
+    async def scenario():
+        db = FakeDB(delay=0.2)
+        buffer = ProgressBuffer(db, flush_interval=0.01)
+        buffer.start()
+        buffer.add(progress("c1", 3, datetime.utcnow()))
+        await asyncio.sleep(0.05)  # the loop is now inside bulk_write
+        await buffer.close()
+        return db, buffer
+
+    db, buffer = asyncio.run(scenario())
+    assert len(guarded_writes(db.reading_progress)) == 1
+    assert buffer.get_stats()["pending"] == 0
+
+
+def test_cancelled_flush_requeues_the_batch():
+    async def scenario():
+        db = FakeDB(delay=1)
+        buffer = ProgressBuffer(db)
+        buffer.add(progress("c1", 3, datetime.utcnow()), {"chapter_id": "c1"})
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0.05)
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    assert buffer.latest("u", "m")["chapter_id"] == "c1"
+    assert buffer.pending_states("u") == {"m": {"chapter_id": "c1"}}
+
+
+def test_failed_flush_does_not_override_newer_events():
+    async def scenario():
+        db = FakeDB(fail=1)
+        buffer = ProgressBuffer(db)
+        now = datetime.utcnow()
+        buffer.add(progress("c1", 3, now))
+        await buffer.flush()
+        buffer.add(progress("c1", 9, now + timedelta(seconds=1)))
+        assert buffer.latest("u", "m")["page_number"] == 9
+        await buffer.flush()
+        return db
+
+    db = asyncio.run(scenario())
+    assert [doc["page_number"] for doc in guarded_writes(db.reading_progress)] == [9]
+
+
+def test_latest_picks_the_newest_chapter_per_manga():
+    buffer = ProgressBuffer(FakeDB())
+    now = datetime.utcnow()
+    buffer.add(progress("c2", 1, now + timedelta(seconds=5)))
+    buffer.add(progress("c1", 7, now))
+    buffer.add(progress("c9", 1, now, manga_id="other"))
+    assert buffer.latest("u", "m")["chapter_id"] == "c2"
+    assert buffer.latest("u", "other")["chapter_id"] == "c9"
+    assert buffer.latest("someone", "m") is None
+
+
+def test_entries_stay_readable_while_being_flushed():
+    async def scenario():
+        db = FakeDB(delay=0.2)
+        buffer = ProgressBuffer(db)
+        now = datetime.utcnow()
+        buffer.add(progress("c1", 3, now), {"chapter_id": "c1", "page_number": 3})
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0.05)  # inside bulk_write
+        during = buffer.latest("u", "m"), buffer.pending_states("u")
+        buffer.add(progress("c1", 4, now + timedelta(seconds=1)), {"page_number": 4})
+        newer = buffer.latest("u", "m"), buffer.pending_states("u")
+        await flush
+        return during, newer, buffer
+
+    during, newer, buffer = asyncio.run(scenario())
+    assert during[0]["page_number"] == 3
+    assert during[1] == {"m": {"chapter_id": "c1", "page_number": 3}}
+    assert newer[0]["page_number"] == 4
+    assert newer[1] == {"m": {"chapter_id": "c1", "page_number": 4}}
+    assert buffer.latest("u", "m")["page_number"] == 4
+
+
+def test_late_flush_of_an_older_page_does_not_roll_back():
+    import pytest
+
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["test"]
+        await db.user_library.insert_one({"user_id": "u", "manga_id": "m"})
+        # Two workers; the one holding the older page flushes last
+        older, newer = ProgressBuffer(db), ProgressBuffer(db)
+        now = datetime.utcnow().replace(microsecond=0)
+        older.add(progress("c1", 3, now), {"chapter_id": "c1", "page_number": 3, "timestamp": now})
+        later = now + timedelta(seconds=5)
+        newer.add(progress("c1", 9, later), {"chapter_id": "c1", "page_number": 9, "timestamp": later})
+        await newer.flush()
+        await older.flush()
+        return (
+            await db.reading_progress.find({}).to_list(None),
+            await db.user_library.find_one({}),
+            await db.reading_state.find_one({"_id": "u"})
+        )
+
+    stored, item, state = asyncio.run(scenario())
+    assert [doc["page_number"] for doc in stored] == [9]
+    assert item["last_read_page"] == 9
+    assert state["manga"]["m"]["page_number"] == 9
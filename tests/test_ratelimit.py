@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from ratelimit import RateLimiter, RateLimitTimeout, TokenBucket
+
+
+def test_bucket_times_out_with_its_wait():
+    async def scenario():
+        bucket = TokenBucket(rate=0.5, capacity=1)
+        await bucket.acquire(time.monotonic() + 1)
+        await bucket.acquire(time.monotonic() + 1)
+
+    with pytest.raises(RateLimitTimeout) as error:
+        asyncio.run(scenario())
+    assert 1.5 < error.value.retry_after <= 2
+
+
+def test_exhausted_quota_pauses_buckets():
+    limiter = RateLimiter({"global": TokenBucket(rate=5, capacity=5)})
+    limiter.observe(["global"], {"x-ratelimit-remaining": "0", "x-ratelimit-retry-after": str(time.time() + 30)})
+
+    with pytest.raises(RateLimitTimeout) as error:
+        asyncio.run(limiter.acquire(["global"], time.monotonic() + 1))
+    assert error.value.retry_after > 25
+
+
+def test_rate_limit_timeout_reaches_clients_as_503(monkeypatch):
+    import server
+
+    monkeypatch.setattr(server.metadata_cache, "shared", None)
+    bucket = server.upstream_limiter.buckets["global"]
+    monkeypatch.setattr(bucket, "blocked_until", time.monotonic() + 60)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/manga/rate-limit-test-id")
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 503
+    assert 55 <= int(response.headers["retry-after"]) <= 60
+
+
+def test_workers_share_one_quota():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from coordination import MongoCoordinator
+    from ratelimit import SharedTokenBucket
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["test"]["coordination"]
+        # Two workers, each allowed the whole rate while the other is idle
+        first, second = (
+            SharedTokenBucket(MongoCoordinator(collection), "at-home", rate=1, capacity=2, fallback_share=0.5)
+            for _ in range(2)
+        )
+        await first.acquire(time.monotonic() + 0.1)
+        await first.acquire(time.monotonic() + 0.1)
+        await second.acquire(time.monotonic() + 0.1)
+
+    with pytest.raises(RateLimitTimeout) as error:
+        asyncio.run(scenario())
+    assert 0.5 < error.value.retry_after <= 1
+
+
+def test_shared_bucket_falls_back_to_its_local_share():
+    from coordination import LocalCoordinator
+    from ratelimit import SharedTokenBucket
+
+    class BrokenCoordinator(LocalCoordinator):
+        async def reserve(self, *args):
+            raise RuntimeError("backend down")
+
+    async def scenario():
+        bucket = SharedTokenBucket(BrokenCoordinator(), "global", rate=4, capacity=4, fallback_share=0.5)
+        await bucket.acquire(time.monotonic() + 0.1)
+        await bucket.acquire(time.monotonic() + 0.1)
+        await bucket.acquire(time.monotonic() + 0.1)
+
+    with pytest.raises(RateLimitTimeout):
+        asyncio.run(scenario())
+
+
+def test_available_tokens_refill_without_an_acquire():
+    async def scenario():
+        bucket = TokenBucket(rate=20, capacity=2)
+        await bucket.acquire(time.monotonic() + 1)
+        await bucket.acquire(time.monotonic() + 1)
+        drained = bucket.available()
+        await asyncio.sleep(0.1)
+        return drained, bucket.available()
+
+    drained, later = asyncio.run(scenario())
+    assert drained < 1
+    assert later >= 1.9
+
+
+def test_shared_bucket_estimates_tokens_left():
+    from coordination import LocalCoordinator
+    from ratelimit import SharedTokenBucket
+
+    async def scenario():
+        bucket = SharedTokenBucket(LocalCoordinator(), "at-home", rate=10, capacity=3)
+        full = bucket.available()
+        for _ in range(3):
+            await bucket.acquire(time.monotonic() + 1)
+        drained = bucket.available()
+        await asyncio.sleep(0.15)
+        return full, drained, bucket.available()
+
+    full, drained, later = asyncio.run(scenario())
+    assert full == 3
+    assert drained < 1
+    assert later >= 1
+
+
+@pytest.mark.parametrize("upstream, status, retry_after", [
+    (httpx.Response(429, headers={"Retry-After": "7"}), 503, "7"),
+    (httpx.Response(503), 503, None),
+    (httpx.Response(500), 502, None),
+    (httpx.ConnectError("refused"), 502, None),
+])
+def test_exhausted_upstream_retries_map_to_503_or_502(monkeypatch, upstream, status, retry_after):
+    import server
+    from circuit import CircuitBreakers
+
+    def handler(request):
+        if isinstance(upstream, Exception):
+            raise upstream
+        return upstream
+
+    monkeypatch.setattr(server.metadata_cache, "shared", None)
+    monkeypatch.setattr(server.upstream_limiter, "max_retries", 0)
+    monkeypatch.setattr(server, "upstream_breakers", CircuitBreakers(server.UPSTREAM_ENDPOINTS, fallback=server.OTHER_ENDPOINT))
+    monkeypatch.setattr(server.MangaDexAPI, "client", httpx.AsyncClient(
+        base_url="https://api.test", transport=httpx.MockTransport(handler)
+    ))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/manga/search", params={"query": f"upstream-{status}-{retry_after}"})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == status
+    assert response.headers.get("retry-after") == retry_after
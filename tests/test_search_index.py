@@ -0,0 +1,63 @@
+from search_index import SearchIndex
+
+
+def manga(manga_id, title, **fields):
+    return {"id": manga_id, "title": title, **fields}
+
+
+def ids(results):
+    return [doc["id"] for doc in results]
+
+
+def test_title_matches_rank_above_description_matches():
+    index = SearchIndex()
+    index.add(manga("a", "Quiet Garden", description="A story about dragons"))
+    index.add(manga("b", "Dragon Tamer"))
+    index.add(manga("c", "Unrelated"))
+
+    # "dragon" matches "dragons" as a prefix, which still ranks below a title match
+    assert ids(index.search("dragon")) == ["b", "a"]
+    assert ids(index.search("dragons")) == ["a"]
+
+
+def test_every_token_must_match():
+    index = SearchIndex()
+    index.add(manga("a", "Attack on Titan", author="Isayama"))
+    index.add(manga("b", "Titan Academy"))
+
+    assert ids(index.search("titan isayama")) == ["a"]
+    assert index.search("titan missing") == []
+
+
+def test_typos_and_accents_match():
+    index = SearchIndex()
+    index.add(manga("a", "Shingéki no Kyojin"))
+
+    assert ids(index.search("shingeki")) == ["a"]
+    assert ids(index.search("kyjoin")) == ["a"]
+
+
+def test_readding_replaces_old_terms():
+    index = SearchIndex()
+    assert index.add(manga("a", "Old Name"))
+    assert not index.add(manga("a", "Old Name"))
+    assert index.add(manga("a", "New Name"))
+
+    assert index.search("old") == []
+    assert ids(index.search("new")) == ["a"]
+    assert len(index) == 1
+
+
+def test_cap_evicts_least_recently_seen():
+    index = SearchIndex(max_docs=2)
+    index.add(manga("a", "Alpha"))
+    index.add(manga("b", "Bravo"))
+    # Seeing "a" again makes "b" the oldest
+    index.add(manga("a", "Alpha"))
+    index.add(manga("c", "Charlie"))
+
+    assert set(index.docs) == {"a", "c"}
+    assert index.search("bravo") == []
+    assert ids(index.search("alpha")) == ["a"]
+    assert index.get_stats()["evicted"] == 1
+    assert "bravo" not in index._postings
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_task():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("key", fetch) for _ in range(50)])
+        return flight, results
+
+    flight, results = asyncio.run(scenario())
+    assert results == ["value"] * 50
+    assert calls == 1
+    assert flight.get_stats() == {"calls": 1, "coalesced": 49, "in_flight": 0, "waiters": 0}
+
+
+def test_errors_reach_every_waiter():
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def scenario():
+        flight = SingleFlight()
+        return await asyncio.gather(*[flight.do("key", fetch) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(scenario()))
+
+
+def test_cancelling_one_waiter_keeps_the_shared_task():
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def scenario():
+        flight = SingleFlight()
+        first = asyncio.create_task(flight.do("key", fetch))
+        second = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "value"
+
+
+def test_caller_after_last_waiter_cancels_starts_a_new_call():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            # Still winding down when the next caller arrives
+            await asyncio.sleep(0.01)
+            raise
+        return "value"
+
+    async def scenario():
+        flight = SingleFlight()
+        waiter = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        # The cancelled task has not finished yet; this caller must not join it
+        result = await flight.do("key", fetch)
+        await asyncio.gather(waiter, return_exceptions=True)
+        return flight, result
+
+    flight, result = asyncio.run(scenario())
+    assert result == "value"
+    assert calls == 2
+    assert flight.get_stats()["in_flight"] == 0
@@ -0,0 +1,100 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from tracing import CLIENT, SERVER, STATUS_ERROR, Tracer, TracingMiddleware, TracingTransport
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class RecordingSink:
+    def __init__(self):
+        self.traces = []
+
+    def export(self, spans):
+        self.traces.append(spans)
+
+
+def traced_app(tracer):
+    upstream = httpx.AsyncClient(
+        base_url="https://api.test",
+        transport=TracingTransport(httpx.MockTransport(lambda request: httpx.Response(503)), tracer),
+    )
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        with tracer.span("load", category="internal"):
+            # Concurrent calls each get a span under the one that started them
+            await asyncio.gather(upstream.get("/manga/a"), upstream.get("/manga/b"))
+        return {"id": item_id}
+
+    return TracingMiddleware(app, tracer)
+
+
+def call(tracer, headers=None):
+    async def scenario():
+        transport = httpx.ASGITransport(app=traced_app(tracer))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/items/1", headers=headers or {})
+
+    return asyncio.run(scenario())
+
+
+def test_spans_nest_under_the_request():
+    sink = RecordingSink()
+    response = call(Tracer(sink, slow_request_seconds=60))
+
+    [spans] = sink.traces
+    by_name = {span.name: span for span in spans if span.kind != CLIENT}
+    root, load = by_name["GET /items/{item_id}"], by_name["load"]
+    clients = [span for span in spans if span.kind == CLIENT]
+
+    assert root.kind == SERVER and root.parent_id is None
+    assert root.attributes["http.route"] == "/items/{item_id}"
+    assert load.parent_id == root.span_id
+    assert sorted(span.name for span in clients) == ["GET /manga/a", "GET /manga/b"]
+    assert all(span.parent_id == load.span_id and span.status == STATUS_ERROR for span in clients)
+    assert {span.trace.trace_id for span in spans} == {response.headers["x-trace-id"]}
+    assert response.headers["x-request-id"] == response.headers["x-trace-id"]
+
+
+def test_incoming_traceparent_and_request_id_are_continued():
+    sink = RecordingSink()
+    response = call(Tracer(sink, slow_request_seconds=60), {
+        "traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01", "X-Request-ID": "req-42",
+    })
+
+    root = next(span for span in sink.traces[0] if span.kind == SERVER)
+    assert root.trace.trace_id == TRACE_ID
+    assert root.parent_id == PARENT_ID
+    assert response.headers["x-request-id"] == "req-42"
+    assert response.headers["x-trace-id"] == TRACE_ID
+
+
+def test_malformed_request_ids_are_replaced():
+    response = call(Tracer(RecordingSink(), slow_request_seconds=60), {"X-Request-ID": "bad id\twith spaces"})
+    assert response.headers["x-request-id"] == response.headers["x-trace-id"]
+
+
+def test_no_spans_outside_a_request_or_when_disabled():
+    tracer = Tracer(RecordingSink())
+    assert tracer.start_span("orphan") is None
+
+    sink = RecordingSink()
+    response = call(Tracer(sink, enabled=False))
+    assert sink.traces == []
+    assert "x-trace-id" not in response.headers
+
+
+def test_spans_ending_after_the_request_are_dropped():
+    from tracing import INTERNAL, Span, Trace
+
+    trace = Trace(TRACE_ID, "req")
+    background = Span(trace, "background", INTERNAL, "internal", None, {})
+    trace.finish()
+    background.end()
+
+    assert trace.spans == [] and trace.late_spans == 1